@@ -1,18 +1,26 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import subprocess
-import json
-import vlc
-from PIL import Image, ImageTk
-import requests
-import threading
-import io
+from PIL import ImageTk
 import os
 import time
 import re
 import humanize
 import shutil
 import sys
+from ytplayer.extractor import CancelToken, SEARCH_PAGE
+from ytplayer.cache import normalize_query
+from ytplayer.thumbnails import ThumbnailCache, ThumbnailLoader
+from ytplayer.streaming import StreamMuxer
+from ytplayer.playback import PlaybackController, PlayerService
+from ytplayer.listview import VirtualList
+from ytplayer.formats import AUDIO, AV, KIND_NAMES, OTHER, FormatTable
+from ytplayer.batch import is_batch_source
+from ytplayer.bandwidth import DEFAULT_HEIGHT, auto_height
+from ytplayer.engine import Engine
+from ytplayer.fsutil import DirLocked
+from ytplayer.orchestrator import Orchestrator, run_blocking
+from ytplayer.prefetch import FormatPrefetcher
 
 class MediaDownloaderApp:
     def __init__(self, root):
@@ -28,21 +36,58 @@ class MediaDownloaderApp:
         self.videos = []
         self.current_media = None
         self.player = None
+        self.muxer = None
+        self.play_started = None
         self.formats = []
+        self.format_table = None
         self.selected_format = None
-        self.cache = {"search": {}, "thumbnails": {}}
         self.downloads_dir = os.path.join(os.path.expanduser("~"), "Downloads", "MediaDownloader")
         self.temp_dir = os.path.join(self.downloads_dir, "temp")
         os.makedirs(self.downloads_dir, exist_ok=True)
         os.makedirs(self.temp_dir, exist_ok=True)
-        self.timer_id = None
         self.is_paused = False
         self.slider_dragging = False
-        self.current_download_process = None
+        self.current_job = None
+        self.search_token = None
+        self.search_query = None
+        self.search_offset = 0
+        self.live_search_timer = None
+        # Search, formats and downloads; playlists, channels and file:<path>
+        # lists of URLs entered in the search box download as a batch
+        try:
+            self.engine = Engine(self.downloads_dir, batch_format="bestvideo[height<=1080]+bestaudio/best",
+                                 batch_args=["--no-playlist", "--merge-output-format", "mp4"])
+        except DirLocked as e:
+            # Another window or the CLI owns the download queue
+            messagebox.showerror("Already Running", str(e))
+            self.root.destroy()
+            raise SystemExit(1)
+        # Searches, format lookups and stream setup run on one asyncio loop;
+        # a newer request of the same kind cancels the one still running
+        self.tasks = Orchestrator(lambda fn: self.root.after(0, fn))
+        # Formats of the top results and of the rows being looked at are
+        # fetched ahead of a click, while nothing else is loading
+        self.prefetcher = FormatPrefetcher(self.tasks, self.engine.info_cache)
+        self.thumbnails = ThumbnailLoader(
+            cache=ThumbnailCache(spill_dir=os.path.join(self.downloads_dir, "thumbnails")))
+        self.playback = PlaybackController(lambda fn: self.root.after(0, fn),
+                                           on_time=self._on_playback_time,
+                                           on_end=self._on_playback_end,
+                                           on_error=self._on_playback_error,
+                                           on_vout=self._on_video_output)
+        # One libvlc instance for the whole session, its player reused across plays
+        self.player_service = PlayerService('--input-repeat=1', '--no-video-title-show')
         
         # Create UI
         self._create_ui()
         self.search_entry.focus_set()
+        
+        # Download queue and batch, restored from the last session
+        self.engine.downloads.subscribe(lambda event, job: 
+                                        self.root.after(0, lambda: self._on_download_event(event, job)))
+        self.engine.batch.subscribe(lambda event, item: 
+                                    self.root.after(0, lambda: self._on_batch_event(event, item)))
+        self.engine.start()
     
     def _check_dependencies(self):
         """Check for required external dependencies"""
@@ -88,8 +133,17 @@ class MediaDownloaderApp:
         self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
         self.search_entry.grid(row=0, column=0, sticky="ew", padx=(0, 5))
         self.search_entry.bind('<Return>', lambda e: self.search_media())
+        self.search_entry.bind('<KeyRelease>', self._on_search_key)
         
         ttk.Button(search_frame, text="Search", command=self.search_media, width=10).grid(row=0, column=1)
+        self.more_button = ttk.Button(search_frame, text="Load more", command=self.load_more_results, 
+                                      width=10, state=tk.DISABLED)
+        self.more_button.grid(row=0, column=2, padx=(5, 0))
+        
+        # Live search runs as you type
+        self.live_search_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame, text="Live search", 
+                        variable=self.live_search_var).grid(row=0, column=3, padx=(5, 0))
         
         # Left panel - Results list
         list_panel = ttk.Frame(main)
@@ -104,9 +158,11 @@ class MediaDownloaderApp:
         list_container.rowconfigure(0, weight=1)
         list_container.columnconfigure(0, weight=1)
         
-        self.media_listbox = tk.Listbox(list_container)
+        self.media_listbox = VirtualList(list_container)
         self.media_listbox.grid(row=0, column=0, sticky="nsew")
         self.media_listbox.bind('<<ListboxSelect>>', self.on_media_select)
+        self.media_listbox.bind('<<ListboxHover>>', lambda e: 
+                                self.prefetcher.focus(*self.videos[self.media_listbox.hovered:][:1]))
         
         ttk.Scrollbar(list_container, orient="vertical", 
                      command=self.media_listbox.yview).grid(row=0, column=1, sticky="ns")
@@ -152,7 +208,7 @@ class MediaDownloaderApp:
         
         self.quality_var = tk.StringVar(value="720p")
         ttk.Combobox(quality_frame, textvariable=self.quality_var, width=10, 
-                    values=["360p", "480p", "720p", "1080p", "1440p", "2160p"]).grid(row=0, column=1, sticky="w")
+                    values=["Auto", "360p", "480p", "720p", "1080p", "1440p", "2160p"]).grid(row=0, column=1, sticky="w")
         
         # Best format button
         self.best_format_btn = ttk.Button(details_panel, text="Select Best Quality", 
@@ -160,7 +216,7 @@ class MediaDownloaderApp:
         self.best_format_btn.grid(row=3, column=0, sticky="e", pady=(0, 5))
         
         # Format list
-        self.format_listbox = tk.Listbox(details_panel, height=6)
+        self.format_listbox = VirtualList(details_panel, height=6)
         self.format_listbox.grid(row=5, column=0, sticky="ew", pady=(0, 10))
         self.format_listbox.bind('<<ListboxSelect>>', self.on_format_selected)
         
@@ -218,81 +274,124 @@ class MediaDownloaderApp:
         self.progress = ttk.Progressbar(main, mode="determinate")
         self.progress.grid(row=5, column=0, columnspan=2, sticky="ew", pady=(5, 0))
     
-    def search_media(self):
-        query = self.search_var.get().strip()
+    def search_media(self, live=False):
+        query = normalize_query(self.search_var.get())
         if not query:
             messagebox.showwarning("Input Error", "Please enter a search query.")
             return
         
-        self.stop_media()
+        source = self.search_var.get().strip()
+        if is_batch_source(source):
+            if not live:
+                self.start_batch(source)
+            return
+        
+        # Typing should not interrupt playback
+        if not live:
+            self.stop_media()
         self.status_var.set(f"Searching for: {query}")
-        threading.Thread(target=self._search_thread, args=(query,), daemon=True).start()
+        self.videos = []
+        self.media_listbox.delete(0, tk.END)
+        self.search_query, self.search_offset = query, 0
+        self._start_search(query, 0)
     
-    def _search_thread(self, query):
-        if query in self.cache["search"]:
-            videos = self.cache["search"][query]
-        else:
-            try:
-                cmd = ["yt-dlp", "--flat-playlist", "--quiet", "--dump-json", f"ytsearch20:{query}"]
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                videos = [json.loads(line) for line in result.stdout.splitlines()]
-                self.cache["search"][query] = videos
-            except Exception:
-                videos = []
-        
-        self.root.after(0, lambda: self._update_search_results(videos))
-    
-    def _update_search_results(self, videos):
-        if not videos:
-            self.status_var.set("No media found.")
+    def _on_search_key(self, event):
+        if not self.live_search_var.get() or event.keysym == "Return":
             return
-            
-        self.videos = videos
-        self.media_listbox.delete(0, tk.END)
         
-        for i, video in enumerate(videos):
+        # Debounce keystrokes: search once typing pauses for 300 ms
+        if self.live_search_timer:
+            self.root.after_cancel(self.live_search_timer)
+        self.live_search_timer = self.root.after(300, self._live_search)
+    
+    def _live_search(self):
+        self.live_search_timer = None
+        query = normalize_query(self.search_var.get())
+        if len(query) >= 2 and query != self.search_query:
+            self.search_media(live=True)
+    
+    def load_more_results(self):
+        """Fetch the next page of results for the current query"""
+        if not self.search_query:
+            return
+        self.search_offset += SEARCH_PAGE
+        self.status_var.set("Loading more results...")
+        self._start_search(self.search_query, self.search_offset)
+    
+    def _start_search(self, query, start):
+        # A newer search kills whatever yt-dlp run is still streaming the old one
+        if self.search_token:
+            self.search_token.cancel()
+        token = self.search_token = CancelToken()
+        self.more_button["state"] = tk.DISABLED
+        
+        def show(videos, replace=False):
+            self.root.after(0, lambda: token is self.search_token and 
+                            self._update_search_results(videos, replace))
+        
+        # Library hits come first, then each result as soon as yt-dlp prints it
+        self.tasks.latest("search",
+                          lambda: run_blocking(self.engine.search, query, start, SEARCH_PAGE, token, show,
+                                               cancel=token),
+                          on_result=lambda videos: self._search_done(token),
+                          on_error=lambda e: self._search_done(token, str(e) or e.__class__.__name__))
+    
+    def _search_done(self, token, error=None):
+        if token is not self.search_token:
+            return
+        self.more_button["state"] = tk.NORMAL if self.videos and not error else tk.DISABLED
+        if not error:
+            self.prefetcher.results(self.videos)
+        if error and not self.videos:
+            self.status_var.set(f"Search error: {error[:50]}")
+        elif not self.videos:
+            self.status_var.set("No media found.")
+    
+    def _update_search_results(self, videos, replace=False):
+        if replace:
+            self.videos = []
+            self.media_listbox.delete(0, tk.END)
+        
+        for video in videos:
             title = video.get("title", "N/A")
             duration = self._format_time(video.get("duration", 0))
-            self.media_listbox.insert(tk.END, f"{i+1}. {title} [{duration}]")
-            
-            # Load thumbnail in background
-            thumbnail_url = video.get("thumbnail", "")
-            if thumbnail_url:
-                threading.Thread(target=self._load_thumbnail, 
-                               args=(thumbnail_url,), daemon=True).start()
+            mark = "[local] " if video.get("local") else ""
+            self.media_listbox.insert(tk.END, f"{len(self.videos) + 1}. {mark}{title} [{duration}]")
+            self.videos.append(video)
+        
+        # Load thumbnails in background, dropping any still queued from the last search
+        self.thumbnails.load_batch([v["thumbnail"] for v in self.videos if v.get("thumbnail")])
         
-        self.status_var.set(f"Found {len(videos)} results")
+        local_count = sum(1 for v in self.videos if v.get("local"))
+        if local_count:
+            self.status_var.set(f"Found {len(self.videos)} results ({local_count} in library)")
+        else:
+            self.status_var.set(f"Found {len(self.videos)} results")
     
-    def _load_thumbnail(self, url):
-        if not url or url in self.cache["thumbnails"]:
+    def show_thumbnail(self, url):
+        # Scaled to the canvas on a worker thread
+        canvas_size = (self.preview_canvas.winfo_width() or 320, self.preview_canvas.winfo_height() or 180)
+        future = self.thumbnails.fetch_scaled(url, canvas_size)
+        if future.done():
+            self._draw_thumbnail(url, future)
+        else:
+            self.preview_canvas.delete("all")
+            future.add_done_callback(lambda f: self.root.after(0, lambda: self._draw_thumbnail(url, f)))
+    
+    def _draw_thumbnail(self, url, future):
+        # Ignore late results for a result that is no longer selected
+        if not self.current_media or self.current_media.get("thumbnail") != url:
             return
             
         try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                image = Image.open(io.BytesIO(response.content))
-                self.cache["thumbnails"][url] = image
-        except Exception:
-            pass
-    
-    def show_thumbnail(self, url):
-        try:
-            if url in self.cache["thumbnails"]:
-                image = self.cache["thumbnails"][url]
-            else:
-                response = requests.get(url, timeout=5)
-                image = Image.open(io.BytesIO(response.content))
-                self.cache["thumbnails"][url] = image
-                
+            resized = future.result()
+            
             # Calculate dimensions
             canvas_width = self.preview_canvas.winfo_width() or 320
             canvas_height = self.preview_canvas.winfo_height() or 180
-            img_width, img_height = image.size
-            ratio = min(canvas_width/img_width, canvas_height/img_height)
-            new_width, new_height = int(img_width * ratio), int(img_height * ratio)
+            new_width, new_height = resized.size
             
-            # Resize and display
-            resized = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            # Display
             photo = ImageTk.PhotoImage(resized)
             
             self.preview_canvas.delete("all")
@@ -329,6 +428,8 @@ class MediaDownloaderApp:
             
         video = self.videos[index]
         self.current_media = video
+        # The previous video's formats must not pick this one's streams
+        self.format_table = None
         
         # Update UI
         self.title_var.set(video.get("title", "Unknown Title"))
@@ -338,132 +439,92 @@ class MediaDownloaderApp:
         if thumbnail_url:
             self.show_thumbnail(thumbnail_url)
         
+        if self._local_path(video):
+            # Downloaded copy, plays straight from disk
+            self.tasks.cancel("formats")
+            self.selected_format = None
+            self._set_button_states({"play": True})
+            self.status_var.set(f"In library: {video['path']}")
+            return
+        
         # Enable best format button
         self.best_format_btn["state"] = tk.NORMAL
         
-        # Fetch formats
-        threading.Thread(target=self._fetch_formats, args=(video,), daemon=True).start()
+        # Fetch formats; only the last of several quick selections gets that far
+        self.tasks.latest("formats", lambda: self._fetch_formats(video),
+                          on_result=lambda result: self._update_formats(*result),
+                          on_error=lambda e: self.status_var.set(f"Error: {str(e)[:50]}"))
         self.status_var.set("Loading formats...")
+        # Arrow keys lead to a neighbour next
+        self.prefetcher.focus(*self.videos[index + 1:index + 2], *self.videos[max(0, index - 1):index])
     
-    def _fetch_formats(self, video):
+    async def _fetch_formats(self, video):
         video_url = video.get("webpage_url", "")
         if not video_url:
-            self.root.after(0, lambda: self.status_var.set("Failed to get URL"))
-            return
-            
-        try:
-            # Get format info
-            cmd = ["yt-dlp", "-J", video_url]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            video_data = json.loads(result.stdout)
-            
-            formats = video_data.get("formats", [])
-            format_options = []
-            
-            # Add merged formats for common resolutions
-            for quality, height in [("360p", 360), ("480p", 480), ("720p", 720), 
-                                  ("1080p", 1080), ("1440p", 1440), ("2160p", 2160)]:
-                merged_format = {
-                    "format_id": f"bestvideo[height<={height}]+bestaudio/best[height<={height}]",
-                    "ext": "mp4",
-                    "is_merged": True,
-                    "resolution": f"≤{quality}",
-                    "format_note": f"Best {quality} merged"
-                }
-                
-                label = f"MERGED: Best video+audio (≤{quality})"
-                format_options.append((label, merged_format))
-            
-            # Add individual formats
-            for fmt in formats:
-                # Extract format details
-                fmt_id = fmt.get("format_id", "")
-                resolution = fmt.get("resolution", "") or "N/A"
-                ext = fmt.get("ext", "")
-                vcodec = fmt.get("vcodec", "none")
-                acodec = fmt.get("acodec", "none")
-                filesize = fmt.get("filesize") or fmt.get("filesize_approx")
-                bitrate = fmt.get("tbr")
-                
-                # Determine media type
-                if vcodec != "none" and acodec != "none":
-                    media_type = "Video+Audio"
-                elif vcodec != "none":
-                    media_type = "Video only"
-                else:
-                    media_type = "Audio only"
-                
-                # Format details string
-                details = [f"ID:{fmt_id}"]
-                if filesize:
-                    details.append(humanize.naturalsize(filesize))
-                if bitrate:
-                    details.append(f"{bitrate:.1f} kbps")
-                if fmt.get("format_note"):
-                    details.append(fmt.get("format_note"))
-                if vcodec != "none":
-                    details.append(f"vcodec:{vcodec.split('.')[0]}")
-                if acodec != "none":
-                    details.append(f"acodec:{acodec.split('.')[0]}")
-                
-                details_str = " | ".join(details)
-                if details_str:
-                    details_str = f" ({details_str})"
-                
-                label = f"{resolution} {ext} - {media_type}{details_str}"
-                format_options.append((label, fmt))
-            
-            # Sort formats and update UI
-            format_options.sort(key=self._format_sort_key, reverse=True)
-            self.root.after(0, lambda: self._update_formats(format_options))
-            
-        except Exception as e:
-            self.root.after(0, lambda: self.status_var.set(f"Error: {str(e)[:50]}"))
-    
-    def _format_sort_key(self, format_item):
-        _, fmt = format_item
-        
-        # Prioritize merged formats
-        if fmt.get("is_merged", False):
-            height_str = fmt.get("resolution", "0p").replace("≤", "").replace("p", "")
-            return (10, int(height_str) if height_str.isdigit() else 0, 0, 0)
-        
-        # Parse height from resolution
-        height = 0
-        resolution = fmt.get("resolution", "")
-        match = re.search(r"(\d+)x(\d+)", resolution)
-        if match:
-            height = int(match.group(2))
-        
-        # Categorize format type
-        vcodec = fmt.get("vcodec", "none")
-        acodec = fmt.get("acodec", "none")
-        if vcodec != "none" and acodec != "none":
-            format_type = 3  # Combined
-        elif vcodec != "none":
-            format_type = 2  # Video only
-        else:
-            format_type = 1  # Audio only
-            
-        # Consider quality metrics
-        bitrate = fmt.get("tbr", 0) or fmt.get("vbr", 0) or fmt.get("abr", 0) or 0
-        filesize = fmt.get("filesize", 0) or fmt.get("filesize_approx", 0) or 0
+            raise RuntimeError("Failed to get URL")
         
-        return (format_type, height, bitrate, filesize)
+        # Get format info
+        video_data = await self.prefetcher.fetch(video_url, video.get("id"))
+        return self._format_options(video_data.get("formats", []))
+    
+    def _format_options(self, formats):
+        format_options = []
+        
+        # Add merged formats for common resolutions
+        for quality, height in [("360p", 360), ("480p", 480), ("720p", 720), 
+                              ("1080p", 1080), ("1440p", 1440), ("2160p", 2160)]:
+            merged_format = {
+                "format_id": f"bestvideo[height<={height}]+bestaudio/best[height<={height}]",
+                "ext": "mp4",
+                "is_merged": True,
+                "resolution": f"≤{quality}",
+                "format_note": f"Best {quality} merged"
+            }
+            
+            label = f"MERGED: Best video+audio (≤{quality})"
+            format_options.append((label, merged_format))
+        
+        # Add individual formats, best first
+        table = FormatTable(formats)
+        for i in table.order:
+            fmt = table.formats[i]
+            fmt_id = fmt.get("format_id", "")
+            resolution = fmt.get("resolution", "") or "N/A"
+            vcodec, acodec = table.vcodec[i], table.acodec[i]
+            
+            # Format details string
+            details = [f"ID:{fmt_id}"]
+            if table.filesize[i]:
+                details.append(humanize.naturalsize(table.filesize[i]))
+            if fmt.get("tbr"):
+                details.append(f"{fmt['tbr']:.1f} kbps")
+            if fmt.get("format_note"):
+                details.append(fmt.get("format_note"))
+            if vcodec != "none":
+                details.append(f"vcodec:{vcodec.split('.')[0]}")
+            if acodec != "none":
+                details.append(f"acodec:{acodec.split('.')[0]}")
+            
+            details_str = " | ".join(details)
+            if details_str:
+                details_str = f" ({details_str})"
+            
+            media_type = KIND_NAMES[table.kind[i]] if table.kind[i] != OTHER else KIND_NAMES[AUDIO]
+            label = f"{resolution} {table.ext[i]} - {media_type}{details_str}"
+            format_options.append((label, fmt))
+        
+        # Merged options already come first, highest resolution on top
+        format_options[:6] = format_options[5::-1]
+        return format_options, table
     
-    def _update_formats(self, format_options):
+    def _update_formats(self, format_options, table):
         self.formats = format_options
-        self.format_listbox.delete(0, tk.END)
-        
-        for i, (label, _) in enumerate(format_options):
-            self.format_listbox.insert(tk.END, f"{i+1}. {label}")
+        self.format_table = table
+        combined_count = 6 + table.counts[AV]
+        # Only rows that differ from what is shown get touched
+        self.format_listbox.model.set(f"{i+1}. {label}" for i, (label, _) in enumerate(format_options))
         
         if format_options:
-            combined_count = sum(1 for _, fmt in format_options 
-                                if fmt.get("is_merged", False) or 
-                                (fmt.get("vcodec", "none") != "none" and 
-                                fmt.get("acodec", "none") != "none"))
-                                
             self.status_var.set(f"Found {len(format_options)} formats ({combined_count} with video+audio)")
             self.select_best_format()
         else:
@@ -474,34 +535,51 @@ class MediaDownloaderApp:
         if not self.current_media:
             return
             
-        quality_pref = self.quality_var.get().replace('p', '')
-        target_height = int(quality_pref) if quality_pref.isdigit() else 720
+        quality = self.quality_var.get()
+        if quality == "Auto":
+            target_height = self._auto_height()
+            quality = f"Auto {target_height}p"
+        else:
+            quality_pref = quality.replace('p', '')
+            target_height = int(quality_pref) if quality_pref.isdigit() else DEFAULT_HEIGHT
         
-        # Create merged format spec
+        # Pick the streams from the table's indexes; the generic spec is the fallback
+        if self.format_table:
+            merged_spec = self.format_table.merged_spec(target_height)
+        else:
+            merged_spec = f"bestvideo[height<={target_height}]+bestaudio/best[height<={target_height}]"
         format_spec = {
-            "format_id": f"bestvideo[height<={target_height}]+bestaudio/best[height<={target_height}]",
+            "format_id": merged_spec,
             "ext": "mp4",
             "is_merged": True,
-            "format_note": f"Best {self.quality_var.get()} merged",
-            "resolution": f"≤{self.quality_var.get()}"
+            "is_auto": self.quality_var.get() == "Auto",
+            "format_note": f"Best {quality} merged",
+            "resolution": f"≤{quality}"
         }
         
         self.selected_format = format_spec
         self._set_button_states({"play": True, "download": True})
-        self.status_var.set(f"Selected best quality (≤{self.quality_var.get()})")
+        self.status_var.set(f"Selected best quality (≤{quality})")
         
         # Update format selection in listbox
         self.format_listbox.selection_clear(0, tk.END)
-        merged_format_text = f"0. MERGED: Best video+audio (≤{self.quality_var.get()})"
+        merged_format_text = f"0. MERGED: Best video+audio (≤{quality})"
         
         # Add or update merged option at top
         if self.format_listbox.size() > 0 and self.format_listbox.get(0).startswith("0. MERGED:"):
-            self.format_listbox.delete(0)
-        
-        self.format_listbox.insert(0, merged_format_text)
+            self.format_listbox.model.replace(0, merged_format_text)
+        else:
+            self.format_listbox.insert(0, merged_format_text)
         self.format_listbox.selection_set(0)
         self.format_listbox.see(0)
     
+    def _auto_height(self):
+        """Tallest height the measured bandwidth sustains for the current formats"""
+        table = self.format_table
+        if not table:
+            return DEFAULT_HEIGHT
+        return auto_height(table, self.engine.bandwidth.estimate()) or DEFAULT_HEIGHT
+    
     def on_format_selected(self, event):
         selection = self.format_listbox.curselection()
         if not selection:
@@ -513,155 +591,121 @@ class MediaDownloaderApp:
             self._set_button_states({"play": True, "download": True})
             self.status_var.set("Format selected. Ready to play or download.")
     
+    def _local_path(self, video):
+        path = video.get("path")
+        return path if path and os.path.exists(path) else None
+    
     def play_media(self):
-        if not self.current_media or not self.selected_format:
+        local_path = self._local_path(self.current_media) if self.current_media else None
+        if not self.current_media or not (self.selected_format or local_path):
             messagebox.showwarning("Selection Error", "Please select media and format first.")
             return
         
         self.stop_media()
         self.is_paused = False
         self.pause_button.config(text="⏸️ Pause")
+        
+        if local_path:
+            self.play_started = time.perf_counter()
+            self._start_player(local_path)
+            return
             
         video_url = self.current_media.get("webpage_url", "")
         if not video_url:
             messagebox.showwarning("URL Error", "Failed to retrieve URL.")
             return
             
-        self.status_var.set("Preparing media for playback...")
-        threading.Thread(target=self._setup_streaming, args=(video_url,), daemon=True).start()
+        # Auto quality follows the bandwidth measured since the format was picked
+        if self.selected_format.get("is_auto"):
+            self.select_best_format()
+        
+        self.status_var.set("Extracting streams..." if self.selected_format.get("is_merged") 
+                            else "Preparing media for playback...")
+        self.play_started = time.perf_counter()
+        # Streams come from the cached format table, with fresh URLs
+        format_spec = self.selected_format.get("format_id", "best")
+        video_id = self.current_media.get("id")
+        self.tasks.latest("play", lambda: self.engine.info_cache.aselect(video_url, format_spec, video_id),
+                          on_result=self._play_streams,
+                          on_error=lambda e: self.status_var.set(f"Error: {str(e)[:50]}"))
     
-    def _setup_streaming(self, video_url):
-        """Prepare media for playback with proper format handling"""
+    def _play_streams(self, chosen):
+        """Play the formats picked for the selected format"""
+        if len(chosen) < 2:
+            # A single format, or a merged choice that came back as one
+            self._start_player(chosen[0]["url"])
+            return
+        
+        # For merged formats, serve a live mux of video and audio while VLC is
+        # already playing instead of merging to a file first, copying the audio
+        # whenever its codec fits the container
+        # VLC paces the mux, so its rate only ever raises the estimate
+        video_fmt, audio_fmt = chosen[0], chosen[1]
+        muxer = StreamMuxer(video_fmt["url"], audio_fmt["url"], self._get_ffmpeg_path(),
+                            vcodec=video_fmt.get("vcodec"), acodec=audio_fmt.get("acodec"),
+                            meter=self.engine.bandwidth.meter(lower_bound=True))
         try:
-            # Get format specification
-            is_merged = self.selected_format.get("is_merged", False)
-            format_spec = self.selected_format.get("format_id", "best")
-            
-            # Create a unique temp directory for this playback session
-            temp_id = f"playback_{int(time.time())}"
-            temp_path = os.path.join(self.temp_dir, temp_id)
-            os.makedirs(temp_path, exist_ok=True)
-            
-            if is_merged:
-                # For merged formats, we'll download video and audio separately 
-                # and handle the merging ourselves or use direct FFmpeg streaming
-                self.root.after(0, lambda: self.status_var.set("Extracting streams..."))
-                
-                # Get best video and audio URLs based on format spec
-                cmd = ["yt-dlp", "-f", format_spec, "-g", video_url]
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                stream_urls = result.stdout.strip().split('\n')
-                
-                if len(stream_urls) >= 2:
-                    # We have separate video and audio URLs
-                    video_url = stream_urls[0]
-                    audio_url = stream_urls[1]
-                    
-                    # Create a merged stream file for VLC
-                    merged_path = os.path.join(temp_path, "merged_stream.mp4")
-                    
-                    # Use FFmpeg to create a playable file
-                    ffmpeg_cmd = [
-                        "ffmpeg", "-y", "-i", video_url, "-i", audio_url,
-                        "-c:v", "copy", "-c:a", "aac", merged_path
-                    ]
-                    
-                    # Run FFmpeg process with progress monitoring
-                    process = subprocess.Popen(
-                        ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                        universal_newlines=True
-                    )
-                    
-                    # Monitor progress
-                    for line in process.stdout:
-                        if "time=" in line:
-                            # Update status with processing progress
-                            self.root.after(0, lambda l=line: 
-                                         self.status_var.set(f"Processing: {l.strip()}"))
-                    
-                    process.wait()
-                    
-                    # Start playback once file is ready
-                    if process.returncode == 0 and os.path.exists(merged_path):
-                        self.root.after(0, lambda: self._start_player(merged_path))
-                    else:
-                        # If FFmpeg fails, try direct play with the video URL
-                        self.root.after(0, lambda: self._start_player(video_url))
-                else:
-                    # If we only got one URL, just use it
-                    self.root.after(0, lambda: self._start_player(stream_urls[0]))
-            else:
-                # For single formats, just get the URL and play directly
-                cmd = ["yt-dlp", "-f", format_spec, "-g", video_url]
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                stream_url = result.stdout.strip().split('\n')[0]
-                self.root.after(0, lambda: self._start_player(stream_url))
-            
-        except Exception as e:
-            self.root.after(0, lambda: self.status_var.set(f"Error: {str(e)[:50]}"))
+            mux_url = muxer.start()
+        except OSError:
+            # If FFmpeg can't run, let VLC fetch the audio as a slave input
+            self._start_player(video_fmt["url"], audio_url=audio_fmt["url"])
+            return
+        self._start_player(mux_url, muxer=muxer)
     
-    def _start_player(self, stream_url):
+    def _start_player(self, stream_url, muxer=None, audio_url=None):
         # Clean up existing player
         self._cleanup_player()
+        self.muxer = muxer
             
-        # Create new player with enhanced options
-        instance = vlc.Instance('--input-repeat=1', '--no-video-title-show')
-        self.player = instance.media_player_new()
-        
-        # Set media
-        media = instance.media_new(stream_url)
-        self.player.set_media(media)
-        
-        # Set hardware acceleration if available
-        self.player.set_hwnd(self.preview_canvas.winfo_id())
+        # Reuse the shared player; events are hooked up before the new media starts
+        player = self.player_service.acquire()
+        player.set_hwnd(self.preview_canvas.winfo_id())
+        self.playback.attach(player)
         
         # Start playback
-        self.player.play()
+        options = [f":input-slave={audio_url}"] if audio_url else []
+        self.player = self.player_service.play(stream_url, *options)
         
         # Update UI
-        self.status_var.set("Playing media...")
+        if muxer:
+            self.status_var.set(f"Playing media (audio {muxer.audio_mode})...")
+        else:
+            self.status_var.set("Playing media...")
         self._set_button_states({"play": False, "pause": True, "stop": True})
         
         # Reset pause state
         self.is_paused = False
         self.pause_button.config(text="⏸️ Pause")
-        
-        # Start playback updates
-        self.root.after(500, self._update_playback)
     
-    def _update_playback(self):
-        if not self.player:
+    def _on_video_output(self, count):
+        # Report time-to-first-frame once video output starts
+        if count:
+            self._report_first_frame()
+    
+    def _report_first_frame(self):
+        if self.play_started is None:
             return
             
-        try:
-            # Get player state
-            state = self.player.get_state()
-            
-            if state in [vlc.State.Playing, vlc.State.Paused]:
-                # Update position and time
-                current_ms = self.player.get_time()
-                length = self.player.get_length()
-                
-                if length > 0 and not self.slider_dragging:
-                    # Update slider and time display
-                    self.slider.set((current_ms / length) * 100)
-                    current_sec, total_sec = current_ms // 1000, length // 1000
-                    self.time_var.set(f"{self._format_time(current_sec)} / {self._format_time(total_sec)}")
-                
-                # Schedule next update
-                self.timer_id = self.root.after(500, self._update_playback)
-            elif state == vlc.State.Ended:
-                self.stop_media()
-                self.status_var.set("Playback finished")
-            elif state == vlc.State.Error:
-                self.stop_media()
-                self.status_var.set("Playback error occurred")
-            else:
-                # Continue checking (still loading or in transition)
-                self.timer_id = self.root.after(500, self._update_playback)
-        except Exception as e:
-            self.stop_media()
-            self.status_var.set(f"Playback error: {str(e)[:50]}")
+        elapsed = time.perf_counter() - self.play_started
+        self.play_started = None
+        audio = f"audio {self.muxer.audio_mode}, " if self.muxer else ""
+        self.status_var.set(f"Playing media ({audio}first frame after {elapsed:.2f}s)")
+    
+    def _on_playback_time(self, current_ms):
+        length = self.playback.length
+        if length > 0 and not self.slider_dragging:
+            # Update slider and time display
+            self.slider.set((current_ms / length) * 100)
+            current_sec, total_sec = current_ms // 1000, length // 1000
+            self.time_var.set(f"{self._format_time(current_sec)} / {self._format_time(total_sec)}")
+    
+    def _on_playback_end(self):
+        self.stop_media()
+        self.status_var.set("Playback finished")
+    
+    def _on_playback_error(self):
+        self.stop_media()
+        self.status_var.set("Playback error occurred")
     
     def toggle_pause(self):
         if not self.player:
@@ -687,6 +731,8 @@ class MediaDownloaderApp:
             self.player.set_position(position)
     
     def stop_media(self):
+        # A stream still being prepared should not start playing after all
+        self.tasks.cancel("play")
         self._cleanup_player()
         
         # Reset UI
@@ -699,21 +745,23 @@ class MediaDownloaderApp:
         self.is_paused = False
         self.pause_button.config(text="⏸️ Pause")
         
-        # Re-enable play if format selected
-        if self.selected_format:
+        # Re-enable play if format selected (or the media is in the library)
+        if self.selected_format or (self.current_media and self._local_path(self.current_media)):
             self.play_button["state"] = tk.NORMAL
     
     def _cleanup_player(self):
-        # Cancel update timer
-        if self.timer_id:
-            self.root.after_cancel(self.timer_id)
-            self.timer_id = None
+        # Stop position updates
+        self.playback.detach()
             
         # Stop player
         if self.player:
-            self.player.stop()
-            self.player.release()
+            self.player_service.stop()
             self.player = None
+            
+        # Stop live mux
+        if self.muxer:
+            self.muxer.close()
+            self.muxer = None
     
     def download_media(self):
         if not self.current_media or not self.selected_format:
@@ -745,87 +793,91 @@ class MediaDownloaderApp:
         is_merged = self.selected_format.get("is_merged", False)
         format_spec = self.selected_format.get("format_id", "best")
         
-        # Start download
-        self.status_var.set("Starting download...")
+        # Extra options for merged formats to ensure proper handling
+        args = []
+        if is_merged:
+            ext = os.path.splitext(save_path)[1].lstrip('.') or "mp4"
+            args = [
+                "--merge-output-format", ext,
+                "--remux-video", ext,
+                "--ffmpeg-location", self._get_ffmpeg_path()
+            ]
+        
+        # Plain HTTP formats are fetched directly so they can resume after a crash
+        direct = not is_merged and self.selected_format.get("protocol") in ("http", "https")
+        
+        # Queue download; the manager reports back through _on_download_event
+        self.current_job = self.engine.downloads.add(video_url, save_path, format_spec, args, title,
+                                              video_id=self.current_media.get("id"), direct=direct)
         self.progress["value"] = 0
-        self._set_button_states({"download": False, "cancel": True})
+        self._set_button_states({"cancel": True})
         
-        threading.Thread(
-            target=self._download_thread, 
-            args=(video_url, format_spec, save_path, is_merged),
-            daemon=True
-        ).start()
+        active = len(self.engine.downloads.active())
+        self.status_var.set(f"Download queued ({active} running)")
     
-    def _download_thread(self, video_url, format_spec, output_path, is_merged):
-        try:
-            # Build command
-            cmd = ["yt-dlp", "-f", format_spec, "-o", output_path, "--newline"]
-            
-            # Add specific options for merged formats to ensure proper handling
-            if is_merged:
-                ext = os.path.splitext(output_path)[1].lstrip('.') or "mp4"
-                cmd.extend([
-                    "--merge-output-format", ext,
-                    "--remux-video", ext,
-                    "--ffmpeg-location", self._get_ffmpeg_path()
-                ])
-            
-            cmd.append(video_url)
-            
-            # Run download process
-            self.current_download_process = subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
-            )
-            
-            # Monitor progress
-            for line in self.current_download_process.stdout:
-                if self.current_download_process is None:  # Check if cancelled
-                    break
-                    
-                if "%" in line:
-                    try:
-                        match = re.search(r'(\d+\.?\d*)%', line)
-                        if match:
-                            percent = float(match.group(1))
-                            self.root.after(0, lambda p=percent, l=line: 
-                                        self.progress.configure(value=p) or 
-                                        self.status_var.set(f"Downloading: {p:.1f}% - {l.strip()}"))
-                    except Exception:
-                        self.root.after(0, lambda l=line: self.status_var.set(f"Download: {l.strip()}"))
-            
-            if self.current_download_process:  # Check if not cancelled
-                self.current_download_process.wait()
-                
-                if self.current_download_process.returncode == 0:
-                    self.root.after(0, lambda: self._download_complete(output_path))
-                else:
-                    self.root.after(0, lambda: self._download_failed("Download failed"))
-                
-        except Exception as e:
-            self.root.after(0, lambda: self._download_failed(str(e)))
-        finally:
-            self.current_download_process = None
+    def _on_download_event(self, event, job):
+        """Update the UI for download manager events (runs on the Tk thread)"""
+        if self.engine.batch.owns(job.id):
+            # Batch items report through _on_batch_event
+            return
+        if event == "started":
+            self.status_var.set(f"Downloading: {job.title}")
+        elif event == "progress":
+            if job is self.current_job:
+                self.progress["value"] = job.percent
+                rate = f" at {humanize.naturalsize(job.speed)}/s" if job.speed else ""
+                eta = f", {self._format_time(job.eta)} left" if job.eta is not None else ""
+                self.status_var.set(f"Downloading: {job.percent:.1f}%{rate}{eta} - {job.title}")
+        elif event in ("finished", "failed", "cancelled"):
+            # Follow another running download once the current one is done
+            if job is self.current_job:
+                active = [j for j in self.engine.downloads.active() if not self.engine.batch.owns(j.id)]
+                self.current_job = active[0] if active else None
+            self._set_button_states({"cancel": self.current_job is not None or self._batch_left() > 0})
+            
+            if event == "finished":
+                self._download_complete(job.result_path or job.output)
+            elif event == "failed":
+                self._download_failed(job.error)
+            else:
+                self.progress["value"] = 0
+                self.status_var.set("Download cancelled")
 
+    def start_batch(self, source):
+        """Download every video of a playlist, channel or file of URLs"""
+        if not messagebox.askyesno("Batch Download", 
+                                   f"Download every video of:\n{source}\n\ninto {self.downloads_dir}?"):
+            return
+        self.engine.batch.add([source])
+        self.status_var.set(f"Batch: listing {source}")
+    
+    def _on_batch_event(self, event, item):
+        """Show batch progress in the status bar (runs on the Tk thread)"""
+        counts = self.engine.batch.counts()
+        summary = (f"{counts.get('finished', 0)} done, {counts.get('skipped', 0)} skipped, "
+                   f"{counts.get('failed', 0)} failed")
+        left = self._batch_left()
+        if event == "done":
+            self.status_var.set(f"Batch finished: {summary}")
+        else:
+            listing = ", still listing" if self.engine.batch.expanding else ""
+            self.status_var.set(f"Batch: {summary}, {left} left{listing}")
+        self._set_button_states({"cancel": self.current_job is not None or left > 0})
+    
+    def _batch_left(self):
+        counts = self.engine.batch.counts()
+        return counts.get("pending", 0) + counts.get("queued", 0)
+    
     def cancel_download(self):
-        """Cancel the current download process"""
-        if self.current_download_process:
-            # Terminate the process
-            try:
-                self.current_download_process.terminate()
-                self.current_download_process = None
-                
-                self.root.after(0, lambda: (
-                    self.status_var.set("Download cancelled"),
-                    self.progress.configure(value=0),
-                    self._set_button_states({"download": True, "cancel": False})
-                ))
-            except Exception as e:
-                self.root.after(0, lambda: self.status_var.set(f"Error cancelling: {str(e)[:50]}"))
+        """Cancel the current download, or else the running batch"""
+        if self.current_job:
+            self.engine.downloads.cancel(self.current_job.id)
+        elif self._batch_left() and messagebox.askyesno("Cancel Batch", "Cancel the rest of the batch?"):
+            self.engine.batch.cancel()
 
     def _download_complete(self, path):
         self.progress["value"] = 100
         self.status_var.set("Download complete!")
-        self._set_button_states({"download": True, "cancel": False})
         
         messagebox.showinfo(
             "Download Complete", 
@@ -835,7 +887,6 @@ class MediaDownloaderApp:
     def _download_failed(self, error_msg):
         self.progress["value"] = 0
         self.status_var.set(f"Download failed: {error_msg}")
-        self._set_button_states({"download": True, "cancel": False})
         
         messagebox.showerror("Download Error", f"Failed to download media: {error_msg}")
 
@@ -938,7 +989,9 @@ if __name__ == "__main__":
     app = MediaDownloaderApp(root)
     
     # Setup cleanup on exit
-    root.protocol("WM_DELETE_WINDOW", lambda: (app.cleanup_temp_files(), root.destroy()))
+    root.protocol("WM_DELETE_WINDOW", lambda: (app.tasks.close(), app.engine.close(), app._cleanup_player(), 
+                                               app.player_service.close(), app.thumbnails.close(), app.cleanup_temp_files(), 
+                                               root.destroy()))
     
     # Start main loop
     root.mainloop()
\ No newline at end of file
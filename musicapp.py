@@ -1,6 +1,16 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import subprocess, json, vlc, threading, os, time, re, humanize, sys
+import subprocess, os, time, re, humanize, sys
+from ytplayer.extractor import CancelToken, SEARCH_PAGE
+from ytplayer.cache import normalize_query
+from ytplayer.playback import PlaybackController, PlayerService, PlayQueue
+from ytplayer.listview import VirtualList
+from ytplayer.formats import AUDIO, FormatTable
+from ytplayer.batch import is_batch_source
+from ytplayer.engine import Engine
+from ytplayer.fsutil import DirLocked
+from ytplayer.orchestrator import Orchestrator, run_blocking
+from ytplayer.prefetch import FormatPrefetcher
 
 class App:
     def __init__(self, root):
@@ -13,14 +23,39 @@ class App:
         self.tracks = []
         self.player = self.current = None
         self.fmt = self.avail_fmts = []
-        self.cache = {}
         self.dl_dir = os.path.join(os.path.expanduser("~"), "Downloads", "MusicPlayer")
         os.makedirs(self.dl_dir, exist_ok=True)
-        self.timer = None
+        self.playback = PlaybackController(lambda fn: self.root.after(0, fn), on_time=self._on_time,
+                                           on_end=self._on_end, on_error=self._on_error)
+        self.players = PlayerService('--no-video', '--quiet')
+        self.queue = PlayQueue()
+        self.playing = None
+        self.next_up = None  # (queue key, stream url) resolved ahead of time
+        # Playlist/channel URLs (or file:<path> to a list of URLs) in the search box download as a batch
+        try:
+            self.engine = Engine(self.dl_dir, workers=4, batch_format="bestaudio/best")
+        except DirLocked as e:
+            messagebox.showerror("Already Running", str(e))
+            self.root.destroy()
+            raise SystemExit(1)
+        # Lookups run on one asyncio loop, a newer one of a kind cancelling the last
+        self.tasks = Orchestrator(lambda fn: self.root.after(0, fn))
+        # Formats of likely next picks load while nothing else does; the
+        # player only ever needs their audio formats
+        self.prefetcher = FormatPrefetcher(self.tasks, self.engine.info_cache,
+                                           lookup=self.engine.audio.afetch, cached=self.engine.audio.get)
         self.paused = self.dragging = False
+        self.search_token = self.search_q = self.live_timer = None
+        self.search_offset = 0
         
         self.create_ui()
         self.search_entry.focus_set()
+        
+        # Download queue and batch, restored from the last session
+        self.dl_job = None
+        self.engine.downloads.subscribe(lambda ev, job: self.root.after(0, lambda: self._on_dl(ev, job)))
+        self.engine.batch.subscribe(lambda ev, item: self.root.after(0, lambda: self._on_batch(ev, item)))
+        self.engine.start()
     
     def create_ui(self):
         mf = ttk.Frame(self.root, padding="10")
@@ -39,8 +74,14 @@ class App:
         self.search_entry = ttk.Entry(sf, textvariable=self.search_var, font=('Helvetica', 11))
         self.search_entry.grid(row=0, column=0, sticky="ew", padx=(0, 5))
         self.search_entry.bind('<Return>', lambda e: self.search())
+        self.search_entry.bind('<KeyRelease>', self._on_key)
         
         ttk.Button(sf, text="🔍", command=self.search).grid(row=0, column=1, sticky="e")
+        self.more_btn = ttk.Button(sf, text="More", command=self.more, state=tk.DISABLED, width=5)
+        self.more_btn.grid(row=0, column=2, sticky="e", padx=(5, 0))
+        
+        self.live = tk.BooleanVar(value=False)
+        ttk.Checkbutton(sf, text="Live", variable=self.live).grid(row=0, column=3, padx=(5, 0))
         
         # Info label
         ttk.Label(mf, text="Player: VLC Media Player | Downloader: yt-dlp", 
@@ -52,14 +93,15 @@ class App:
         lf.columnconfigure(0, weight=1)
         lf.rowconfigure(0, weight=1)
         
-        self.list = tk.Listbox(lf, font=('Helvetica', 10), 
-                              selectbackground="#006eff", selectforeground="white")
+        self.list = VirtualList(lf, font=('Helvetica', 10), 
+                                selectbackground="#006eff", selectforeground="white")
         sb = ttk.Scrollbar(lf, orient="vertical", command=self.list.yview)
         self.list.config(yscrollcommand=sb.set)
         
         self.list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(5, 0), pady=5)
         sb.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 5), pady=5)
         self.list.bind('<<ListboxSelect>>', self.on_select)
+        self.list.bind('<<ListboxHover>>', lambda e: self.prefetcher.focus(*self.tracks[self.list.hovered:][:1]))
         
         # Track info
         if_frame = ttk.Frame(mf)
@@ -84,7 +126,15 @@ class App:
         self.pause_btn = ttk.Button(btns, text="⏸", command=self.toggle_pause, state=tk.DISABLED, width=3)
         self.stop_btn = ttk.Button(btns, text="⏹", command=self.stop, state=tk.DISABLED, width=3)
         
-        for b in (self.play_btn, self.pause_btn, self.stop_btn): b.pack(side=tk.LEFT, padx=3)
+        self.next_btn = ttk.Button(btns, text="⏭", command=self.play_next, state=tk.DISABLED, width=3)
+        
+        for b in (self.play_btn, self.pause_btn, self.stop_btn, self.next_btn): b.pack(side=tk.LEFT, padx=3)
+        
+        ttk.Button(btns, text="➕", command=self.enqueue, width=3).pack(side=tk.LEFT, padx=3)
+        ttk.Button(btns, text="➕ All", command=self.enqueue_all, width=6).pack(side=tk.LEFT)
+        
+        self.queue_var = tk.StringVar(value="Queue: 0")
+        ttk.Label(btns, textvariable=self.queue_var).pack(side=tk.LEFT, padx=5)
         
         # Download controls
         dlf = ttk.Frame(cf)
@@ -97,6 +147,8 @@ class App:
         self.dl_btn = ttk.Button(dlf, text="⬇", command=self.download, state=tk.DISABLED, width=3)
         self.dl_btn.pack(side=tk.LEFT, padx=5)
         
+        ttk.Button(dlf, text="⬇ All", command=self.download_all, width=6).pack(side=tk.LEFT)
+        
         # Progress bar
         pf = ttk.Frame(mf)
         pf.grid(row=5, column=0, sticky="ew", pady=5)
@@ -121,54 +173,87 @@ class App:
             self.player.set_time(int(length * (pos / 100)))
         self.dragging = False
     
-    def run_cmd(self, cmd, capture=True, check=False):
-        si = None
-        if os.name == 'nt':
-            si = subprocess.STARTUPINFO()
-            si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        
-        return subprocess.run(cmd, capture_output=capture, text=True, 
-                           startupinfo=si, check=check) if capture else \
-               subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
-                             text=True, startupinfo=si)
-    
-    def search(self):
-        q = self.search_var.get().strip()
+    def search(self, live=False):
+        q = normalize_query(self.search_var.get())
         if not q:
             messagebox.showwarning("Input Error", "Please enter a search query.")
             return
         
-        self.stop()
+        src = self.search_var.get().strip()
+        if is_batch_source(src):
+            if not live and messagebox.askyesno("Batch Download", f"Download every track of:\n{src}?"):
+                self.engine.batch.add([src])
+                self.status.set(f"Batch: listing {src}")
+            return
+        
+        # Typing must not interrupt whatever is playing
+        if not live: self.stop()
         self.status.set(f"Searching for: {q}")
-        threading.Thread(target=self._search_thread, args=(q,), daemon=True).start()
+        self.tracks = []
+        self.list.delete(0, tk.END)
+        self.search_q, self.search_offset = q, 0
+        self._start_search(q, 0)
 
-    def _search_thread(self, q):
-        try:
-            if q in self.cache:
-                tracks = self.cache[q]
-            else:
-                result = self.run_cmd(["yt-dlp", "--flat-playlist", "--quiet", "--dump-json", f"ytsearch20:{q}"], check=True)
-                tracks = [json.loads(line) for line in result.stdout.splitlines()]
-                self.cache[q] = tracks
-                
-            self.root.after(0, lambda: self._update_results(tracks))
-        except Exception as e:
-            self.root.after(0, lambda: self.status.set(f"Search error: {str(e)[:50]}"))
+    def _on_key(self, e):
+        if not self.live.get() or e.keysym == "Return": return
+        # Debounce: only search once typing pauses
+        if self.live_timer: self.root.after_cancel(self.live_timer)
+        self.live_timer = self.root.after(300, self._live_search)
 
-    def _update_results(self, tracks):
-        self.tracks = tracks
-        self.list.delete(0, tk.END)
-        
-        if not tracks:
+    def _live_search(self):
+        self.live_timer = None
+        q = normalize_query(self.search_var.get())
+        if len(q) < 2 or q == self.search_q: return
+        self.search(live=True)
+
+    def more(self):
+        if not self.search_q: return
+        self.search_offset += SEARCH_PAGE
+        self.status.set("Loading more...")
+        self._start_search(self.search_q, self.search_offset)
+
+    def _start_search(self, q, start):
+        # Newer searches kill the yt-dlp run still streaming an older one
+        if self.search_token: self.search_token.cancel()
+        token = self.search_token = CancelToken()
+        self.more_btn["state"] = tk.DISABLED
+        
+        def show(tracks, replace=False):
+            self.root.after(0, lambda: token is self.search_token and self._update_results(tracks, replace))
+        
+        # Downloaded tracks show up straight away, then results one by one as yt-dlp prints them
+        self.tasks.latest("search", lambda: run_blocking(self.engine.search, q, start, SEARCH_PAGE, token, show,
+                                                         cancel=token),
+                          on_result=lambda tracks: self._search_done(token),
+                          on_error=lambda e: self._search_done(token, str(e) or e.__class__.__name__))
+
+    def _search_done(self, token, err=None):
+        if token is not self.search_token: return
+        
+        self.more_btn["state"] = tk.NORMAL if self.tracks and not err else tk.DISABLED
+        if not err: self.prefetcher.results(self.tracks)
+        local = sum(1 for t in self.tracks if t.get("local"))
+        if err and local:
+            self.status.set(f"Offline: {local} local tracks")
+        elif err:
+            self.status.set(f"Search error: {err[:50]}")
+        elif not self.tracks:
             self.status.set("No tracks found.")
-            return
-            
-        for i, t in enumerate(tracks):
+
+    def _update_results(self, tracks, replace=False):
+        if replace:
+            self.tracks = []
+            self.list.delete(0, tk.END)
+        
+        for t in tracks:
             title = t.get("title", "N/A")
             dur = self.fmt_time(t.get("duration", 0))
-            self.list.insert(tk.END, f"{i+1}. {title} [{dur}]")
+            mark = "💾 " if t.get("local") else ""
+            self.list.insert(tk.END, f"{len(self.tracks) + 1}. {mark}{title} [{dur}]")
+            self.tracks.append(t)
         
-        self.status.set(f"Found {len(tracks)} tracks")
+        local = sum(1 for t in self.tracks if t.get("local"))
+        self.status.set(f"Found {len(self.tracks)} tracks ({local} local)" if local else f"Found {len(self.tracks)} tracks")
 
     def fmt_time(self, secs):
         if not secs: return "--:--"
@@ -181,7 +266,8 @@ class App:
         sel = self.list.curselection()
         if not sel: return
         
-        self.stop()
+        # Browsing while the queue plays should not interrupt it
+        if not self.playing: self.stop()
         
         for b in [self.play_btn, self.pause_btn, self.dl_btn]: b["state"] = tk.DISABLED
         
@@ -195,59 +281,73 @@ class App:
         self.current = track
         
         self.title_var.set(track.get("title", "Unknown Title"))
+        
+        if self._local_path(track):
+            # Already downloaded, no format lookup needed
+            self.tasks.cancel("formats")
+            ext = os.path.splitext(track["path"])[1].lstrip(".")
+            self.fmt = {"format_id": "local", "ext": ext, "display_name": "Local file", "is_special": True}
+            self.avail_fmts = [self.fmt]
+            self.fmt_sel["values"] = ["Local file"]
+            self.fmt_sel.current(0)
+            self.info_var.set(f"Duration: {self.fmt_time(track.get('duration', 0))} | Format: {ext} | Local file")
+            self.play_btn["state"] = tk.NORMAL
+            self.status.set(f"Local: {track['path']}")
+            return
+        
         self.info_var.set(f"Duration: {self.fmt_time(track.get('duration', 0))} | Loading format info...")
         
-        threading.Thread(target=self._fetch_formats, args=(track,), daemon=True).start()
+        # Quick browsing only ever finishes the lookup of the last track
+        self.tasks.latest("formats", lambda: self._fetch_formats(track),
+                          on_result=lambda result: self._update_formats(*result),
+                          on_error=self._format_error)
         self.status.set("Finding available formats...")
+        self.prefetcher.focus(*self.tracks[idx + 1:idx + 2], *self.tracks[max(0, idx - 1):idx])
 
-    def _fetch_formats(self, track):
+    async def _fetch_formats(self, track):
         url = track.get("webpage_url", "")
         if not url:
-            self.root.after(0, lambda: self.status.set("Failed to get track URL"))
-            return
+            raise RuntimeError("Failed to get track URL")
             
-        try:
-            result = self.run_cmd(["yt-dlp", "-J", url], check=True)
-            data = json.loads(result.stdout)
-            fmts = data.get("formats", [])
+        data = await self.prefetcher.fetch(url, track.get("id"))
+        fmts = data.get("formats", [])
+        
+        # Add special formats first
+        proc_fmts = [
+            {"format_id": "bestaudio/best", "ext": "best", "display_name": "Best Audio Quality (auto format)", "is_special": True},
+            {"format_id": "mp3", "ext": "mp3", "display_name": "MP3 Audio (converted)", "is_special": True}
+        ]
+        
+        # Include formats carrying audio, highest bitrate first
+        table = FormatTable(fmts)
+        for i in table.audio_order:
+            f = table.formats[i]
+            abr = table.abr[i] or table.tbr[i]
+            br_str = f"{abr:.1f}kbps" if abr else "?"
+            fsize = table.filesize[i]
+            size_str = humanize.naturalsize(fsize) if fsize else "?"
+            is_audio = table.kind[i] == AUDIO
+            type_str = "Audio" if is_audio else "A+V"
             
-            # Add special formats first
-            proc_fmts = [
-                {"format_id": "bestaudio/best", "ext": "best", "display_name": "Best Audio Quality (auto format)", "is_special": True},
-                {"format_id": "mp3", "ext": "mp3", "display_name": "MP3 Audio (converted)", "is_special": True}
-            ]
+            details = [f.get("format_id", "unknown"), table.ext[i] or "unknown", type_str, br_str]
             
-            # Include audio formats
-            for f in fmts:
-                if f.get("acodec", "none") != "none":
-                    ext = f.get("ext", "unknown")
-                    fid = f.get("format_id", "unknown")
-                    abr = f.get("abr", f.get("tbr", 0))
-                    br_str = f"{abr:.1f}kbps" if abr else "?"
-                    fsize = f.get("filesize", None) or f.get("filesize_approx", None)
-                    size_str = humanize.naturalsize(fsize) if fsize else "?"
-                    is_audio = f.get("vcodec", "") == "none"
-                    type_str = "Audio" if is_audio else "A+V"
-                    
-                    details = [fid, ext, type_str, br_str]
-                    
-                    if not is_audio and f.get("height"):
-                        details.append(f"{f.get('height')}p")
-                    
-                    details.append(size_str)
-                    
-                    f["display_name"] = " | ".join(details)
-                    proc_fmts.append(f)
+            if not is_audio and table.height[i]:
+                details.append(f"{table.height[i]}p")
             
-            self.avail_fmts = proc_fmts
-            self.fmt = proc_fmts[0] if proc_fmts else None
-            self.root.after(0, lambda: self._update_formats(proc_fmts))
+            details.append(size_str)
             
-        except Exception as e:
-            print(f"Format error: {str(e)}")
-            self.root.after(0, lambda: self.status.set(f"Error: {str(e)[:50]}"))
+            f["display_name"] = " | ".join(details)
+            proc_fmts.append(f)
+        
+        return proc_fmts, table.best_audio()
+
+    def _format_error(self, e):
+        print(f"Format error: {str(e)}")
+        self.status.set(f"Error: {str(e)[:50]}")
 
-    def _update_formats(self, fmts):
+    def _update_formats(self, fmts, best=None):
+        self.avail_fmts = fmts
+        self.fmt = fmts[0] if fmts else None
         display = [f["display_name"] for f in fmts]
         
         self.fmt_sel["values"] = display
@@ -255,17 +355,6 @@ class App:
         
         if self.fmt:
             if self.fmt.get("is_special", False):
-                best = None
-                best_q = 0
-                
-                for f in fmts:
-                    if f.get("is_special", False): continue
-                    if f.get("vcodec", "") == "none":
-                        q = f.get("abr", f.get("tbr", 0) or 0)
-                        if q > best_q:
-                            best_q = q
-                            best = f
-                
                 if best:
                     br = best.get("abr", best.get("tbr", 0))
                     fsize = best.get("filesize") or best.get("filesize_approx")
@@ -301,6 +390,10 @@ class App:
         self.stop()
         self.paused = False
         self.pause_btn.config(text="⏸")
+        
+        if self._local_path(self.current):
+            self._start_player(self.current["path"])
+            return
             
         url = self.current.get("webpage_url", "")
         if not url:
@@ -308,7 +401,13 @@ class App:
             return
             
         self.status.set("Preparing audio...")
-        threading.Thread(target=self._setup_stream, args=(url,), daemon=True).start()
+        # The special entries play the best audio format
+        fmt_id = None if self.fmt.get("is_special", False) else self.fmt.get("format_id")
+        self._setup_stream(url, fmt_id, self.current.get("id"))
+
+    def _local_path(self, track):
+        path = track.get("path")
+        return path if path and os.path.exists(path) else None
 
     def toggle_pause(self):
         if not self.player: return
@@ -324,72 +423,129 @@ class App:
             self.pause_btn.config(text="▶")
             self.status.set("Playback paused")
 
-    def _setup_stream(self, url):
-        try:
-            fmt_spec = "bestaudio/best" if self.fmt.get("is_special", False) else self.fmt.get("format_id", "bestaudio/best")
-            result = self.run_cmd(["yt-dlp", "-f", fmt_spec, "-g", url], check=True)
-            stream_url = result.stdout.strip()
-            self.root.after(0, lambda: self._start_player(stream_url))
-        except Exception as e:
-            print(f"Streaming error: {str(e)}")
-            self.root.after(0, lambda: self.status.set(f"Error: {str(e)[:50]}"))
+    def _setup_stream(self, url, fmt_id=None, vid=None, track=None):
+        self.tasks.latest("play", lambda: self.engine.audio.aresolve(url, vid, fmt_id),
+                          on_result=lambda stream_url: self._start_player(stream_url, track),
+                          on_error=self._stream_error)
 
-    def _start_player(self, stream_url):
+    def _stream_error(self, e):
+        print(f"Streaming error: {str(e)}")
+        self.status.set(f"Error: {str(e)[:50]}")
+
+    def _start_player(self, stream_url, track=None):
         self._cleanup()
             
-        inst = vlc.Instance('--no-video', '--quiet')
-        self.player = inst.media_player_new()
-        
-        media = inst.media_new(stream_url)
-        self.player.set_media(media)
-        media.parse()
-        self.player.play()
+        self.playback.attach(self.players.acquire())
+        self.player = self.players.play(stream_url)
+        self.playing = track
         
-        self.status.set("Playing audio with VLC...")
+        if track:
+            self.status.set(f"Playing: {track.get('title', 'Unknown')} ({len(self.queue)} queued)")
+        else:
+            self.status.set("Playing audio with VLC...")
         self.stop_btn["state"] = self.pause_btn["state"] = tk.NORMAL
         self.play_btn["state"] = tk.DISABLED
+        self._prefetch()
+
+    def enqueue(self):
+        if not self.current:
+            messagebox.showwarning("Selection Error", "Please select a track first.")
+            return
+        self.queue.append(self.current)
+        self._queue_changed()
+
+    def enqueue_all(self):
+        if not self.tracks: return
+        self.queue.extend(self.tracks)
+        self._queue_changed()
+
+    def _queue_changed(self):
+        self.queue_var.set(f"Queue: {len(self.queue)}")
+        self.next_btn["state"] = tk.NORMAL if self.queue else tk.DISABLED
+        if self.player:
+            self._prefetch()
+        else:
+            # Nothing playing yet, start the queue
+            self.play_next()
+
+    def play_next(self):
+        item = self.queue.pop()
+        self.queue_var.set(f"Queue: {len(self.queue)}")
+        self.next_btn["state"] = tk.NORMAL if self.queue else tk.DISABLED
+        if item is None:
+            return
+        
+        key, track = item
+        if self._local_path(track):
+            self._start_player(track["path"], track)
+            return
+        if self.next_up and self.next_up[0] == key:
+            # Resolved (and preparsed) while the previous track was playing
+            stream_url, self.next_up = self.next_up[1], None
+            self._start_player(stream_url, track)
+            return
         
-        self.root.after(500, self._update_playback)
+        url = track.get("webpage_url", "")
+        if not url: return self.play_next()
+        self.status.set(f"Preparing: {track.get('title', 'Unknown')}...")
+        self._setup_stream(url, None, track.get("id"), track)
+
+    def _prefetch(self):
+        head = self.queue.peek()
+        if not head or (self.next_up and self.next_up[0] == head[0]): return
+        
+        key, track = head
+        if self._local_path(track):
+            self._prefetched(key, track["path"])
+            return
+        url = track.get("webpage_url", "")
+        if url:
+            vid = track.get("id")
+            self.tasks.latest("prefetch", lambda: self.engine.audio.aresolve(url, vid),
+                              on_result=lambda stream_url: self._prefetched(key, stream_url),
+                              on_error=lambda e: print(f"Prefetch error: {str(e)}"))
+
+    def _prefetched(self, key, stream_url):
+        head = self.queue.peek()
+        if head and head[0] == key:
+            self.next_up = (key, stream_url)
+            self.players.prepare(stream_url)
     
     def _cleanup(self):
         if self.player:
-            self.player.stop()
+            self.players.stop()
             self.player = None
-        if self.timer:
-            self.root.after_cancel(self.timer)
-            self.timer = None
+        self.playback.detach()
 
-    def _update_playback(self):
-        if not self.player: return
+    def _on_time(self, curr):
+        total = self.playback.length
+        if total > 0 and not self.dragging:
+            pos = (curr / total) * 100
+            self.slider.set(pos)
             
-        try:
-            curr = self.player.get_time()
-            total = self.player.get_length()
-            
-            if total > 0 and not self.dragging:
-                pos = (curr / total) * 100
-                self.slider.set(pos)
-                
-                curr_sec, total_sec = curr // 1000, total // 1000
-                curr_str, total_str = self.fmt_time(curr_sec), self.fmt_time(total_sec)
-                self.time_var.set(f"{curr_str} / {total_str}")
-            
-            if self.player.get_state() == vlc.State.Ended:
-                self.stop()
-                self.status.set("Playback finished")
-            else:
-                self.timer = self.root.after(500, self._update_playback)
-                
-        except Exception as e:
-            print(f"Playback error: {str(e)}")
-            self.stop()
-            self.status.set("Playback error")
+            curr_sec, total_sec = curr // 1000, total // 1000
+            curr_str, total_str = self.fmt_time(curr_sec), self.fmt_time(total_sec)
+            self.time_var.set(f"{curr_str} / {total_str}")
+
+    def _on_end(self):
+        if self.queue:
+            self.play_next()
+            return
+        self.stop()
+        self.status.set("Playback finished")
+
+    def _on_error(self):
+        self.stop()
+        self.status.set("Playback error")
 
     def stop(self):
+        # Drop a stream still being resolved
+        self.tasks.cancel("play")
         self._cleanup()
         self.slider.set(0)
         self.time_var.set("0:00 / 0:00")
         self.status.set("Playback stopped")
+        self.playing = None
         self.stop_btn["state"] = self.pause_btn["state"] = tk.DISABLED
         self.paused = False
         self.pause_btn.config(text="⏸")
@@ -420,49 +576,70 @@ class App:
         
         out_path = os.path.join(self.dl_dir, fname)
         
-        self.status.set("Starting download...")
-        self.slider.set(0)
-        self.dl_btn["state"] = tk.DISABLED
+        spec, args = self._dl_args(sel_fmt)
         
-        threading.Thread(target=self._dl_thread, args=(url, out_path, sel_fmt), daemon=True).start()
+        # Single HTTP formats resume from their part file after a crash
+        if not sel_fmt.get("is_special") and sel_fmt.get("protocol") in ("http", "https"):
+            job = self.engine.downloads.add(url, f"{out_path}.{sel_fmt.get('ext', 'm4a')}", spec, args, title,
+                                     video_id=self.current.get("id"), direct=True)
+        else:
+            job = self.engine.downloads.add(url, f"{out_path}.%(ext)s", spec, args, title,
+                                     video_id=self.current.get("id"))
+        self.dl_job = job.id
+        self.slider.set(0)
+        self.status.set("Download queued")
 
-    def _dl_thread(self, url, path, fmt):
-        try:
-            cmd = ["yt-dlp", "-o", f"{path}.%(ext)s", "--no-playlist"]
-            
-            if fmt.get("is_special") and fmt.get("ext") == "mp3":
-                cmd.extend(["-x", "--audio-format", "mp3", "--audio-quality", "0"])
-            elif fmt.get("is_special"):
-                cmd.extend(["-f", "bestaudio/best"])
-            else:
-                cmd.extend(["-f", fmt.get("format_id")])
-            
-            cmd.append(url)
+    def download_all(self):
+        if not self.tracks:
+            messagebox.showwarning("Selection Error", "Search for some tracks first.")
+            return
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+        for t in self.tracks:
+            url = t.get("webpage_url", "")
+            if not url: continue
             
-            if result.returncode == 0:
-                dl_file = None
-                for file in os.listdir(self.dl_dir):
-                    if file.startswith(os.path.basename(path)):
-                        dl_file = os.path.join(self.dl_dir, file)
-                        break
-                        
-                if dl_file:
-                    self.root.after(0, lambda: self._dl_complete(dl_file))
-                else:
-                    self.root.after(0, lambda: self._dl_failed("File downloaded but not found"))
-            else:
-                err = result.stderr if result.stderr else "Unknown error"
-                self.root.after(0, lambda: self._dl_failed(f"yt-dlp error: {err[:100]}"))
-                
-        except Exception as e:
-            self.root.after(0, lambda: self._dl_failed(str(e)))
+            title = t.get("title", "audio")
+            fname = f"{re.sub(r'[^a-zA-Z0-9]', '', title)[:20]}_{t.get('id', int(time.time()))}"
+            self.engine.downloads.add(url, os.path.join(self.dl_dir, f"{fname}.%(ext)s"), 
+                               "bestaudio/best", ["--no-playlist"], title, video_id=t.get("id"))
+        
+        self.status.set(f"Queued {len(self.tracks)} downloads")
+
+    def _dl_args(self, fmt):
+        args = ["--no-playlist"]
+        
+        if fmt.get("is_special") and fmt.get("ext") == "mp3":
+            return None, args + ["-x", "--audio-format", "mp3", "--audio-quality", "0"]
+        elif fmt.get("is_special"):
+            return "bestaudio/best", args
+        return fmt.get("format_id"), args
+
+    def _on_batch(self, ev, item):
+        c = self.engine.batch.counts()
+        summary = f"{c.get('finished', 0)} done, {c.get('skipped', 0)} skipped, {c.get('failed', 0)} failed"
+        if ev == "done": self.status.set(f"Batch finished: {summary}")
+        else: self.status.set(f"Batch: {summary}, {c.get('pending', 0) + c.get('queued', 0)} left")
+
+    def _on_dl(self, ev, job):
+        if self.engine.batch.owns(job.id): return  # reported by _on_batch
+        mine = job.id == self.dl_job
+        left = len(self.engine.downloads.queued()) + len(self.engine.downloads.active())
+        
+        if ev == "progress" and mine:
+            self.slider.set(job.percent)
+            rate = f" at {humanize.naturalsize(job.speed)}/s" if job.speed else ""
+            eta = f", {self.fmt_time(job.eta)} left" if job.eta is not None else ""
+            self.status.set(f"Downloading: {job.percent:.1f}%{rate}{eta}")
+        elif ev == "finished":
+            if mine: self._dl_complete(job.result_path or job.output)
+            else: self.status.set(f"Downloaded: {job.title[:40]} ({left} left)")
+        elif ev == "failed":
+            if mine: self._dl_failed(f"yt-dlp error: {(job.error or 'Unknown error')[:100]}")
+            else: self.status.set(f"Failed: {job.title[:40]} ({left} left)")
 
     def _dl_complete(self, path):
         self.slider.set(100)
         self.status.set("Download complete!")
-        self.dl_btn["state"] = tk.NORMAL
         
         messagebox.showinfo(
             "Download Complete", 
@@ -484,7 +661,6 @@ class App:
     def _dl_failed(self, err):
         self.slider.set(0)
         self.status.set(f"Download failed: {err[:50]}...")
-        self.dl_btn["state"] = tk.NORMAL
         messagebox.showerror("Download Error", f"Failed to download audio:\n{err}")
 
 def resource_path(rel_path):
@@ -516,4 +692,6 @@ if __name__ == "__main__":
         
     root = tk.Tk()
     app = App(root)
+    root.protocol("WM_DELETE_WINDOW", lambda: (app.tasks.close(), app.engine.close(), app._cleanup(), app.players.close(), 
+                                               root.destroy()))
     root.mainloop()
\ No newline at end of file
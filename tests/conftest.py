@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The ytplayer package and the apps live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import FAKE_CLI, fake_cli  # noqa: E402
+
+
+@pytest.fixture
+def fake_ytdlp(tmp_path):
+    """Command line of a fake yt-dlp serving fakes.FAKE_INFO"""
+    return fake_cli(str(tmp_path), FAKE_CLI)
@@ -0,0 +1,241 @@
+"""Stand-ins for yt-dlp, libvlc and media servers shared by the tests"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ytplayer.formats import AUDIO_FIELDS, AUDIO_INFO_FIELDS
+from ytplayer.playback import PlaybackController
+
+# Canned extractor output shared by both fake backends
+FAKE_INFO = {
+    "id": "fake0000000", "title": "Fake video", "uploader": "Fake channel", "duration": 212,
+    "webpage_url": "https://www.youtube.com/watch?v=fake0000000",
+    "formats": [
+        {"format_id": "140", "ext": "m4a", "acodec": "mp4a.40.2", "vcodec": "none",
+         "abr": 129.5, "url": "https://media.example/140"},
+        {"format_id": "137", "ext": "mp4", "acodec": "none", "vcodec": "avc1.640028",
+         "height": 1080, "tbr": 4400.0, "url": "https://media.example/137"},
+    ],
+}
+
+FAKE_CLI = """
+import json, os, sys, time
+info = json.loads(%r)
+fields = %r
+info_fields = %r
+args = sys.argv[1:]
+if "-J" in args or "-O" in args:
+    # A fuller dump: more video formats, storyboards and caption tracks
+    extra = int(os.environ.get("FAKE_YTDLP_EXTRA", 0))
+    info = dict(info, id=args[-1].rsplit("=", 1)[-1], formats=info["formats"] + [
+        {"format_id": str(300 + i), "ext": "mp4", "acodec": "none", "vcodec": "avc1", "height": 144 * (1 + i %% 8),
+         "tbr": 100.0 * (i + 1), "url": "https://media.example/%%d" %% (300 + i),
+         "http_headers": {"User-Agent": "Mozilla/5.0"}} for i in range(extra)] + [
+        {"format_id": "sb%%d" %% i, "ext": "mhtml", "acodec": "none", "vcodec": "none",
+         "fragments": [{"url": "https://i.example/sb/%%d/M%%d.jpg" %% (i, j)} for j in range(50)]}
+        for i in range(extra // 10)])
+    info["automatic_captions"] = {"l%%d" %% i: [{"ext": ext, "url": "https://captions.example/%%d.%%s" %% (i, ext)}
+                                                for ext in ("json3", "srv1", "srv3", "ttml", "vtt")]
+                                  for i in range(extra * 3)}
+    time.sleep(float(os.environ.get("FAKE_YTDLP_INFO_DELAY", 0)))
+    if "-J" in args:
+        print(json.dumps(info))
+    else:
+        print(json.dumps({k: info.get(k) for k in info_fields}))
+        print(json.dumps([{k: f[k] for k in fields if k in f} for f in info["formats"]]))
+elif "-g" in args:
+    print(info["formats"][0]["url"])
+else:
+    first, last = args[args.index("--playlist-items") + 1].split(":")
+    delay = float(os.environ.get("FAKE_YTDLP_DELAY", 0))
+    for i in range(int(first) - 1, int(last)):
+        time.sleep(delay)
+        print(json.dumps({"id": "v%%d" %% i, "title": "Result %%d" %% i, "url": "https://www.youtube.com/watch?v=v%%d" %% i}), flush=True)
+""" % (json.dumps(FAKE_INFO), list(AUDIO_FIELDS), list(AUDIO_INFO_FIELDS))
+
+# Lists FAKE_PLAYLIST_SIZE videos and "downloads" each one into a file
+# holding its id, recording it in the download archive like yt-dlp
+BATCH_CLI = r"""
+import os, sys, time
+args = sys.argv[1:]
+if "--flat-playlist" in args:
+    for i in range(int(os.environ["FAKE_PLAYLIST_SIZE"])):
+        time.sleep(0.002)
+        print('{"id": "v%03d", "title": "Video %d", "ie_key": "Youtube", '
+              '"url": "https://www.youtube.com/watch?v=v%03d"}' % (i, i, i), flush=True)
+else:
+    url = args[-1]
+    video = url.rsplit("=", 1)[1]
+    time.sleep(0.05)
+    out = args[args.index("-o") + 1].replace("%(id)s", video).replace("%(ext)s", "mp4")
+    open(out, "w").write(video)
+    with open(args[args.index("--download-archive") + 1], "a") as f:
+        f.write("youtube %s\n" % video)
+    print(out, flush=True)
+"""
+
+
+def fake_cli(tmp, script=FAKE_CLI):
+    """Command line running script as a stand-in yt-dlp"""
+    path = os.path.join(tmp, "fake_ytdlp.py")
+    with open(path, "w") as f:
+        f.write(script)
+    return [sys.executable, path]
+
+
+class FakeYoutubeDL:
+    """Minimal stand-in for yt_dlp.YoutubeDL"""
+
+    def __init__(self, params):
+        self.params = params
+
+    def extract_info(self, url, download=False, process=True):
+        if url.startswith("ytsearch"):
+            count = int(url[len("ytsearch"):url.index(":")])
+            return {"entries": ({"id": f"v{i}", "title": f"Result {i}",
+                                 "url": f"https://www.youtube.com/watch?v=v{i}"} for i in range(count))}
+        return json.loads(json.dumps(FAKE_INFO))
+
+    def sanitize_info(self, info):
+        return info
+
+    def build_format_selector(self, spec):
+        return lambda ctx: iter(ctx["formats"][:1])
+
+    def _select_formats(self, formats, selector):
+        return list(selector({"formats": formats}))
+
+    def close(self):
+        pass
+
+
+class _FakeEventManager:
+    def __init__(self):
+        self.handlers = {}
+
+    def event_attach(self, event_type, callback, *args):
+        self.handlers[event_type] = (callback, args)
+
+    def event_detach(self, event_type):
+        self.handlers.pop(event_type, None)
+
+    def emit(self, event_type, **values):
+        handler = self.handlers.get(event_type)
+        if handler:
+            event = type("Event", (), {"u": type("U", (), values)()})()
+            handler[0](event, *handler[1])
+
+
+class FakePlayer:
+    """Stand-in for vlc.MediaPlayer that emits events from its own thread"""
+
+    EventType = type("EventType", (), {name: name for name in PlaybackController.EVENTS})
+
+    def __init__(self, instance=None, length_ms=3000, tick_ms=1):
+        self.instance = instance
+        self.length_ms = length_ms
+        self.tick_ms = tick_ms
+        self.manager = _FakeEventManager()
+        self.thread = None
+        self.ended_at = None
+        self.media = None
+
+    def event_manager(self):
+        return self.manager
+
+    def set_media(self, media):
+        self.media = media
+
+    def stop(self):
+        if self.thread:
+            self.thread.join()
+
+    def release(self):
+        self.instance.live["players"] -= 1
+
+    def play(self):
+        def run():
+            self.manager.emit(self.EventType.MediaPlayerLengthChanged, new_length=self.length_ms)
+            for t in range(0, self.length_ms + 1, self.tick_ms):
+                self.manager.emit(self.EventType.MediaPlayerTimeChanged, new_time=t)
+            self.ended_at = time.perf_counter()
+            self.manager.emit(self.EventType.MediaPlayerEndReached)
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+
+class _FakeMedia:
+    def __init__(self, instance):
+        self.instance = instance
+
+    def parse_with_options(self, flags, timeout):
+        pass
+
+    def release(self):
+        self.instance.live["media"] -= 1
+
+
+class FakeInstance:
+    """Stand-in for vlc.Instance counting the native objects it would have allocated"""
+
+    def __init__(self):
+        self.live = {"players": 0, "media": 0}
+
+    def media_player_new(self):
+        self.live["players"] += 1
+        return FakePlayer(self, length_ms=10, tick_ms=5)
+
+    def media_new(self, mrl, *options):
+        self.live["media"] += 1
+        return _FakeMedia(self)
+
+    def release(self):
+        pass
+
+
+def serve(payload, rate=None):
+    """Local range-capable file server, optionally rate limited per connection.
+
+    Returns the server, the payload's URL and the list of byte counts asked for.
+    """
+    requested = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            start, end = 0, len(payload) - 1
+            if self.headers.get("Range"):
+                first, _, last = self.headers["Range"].split("=")[1].partition("-")
+                start, end = int(first), int(last) if last else end
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(payload)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            requested.append(end + 1 - start)
+            self.send_response(206 if self.headers.get("Range") else 200)
+            self.send_header("Content-Length", str(end + 1 - start))
+            if self.headers.get("Range"):
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(payload)}")
+            self.end_headers()
+            block = 64 * 1024
+            try:
+                for i in range(start, end + 1, block):
+                    self.wfile.write(payload[i:min(i + block, end + 1)])
+                    time.sleep(block / rate if rate else 0.01)
+            except OSError:
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/video.mp4", requested
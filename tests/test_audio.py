@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+import pytest
+
+from ytplayer.audio import AudioResolver
+from ytplayer.cache import InfoCache, MetadataCache
+from ytplayer.extractor import SubprocessExtractor
+
+
+class CountingExtractor:
+    def __init__(self):
+        self.full = 0
+
+    def info(self, url):
+        self.full += 1
+        return {"id": "v", "formats": [{"format_id": "137", "url": "https://g/v", "vcodec": "avc1",
+                                        "acodec": "none", "protocol": "https"}]}
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    extractor = CountingExtractor()
+    resolver = AudioResolver(InfoCache(extractor, MetadataCache(str(tmp_path / "cache.db"))))
+    resolver.put({"id": "v", "title": "t", "formats": [
+        {"format_id": "140", "url": "https://g/a?expire=9999999999", "ext": "m4a", "acodec": "mp4a",
+         "vcodec": "none", "abr": 128},
+        {"format_id": "251", "url": "https://g/b?expire=9999999999", "ext": "webm", "acodec": "opus",
+         "vcodec": "none", "abr": 160},
+        {"format_id": "233", "url": "https://g/x.m3u8", "ext": "mp4", "acodec": "mp4a", "vcodec": "none"},
+        {"format_id": "137", "url": "https://g/v", "vcodec": "avc1", "acodec": "none"}]})
+    return resolver
+
+
+def test_put_keeps_audio_best_first(resolver):
+    formats = resolver.get("v")["formats"]
+    assert [f["format_id"] for f in formats] == ["251", "140", "233"]
+    # Unprocessed lookups carry no protocol; direct downloads need one
+    assert [f["protocol"] for f in formats] == ["https", "https", "m3u8_native"]
+
+
+def test_select_prefers_audio_entry(resolver):
+    extractor = resolver.extractor
+    assert resolver.select("u", "140", "v")[0]["url"] == "https://g/a?expire=9999999999"
+    assert resolver.select("u", "bestaudio/best", "v")[0]["format_id"] == "251"
+    assert extractor.full == 0
+    # Formats the audio entry lacks come from the full table
+    assert resolver.select("u", "137", "v")[0]["format_id"] == "137"
+    assert extractor.full == 1
+
+
+def test_invalidate_forgets_audio(resolver):
+    resolver.invalidate("v")
+    assert resolver.get("v") is None
+
+
+def test_audio_lookup_matches_full_extraction(tmp_path, fake_ytdlp, monkeypatch):
+    monkeypatch.setenv("FAKE_YTDLP_EXTRA", "60")
+    backend = SubprocessExtractor(fake_ytdlp)
+    info_cache = InfoCache(backend, MetadataCache(os.path.join(tmp_path, "cache.db")))
+    resolver = AudioResolver(info_cache)
+    lookups = []
+    monkeypatch.setattr(backend, "aaudio_info", lambda url, real=backend.aaudio_info: lookups.append(url) or real(url))
+
+    async def full_path(url, video_id):
+        # The whole -J dump, then a format selection over the cached table
+        await info_cache.afetch(url, video_id)
+        return (await info_cache.aresolve(url, "bestaudio/best", video_id))[0]
+
+    async def audio_path(url, video_id):
+        await resolver.afetch(url, video_id)
+        return await resolver.aresolve(url, video_id)
+
+    full_url = asyncio.run(full_path("https://www.youtube.com/watch?v=f0000000000", "f0000000000"))
+    for _ in range(2):
+        audio_url = asyncio.run(audio_path("https://www.youtube.com/watch?v=a0000000000", "a0000000000"))
+    assert full_url == audio_url == "https://media.example/140"
+    # The second lookup is served from the cache entry, which holds only audio
+    assert len(lookups) == 1
+    assert [f["format_id"] for f in resolver.get("a0000000000")["formats"]] == ["140"]
@@ -0,0 +1,62 @@
+import os
+import time
+
+import pytest
+
+from fakes import serve
+from ytplayer import httpdl
+from ytplayer.bandwidth import ThroughputEstimator, auto_height
+from ytplayer.formats import FormatTable
+
+# A typical ladder: kbps per height for video-only formats, plus audio
+LADDER = {144: 100, 240: 250, 360: 600, 480: 1100, 720: 2500, 1080: 4500, 1440: 9000, 2160: 18000}
+
+
+@pytest.fixture
+def table():
+    formats = [{"format_id": str(h), "vcodec": "avc1", "acodec": "none", "height": h, "tbr": kbps}
+               for h, kbps in LADDER.items()]
+    formats.append({"format_id": "140", "vcodec": "none", "acodec": "mp4a.40.2", "abr": 128})
+    return FormatTable(formats)
+
+
+def test_samples_are_weighted_by_time():
+    estimator = ThroughputEstimator(half_life=10)
+    assert estimator.estimate() is None
+    estimator.add_rate(1000, 1)
+    estimator.add_rate(2000, 10)
+    assert estimator.estimate() == pytest.approx(1500)
+    # A player pacing the transfer only proves the link is at least that fast
+    estimator.add_rate(100, 10, lower_bound=True)
+    assert estimator.estimate() == pytest.approx(1500)
+
+
+@pytest.mark.parametrize("rate, height", [(256 * 1024, 480), (1024 * 1024, 1080)])
+def test_measured_rate_drives_auto(tmp_path, table, rate, height):
+    server, url, _ = serve(os.urandom(2 * 1024 * 1024), rate)
+    estimator = ThroughputEstimator()
+    meter = estimator.meter()
+    deadline = time.monotonic() + 2
+    try:
+        httpdl.download(url, os.path.join(tmp_path, "sample.bin"), progress=lambda done, total: meter.update(done),
+                        stop=lambda: time.monotonic() > deadline)
+    except httpdl.Interrupted:
+        pass
+    finally:
+        server.shutdown()
+    assert estimator.estimate() == pytest.approx(rate, rel=0.2)
+    assert auto_height(table, estimator.estimate()) == height
+
+
+def test_auto_height_without_estimate(table):
+    assert auto_height(table, None) is None
+    assert auto_height(table, 1) == 144
+
+
+def test_auto_height_without_bitrates():
+    formats = [{"format_id": str(h), "vcodec": "avc1", "acodec": "none", "height": h, "tbr": tbr}
+               for h, tbr in [(360, 0), (720, None)]]
+    assert auto_height(FormatTable(formats), 1024 * 1024) is None
+    # Rows without a bitrate never become the fallback either
+    formats.append({"format_id": "1080", "vcodec": "avc1", "acodec": "none", "height": 1080, "tbr": 4500})
+    assert auto_height(FormatTable(formats), 1) == 1080
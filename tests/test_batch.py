@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+
+from fakes import BATCH_CLI, fake_cli
+from ytplayer.batch import Batch, is_batch_source, read_sources
+from ytplayer.downloads import DownloadManager
+from ytplayer.extractor import SubprocessExtractor
+
+PLAYLIST = "https://www.youtube.com/playlist?list=PLfake"
+
+
+def test_batch_sources(tmp_path):
+    listed = tmp_path / "urls.txt"
+    listed.write_text("# mine\nhttps://a\n\nhttps://b\n")
+    assert is_batch_source(PLAYLIST)
+    assert is_batch_source("https://www.youtube.com/@chan")
+    assert not is_batch_source("https://www.youtube.com/watch?v=a")
+    # A search that happens to name a file stays a search
+    assert not is_batch_source(str(listed))
+    assert is_batch_source(f"file:{listed}")
+    assert read_sources(str(listed)) == [str(listed)]
+    assert read_sources(f"file:{listed}") == ["https://a", "https://b"]
+
+
+def test_interrupted_batch_resumes(tmp_path, monkeypatch):
+    size, archived = 60, 10
+    monkeypatch.setenv("FAKE_PLAYLIST_SIZE", str(size))
+    tmp = str(tmp_path)
+    cmd = fake_cli(tmp, BATCH_CLI)
+    archive = os.path.join(tmp, "archive.txt")
+    with open(archive, "w") as f:
+        f.writelines(f"youtube v{i:03d}\n" for i in range(archived))
+
+    def run(stop_after=None):
+        manager = DownloadManager(os.path.join(tmp, "downloads.json"), workers=4, cmd=cmd)
+        batch = Batch(os.path.join(tmp, "batch.json"), manager, SubprocessExtractor(cmd),
+                      os.path.join(tmp, "%(id)s.%(ext)s"), archive=archive)
+        done = threading.Event()
+        batch.subscribe(lambda event, item: event == "done" and done.set())
+        manager.start()
+        if stop_after is None:
+            batch.resume()
+        else:
+            batch.add([PLAYLIST])
+        deadline = time.monotonic() + 20
+        while not done.is_set() and time.monotonic() < deadline:
+            if stop_after and batch.counts().get("finished", 0) >= stop_after:
+                break
+            time.sleep(0.01)
+        batch.stop()
+        manager.shutdown()
+        for worker in manager.workers:
+            worker.join()
+        return batch.counts(), done.is_set()
+
+    counts, finished = run(stop_after=15)
+    assert not finished and counts.get("finished", 0) >= 15
+    counts, finished = run()
+    assert finished
+    assert counts == {"finished": size - archived, "skipped": archived}
+    downloaded = sorted(f for f in os.listdir(tmp) if f.endswith(".mp4"))
+    assert downloaded == [f"v{i:03d}.mp4" for i in range(archived, size)]
+
+
+def test_sources_added_while_listing_are_expanded(tmp_path):
+    listed = threading.Event()
+
+    class SlowExtractor:
+        def iter_playlist(self, url, cancel=None):
+            for i in range(5):
+                if url.endswith("A") and i == 2:
+                    listed.set()
+                    time.sleep(0.2)
+                yield {"id": f"{url[-1]}{i}", "url": f"https://www.youtube.com/watch?v={url[-1]}{i}"}
+
+    manager = DownloadManager(os.path.join(tmp_path, "downloads.json"), workers=1,
+                              cmd=["false"])
+    batch = Batch(os.path.join(tmp_path, "batch.json"), manager, SlowExtractor(),
+                  os.path.join(tmp_path, "%(id)s.%(ext)s"))
+    batch.add(["https://www.youtube.com/playlist?list=A"])
+    listed.wait(5)
+    batch.add(["https://www.youtube.com/playlist?list=B"])
+    deadline = time.monotonic() + 5
+    while batch.expanding and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(batch.items) == 10
+    batch.stop()
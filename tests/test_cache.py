@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from ytplayer.cache import InfoCache, MetadataCache
+
+
+class CountingExtractor:
+    def __init__(self, expire):
+        self.expire = expire
+        self.calls = 0
+
+    def info(self, url):
+        self.calls += 1
+        return {"id": "v", "title": "t", "formats": [
+            {"format_id": "140", "url": f"https://g/a?expire={self.expire}", "vcodec": "none", "acodec": "mp4a",
+             "fragments": [{"url": "f"}], "http_headers": {"User-Agent": "x"}},
+            {"format_id": "137", "url": f"https://g/v?expire={self.expire}", "vcodec": "avc1", "acodec": "none"}]}
+
+
+def test_metadata_expires():
+    store = MetadataCache()
+    store.put("search", "q", [1], expires=time.time() - 1)
+    store.put("info", "v", {"id": "v"})
+    assert store.get("search", "q") is None
+    assert store.get("info", "v") == {"id": "v"}
+
+
+def test_metadata_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.db")
+    store = MetadataCache(path)
+    store.put("search", "q", [{"id": "v"}])
+    store.close()
+    assert MetadataCache(path).get("search", "q") == [{"id": "v"}]
+
+
+def test_metadata_evicts_least_recently_used(monkeypatch):
+    clock = iter(range(1_000_000, 2_000_000))
+    monkeypatch.setattr("ytplayer.cache.time.time", lambda: next(clock))
+    store = MetadataCache(max_bytes=1000)
+    value = "x" * 98  # 100 bytes of JSON
+    for i in range(10):
+        store.put("search", f"k{i}", value)
+    assert store.get("search", "k0") == value
+
+    # k1 is now the least recently used entry, so it makes room for k10
+    store.put("search", "k10", value)
+    assert store.total_bytes == 1000
+    assert store.get("search", "k1") is None
+    assert all(store.get("search", f"k{i}") == value for i in [0, *range(2, 11)])
+    assert store.stats == {"search": {"hits": 11, "misses": 1}}
+
+
+def test_info_outlives_its_urls():
+    extractor = CountingExtractor(int(time.time()) + 60)
+    info_cache = InfoCache(extractor, MetadataCache(), leeway=300)
+    info_cache.fetch("u", "v")
+    # The URLs expire within the leeway, the format table does not
+    assert info_cache.get("v") is None
+    table = info_cache.get("v", need_urls=False)
+    assert [f["format_id"] for f in table["formats"]] == ["140", "137"]
+    assert "url" not in table["formats"][0] and "fragments" not in table["formats"][0]
+
+
+def test_resolve_uses_cached_urls():
+    extractor = CountingExtractor(int(time.time()) + 6 * 3600)
+    info_cache = InfoCache(extractor, MetadataCache())
+    assert info_cache.resolve("u", "bestvideo+bestaudio", "v") == [
+        f"https://g/v?expire={extractor.expire}", f"https://g/a?expire={extractor.expire}"]
+    info_cache.resolve("u", "bestaudio", "v")
+    assert extractor.calls == 1
+    with pytest.raises(RuntimeError):
+        info_cache.resolve("u", "bestvideo[height>2000]", "v")
@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+import requests
+
+from fakes import FAKE_INFO, FakeYoutubeDL
+from ytplayer.daemon import EngineClient, EngineServer, read_token
+from ytplayer.downloads import DownloadJob
+from ytplayer.engine import Engine
+from ytplayer.extractor import YoutubeDLExtractor
+
+
+@pytest.fixture
+def server(tmp_path):
+    engine = Engine(str(tmp_path), extractor=YoutubeDLExtractor(factory=FakeYoutubeDL))
+    server = EngineServer(engine, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    engine.close()
+
+
+@pytest.fixture
+def client(server):
+    return EngineClient(server.url(), server.token)
+
+
+def test_token_is_required(server):
+    assert requests.get(f"{server.url()}/jobs").status_code == 401
+    wrong = {"Authorization": "Bearer nope"}
+    assert requests.get(f"{server.url()}/jobs", headers=wrong).status_code == 401
+    server.write_token()
+    assert read_token(server.engine.data_dir) == server.token
+
+
+def test_posts_must_be_json(server):
+    # A form post is what a web page could send without a preflight
+    response = requests.post(f"{server.url()}/jobs", data={"url": FAKE_INFO["webpage_url"]},
+                             headers={"Authorization": f"Bearer {server.token}"})
+    assert response.status_code == 415
+
+
+@pytest.mark.parametrize("url", ["--exec=touch x", "file:///etc/passwd", "/etc/passwd"])
+def test_only_http_urls(client, url):
+    with pytest.raises(RuntimeError, match="http"):
+        client.download(url)
+    with pytest.raises(RuntimeError, match="http"):
+        client.add_batch([url])
+
+
+def test_output_stays_in_data_dir(server, client):
+    with pytest.raises(RuntimeError, match="outside"):
+        client.download(FAKE_INFO["webpage_url"], "../../escape.mp4")
+    job = client.download(FAKE_INFO["webpage_url"], "music/song.m4a")
+    assert job["output"].startswith(server.engine.data_dir)
+
+
+def test_concurrent_clients(server):
+    errors, calls = [], {"n": 0}
+    lock = threading.Lock()
+
+    def run(n):
+        client = EngineClient(server.url(), server.token)
+        try:
+            for i in range(10):
+                assert len(client.search(f"query {n} {i % 5}")) > 0
+                assert client.info(FAKE_INFO["webpage_url"], FAKE_INFO["id"])["id"] == FAKE_INFO["id"]
+                assert client.resolve(FAKE_INFO["webpage_url"], "bestaudio", FAKE_INFO["id"])
+                with lock:
+                    calls["n"] += 3
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert calls["n"] == 8 * 10 * 3
+
+
+def test_jobs_listing_while_jobs_are_added(server, client):
+    manager = server.engine.downloads
+    stop = threading.Event()
+
+    def add_jobs():
+        # The job table keeps changing under the listing, always under the lock
+        while not stop.is_set():
+            with manager.cond:
+                job = DownloadJob(FAKE_INFO["webpage_url"], "out.mp4")
+                job.status = "done"
+                manager.jobs[job.id] = job
+                if len(manager.jobs) > 2000:
+                    del manager.jobs[next(iter(manager.jobs))]
+
+    adder = threading.Thread(target=add_jobs, daemon=True)
+    adder.start()
+    try:
+        for _ in range(30):
+            jobs = client.jobs()
+            assert all(job.status == "done" for job in jobs)
+    finally:
+        stop.set()
+        adder.join(5)
+
+
+def test_error_statuses(server, monkeypatch):
+    headers = {"Authorization": f"Bearer {server.token}"}
+    get = lambda path, **params: requests.get(f"{server.url()}{path}", params=params, headers=headers)
+    assert get("/search").status_code == 400
+    assert get("/search", q="x", start="two").status_code == 400
+    assert requests.post(f"{server.url()}/batch", data="[1]", headers=dict(
+        headers, **{"Content-Type": "application/json"})).status_code == 400
+    assert requests.delete(f"{server.url()}/jobs/nope", headers=headers).status_code == 404
+    assert get("/nowhere").status_code == 404
+
+    # A lookup failing inside the engine is our bug, not the client's
+    def broken(*args):
+        return {}["missing"]
+
+    monkeypatch.setattr(server.engine, "search", broken)
+    response = get("/search", q="x")
+    assert response.status_code == 500 and "missing" in response.json()["error"]
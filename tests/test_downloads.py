@@ -0,0 +1,144 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from ytplayer import downloads
+from ytplayer.downloads import DownloadManager
+
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+# Downloads 64 KiB into <output>.part like yt-dlp with --continue, printing
+# progress, and logs the offset each run started from
+RESUMING_CLI = r"""
+import json, os, sys, time
+args = sys.argv[1:]
+out = args[args.index("-o") + 1]
+part = out + ".part"
+data = bytes(i % 251 for i in range(64 * 1024))
+start = os.path.getsize(part) if "--continue" in args and os.path.exists(part) else 0
+with open(os.environ["FAKE_YTDLP_LOG"], "a") as log:
+    log.write("%d\n" % start)
+with open(part, "ab") as f:
+    for offset in range(start, len(data), 4096):
+        f.write(data[offset:offset + 4096])
+        f.flush()
+        print("[progress] " + json.dumps({"status": "downloading", "downloaded_bytes": offset + 4096,
+                                          "total_bytes": len(data)}), flush=True)
+        time.sleep(float(os.environ.get("FAKE_YTDLP_CHUNK_DELAY", 0)))
+os.replace(part, out)
+print(os.path.abspath(out), flush=True)
+"""
+
+# Runs a manager on RESUMING_CLI until it is killed, like an app that crashes
+CRASHING_APP = r"""
+import sys, time
+from ytplayer.downloads import DownloadManager
+queue, cli, out = sys.argv[1:]
+manager = DownloadManager(queue, workers=1, cmd=[sys.executable, cli], checkpoint=0)
+manager.start()
+manager.add("https://www.youtube.com/watch?v=x", out)
+time.sleep(60)
+"""
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_cancel_before_process_starts(tmp_path, monkeypatch):
+    procs = []
+    real_popen = subprocess.Popen
+
+    def popen(*args, **kwargs):
+        procs.append(real_popen(*args, **kwargs))
+        return procs[-1]
+
+    monkeypatch.setattr(downloads.subprocess, "Popen", popen)
+    manager = DownloadManager(os.path.join(tmp_path, "downloads.json"), workers=1, cmd=SLEEPER)
+    # "started" comes before the worker spawns yt-dlp
+    manager.subscribe(lambda event, job: event == "started" and manager.cancel(job.id))
+    manager.start()
+    job = manager.add("https://www.youtube.com/watch?v=x", os.path.join(tmp_path, "a"))
+    wait_for(lambda: procs and procs[0].poll() is not None)
+    assert manager.jobs[job.id].status == "cancelled"
+    manager.shutdown()
+
+
+def test_no_per_host_cap_by_default(tmp_path):
+    manager = DownloadManager(os.path.join(tmp_path, "downloads.json"), workers=3, cmd=SLEEPER)
+    manager.start()
+    for i in range(3):
+        manager.add(f"https://www.youtube.com/watch?v={i}", os.path.join(tmp_path, str(i)))
+    wait_for(lambda: len(manager.active()) == 3)
+    manager.shutdown()
+
+
+def test_per_host_cap(tmp_path):
+    manager = DownloadManager(os.path.join(tmp_path, "downloads.json"), workers=3, per_host=1, cmd=SLEEPER)
+    manager.start()
+    for i in range(2):
+        manager.add(f"https://www.youtube.com/watch?v={i}", os.path.join(tmp_path, str(i)))
+    manager.add("https://vimeo.com/1", os.path.join(tmp_path, "v"))
+    wait_for(lambda: len(manager.active()) == 2)
+    time.sleep(0.2)
+    assert sorted(job.host for job in manager.active()) == ["vimeo.com", "www.youtube.com"]
+    manager.shutdown()
+
+
+def test_queue_survives_restart(tmp_path):
+    path = os.path.join(tmp_path, "downloads.json")
+    manager = DownloadManager(path, workers=1, cmd=SLEEPER)
+    low = manager.add("https://www.youtube.com/watch?v=a", os.path.join(tmp_path, "a"))
+    high = manager.add("https://www.youtube.com/watch?v=b", os.path.join(tmp_path, "b"), priority=5)
+    manager.shutdown()
+
+    restored = DownloadManager(path, workers=1, cmd=SLEEPER)
+    assert [j.id for j in restored.queued()] == [high.id, low.id]
+
+
+def test_ytdlp_job_resumes_after_crash(tmp_path, monkeypatch):
+    path, out = os.path.join(tmp_path, "downloads.json"), os.path.join(tmp_path, "video.mp4")
+    cli = os.path.join(tmp_path, "fake_ytdlp.py")
+    with open(cli, "w") as f:
+        f.write(RESUMING_CLI)
+    log = os.path.join(tmp_path, "starts.log")
+    monkeypatch.setenv("FAKE_YTDLP_LOG", log)
+    monkeypatch.setenv("FAKE_YTDLP_CHUNK_DELAY", "0.05")
+
+    app = subprocess.Popen([sys.executable, "-c", CRASHING_APP, path, cli, out],
+                           cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        # Kill it once the journal has checkpointed part of the download
+        def checkpointed():
+            with open(path) as f:
+                saved = json.load(f)
+            return saved and saved[0]["status"] == "running" and saved[0]["bytes_done"] >= 16 * 1024
+
+        wait_for(lambda: os.path.exists(path) and checkpointed())
+    finally:
+        app.kill()
+        app.wait()
+    # Its yt-dlp dies on the next write to the closed pipe
+    time.sleep(0.2)
+    left = os.path.getsize(out + ".part")
+    assert 0 < left < 64 * 1024
+
+    monkeypatch.setenv("FAKE_YTDLP_CHUNK_DELAY", "0")
+    restored = DownloadManager(path, workers=1, cmd=[sys.executable, cli])
+    [job] = restored.queued()
+    assert job.part_files == [out + ".part"]
+    restored.start()
+    wait_for(lambda: job.status == "finished")
+    restored.shutdown()
+
+    with open(out, "rb") as f:
+        assert f.read() == bytes(i % 251 for i in range(64 * 1024))
+    with open(log) as f:
+        starts = [int(line) for line in f]
+    assert starts == [0, left]
+    assert job.result_path == out
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+
+import pytest
+
+from fakes import FAKE_INFO, FakeYoutubeDL
+from ytplayer.downloads import DownloadJob
+from ytplayer.engine import Engine
+from ytplayer.extractor import YoutubeDLExtractor
+
+
+class ClosingYoutubeDL(FakeYoutubeDL):
+    closed = 0
+
+    def close(self):
+        ClosingYoutubeDL.closed += 1
+
+
+def test_close_releases_everything(tmp_path):
+    engine = Engine(str(tmp_path), extractor=YoutubeDLExtractor(factory=ClosingYoutubeDL))
+    engine.close()
+    assert ClosingYoutubeDL.closed == 1
+    for db in (engine.cache.db, engine.library.db):
+        with pytest.raises(sqlite3.ProgrammingError):
+            db.execute("SELECT 1")
+    # The data dir is free for the next engine
+    Engine(str(tmp_path), extractor=YoutubeDLExtractor(factory=FakeYoutubeDL)).close()
+
+
+def test_download_indexed_from_audio_entry(tmp_path):
+    engine = Engine(str(tmp_path), extractor=YoutubeDLExtractor(factory=FakeYoutubeDL))
+    engine.audio.put(dict(FAKE_INFO, formats=FAKE_INFO["formats"][:1]))
+    output = os.path.join(tmp_path, "song.m4a")
+    with open(output, "wb") as f:
+        f.write(b"\0" * 1024)
+    job = DownloadJob(FAKE_INFO["webpage_url"], output, "140", title="from the job", video_id=FAKE_INFO["id"])
+
+    # No full info was ever fetched, only the music player's audio lookup
+    assert engine.info_cache.get(FAKE_INFO["id"], need_urls=False) is None
+    engine._index_download("finished", job)
+    [track] = engine.library.search("fake channel")
+    assert (track["title"], track["uploader"], track["duration"]) == ("Fake video", "Fake channel", 212)
+    engine.close()
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from fakes import FAKE_INFO, FakeYoutubeDL
+from ytplayer import extractor
+from ytplayer.extractor import (AUDIO_ARGS, AUDIO_EXTRACTOR_ARGS, SEARCH_PAGE, CancelToken,
+                                SubprocessExtractor, YoutubeDLExtractor, is_listing)
+from ytplayer.formats import AUDIO_FIELDS, AUDIO_INFO_FIELDS
+
+CHANNEL = "https://www.youtube.com/@chan"
+LISTINGS = {
+    CHANNEL: [{"_type": "url", "ie_key": "YoutubeTab", "url": f"{CHANNEL}/videos"},
+              {"_type": "url", "ie_key": "YoutubeTab", "url": f"{CHANNEL}/shorts"}],
+    f"{CHANNEL}/videos": [{"_type": "url", "ie_key": "Youtube", "id": "a",
+                           "url": "https://www.youtube.com/watch?v=a"},
+                          {"_type": "url", "url": "https://www.youtube.com/playlist?list=PL1"}],
+    f"{CHANNEL}/shorts": [{"_type": "url", "ie_key": "Youtube", "id": "b",
+                           "url": "https://www.youtube.com/shorts/b"},
+                          {"_type": "url", "ie_key": "YoutubeTab", "url": f"{CHANNEL}/videos"}],
+    "https://www.youtube.com/playlist?list=PL1": [{"_type": "url", "ie_key": "Youtube", "id": "c",
+                                                   "url": "https://www.youtube.com/watch?v=c"}],
+}
+
+
+@pytest.fixture(params=["subprocess", "inprocess"])
+def backend(request, fake_ytdlp):
+    backend = (SubprocessExtractor(fake_ytdlp) if request.param == "subprocess"
+               else YoutubeDLExtractor(factory=FakeYoutubeDL))
+    yield backend
+    backend.close()
+
+
+def test_backends_agree(backend):
+    results = backend.search("test")
+    assert [e["id"] for e in results] == [f"v{i}" for i in range(SEARCH_PAGE)]
+    assert all(e["webpage_url"] for e in results)
+    assert backend.info(FAKE_INFO["webpage_url"])["formats"][0]["format_id"] == "140"
+    assert backend.resolve(FAKE_INFO["webpage_url"], "bestaudio")[0] == "https://media.example/140"
+
+
+def test_audio_args():
+    assert AUDIO_ARGS[0] == "--no-playlist"
+    # The command line asks for the same extractor arguments as the in-process lookup
+    ie, _, spec = AUDIO_ARGS[AUDIO_ARGS.index("--extractor-args") + 1].partition(":")
+    parsed = {key: value.split(",") for key, value in (part.split("=") for part in spec.split(";"))}
+    assert {ie: parsed} == AUDIO_EXTRACTOR_ARGS
+    # One line with the video fields, one with the formats cut down to AUDIO_FIELDS
+    templates = [arg for flag, arg in zip(AUDIO_ARGS, AUDIO_ARGS[1:]) if flag == "-O"]
+    assert templates == ["%(.{" + ",".join(AUDIO_INFO_FIELDS) + "})j", "%(formats.:.{" + ",".join(AUDIO_FIELDS) + "})j"]
+    assert "-J" not in AUDIO_ARGS
+
+
+def test_ainfo_is_cancellable(fake_ytdlp, monkeypatch):
+    monkeypatch.setenv("FAKE_YTDLP_INFO_DELAY", "5")
+    backend = SubprocessExtractor(fake_ytdlp)
+
+    async def run():
+        task = asyncio.ensure_future(backend.ainfo(FAKE_INFO["webpage_url"]))
+        await asyncio.sleep(0.2)
+        start = time.perf_counter()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return time.perf_counter() - start
+
+    assert asyncio.run(run()) < 1, "cancelling left the extraction running"
+
+
+def test_iter_search_streams_results(fake_ytdlp, monkeypatch):
+    monkeypatch.setenv("FAKE_YTDLP_DELAY", "0.1")
+    backend = SubprocessExtractor(fake_ytdlp)
+
+    start = time.perf_counter()
+    entries = backend.iter_search("test")
+    next(entries)
+    first = time.perf_counter() - start
+    assert len(list(entries)) == SEARCH_PAGE - 1
+    assert first < (time.perf_counter() - start) / 2, "the first result waited for the whole page"
+
+    page = [e["id"] for e in backend.iter_search("test", start=SEARCH_PAGE, count=5)]
+    assert page == [f"v{i}" for i in range(SEARCH_PAGE, SEARCH_PAGE + 5)]
+
+
+def test_cancelled_search_stops(fake_ytdlp, monkeypatch):
+    monkeypatch.setenv("FAKE_YTDLP_DELAY", "0.1")
+    backend = SubprocessExtractor(fake_ytdlp)
+    token = CancelToken()
+    got = []
+    start = time.perf_counter()
+    for entry in backend.iter_search("test", cancel=token):
+        got.append(entry)
+        if len(got) == 3:
+            token.cancel()
+    assert len(got) == 3
+    assert time.perf_counter() - start < SEARCH_PAGE * 0.1 / 2
+
+
+def test_live_typing_caps_concurrent_searches(fake_ytdlp, monkeypatch):
+    """A search per keystroke, each cancelling the last, never runs more than
+    MAX_SEARCHES yt-dlp processes at once"""
+    monkeypatch.setenv("FAKE_YTDLP_DELAY", "0.1")
+    backend = SubprocessExtractor(fake_ytdlp)
+    text = "dua lipa levitating"
+    peak, results, threads = [0], {}, []
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            peak[0] = max(peak[0], extractor.MAX_SEARCHES - extractor._search_slots._value)
+            time.sleep(0.002)
+
+    def run(query, token):
+        results[query] = sum(1 for _ in backend.iter_search(query, cancel=token))
+
+    threading.Thread(target=sample, daemon=True).start()
+    token = None
+    for i in range(1, len(text) + 1):
+        if token:
+            token.cancel()
+        token = CancelToken()
+        threads.append(threading.Thread(target=run, args=(text[:i], token)))
+        threads[-1].start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+    done.set()
+
+    assert peak[0] <= extractor.MAX_SEARCHES
+    assert results[text] == SEARCH_PAGE
+    assert all(n < SEARCH_PAGE for q, n in results.items() if q != text)
+
+
+def test_inprocess_search_leaves_info_free():
+    """A search the UI is still reading must not hold up other calls"""
+    backend = YoutubeDLExtractor(factory=FakeYoutubeDL)
+    results = backend.iter_search("test")
+    next(results)
+    info = threading.Thread(target=backend.info, args=(FAKE_INFO["webpage_url"],), daemon=True)
+    info.start()
+    info.join(2)
+    assert not info.is_alive(), "info() waited for the search"
+    assert len(list(results)) == SEARCH_PAGE - 1
+    backend.close()
+
+
+def test_is_listing():
+    assert is_listing({"_type": "url", "ie_key": "YoutubeTab", "url": f"{CHANNEL}/videos"})
+    assert is_listing({"_type": "url", "url": "https://www.youtube.com/playlist?list=PL1"})
+    assert not is_listing({"_type": "url", "ie_key": "Youtube", "url": "https://www.youtube.com/watch?v=a"})
+    assert not is_listing({"id": "a", "url": "https://www.youtube.com/watch?v=a"})
+
+
+def test_subprocess_playlist_expands_tabs():
+    backend = SubprocessExtractor(["yt-dlp"])
+    backend._iter_json = lambda cmd, cancel: iter(LISTINGS[cmd[-1]])
+    assert [e["id"] for e in backend.iter_playlist(CHANNEL)] == ["a", "b", "c"]
+
+
+def test_inprocess_playlist_expands_tabs():
+    class ChannelYoutubeDL(FakeYoutubeDL):
+        def extract_info(self, url, download=False, process=True):
+            return {"entries": iter(LISTINGS[url])}
+
+    backend = YoutubeDLExtractor(factory=ChannelYoutubeDL)
+    assert sorted(e["id"] for e in backend.iter_playlist(CHANNEL)) == ["a", "b", "c"]
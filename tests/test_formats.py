@@ -0,0 +1,125 @@
+import random
+import re
+import time
+
+import pytest
+
+from ytplayer.formats import AUDIO, AV, OTHER, VIDEO, FormatTable, has_audio, has_video, select_formats
+
+
+def synthetic_formats(count, seed=0):
+    rng = random.Random(seed)
+    formats = []
+    for i in range(count):
+        kind = rng.choice((AUDIO, VIDEO, AV))
+        height = rng.choice((144, 240, 360, 480, 720, 1080, 1440, 2160))
+        fmt = {"format_id": str(i), "ext": rng.choice(("mp4", "webm", "m4a")),
+               "vcodec": "none" if kind == AUDIO else rng.choice(("avc1.64001F", "vp9", "av01.0.08M.08")),
+               "acodec": "none" if kind == VIDEO else rng.choice(("mp4a.40.2", "opus")),
+               "tbr": rng.uniform(50, 9000), "filesize": rng.randint(10 ** 5, 10 ** 9)}
+        if kind == AUDIO:
+            fmt["abr"] = rng.uniform(32, 320)
+            fmt["resolution"] = "audio only"
+        else:
+            fmt["resolution"] = f"{height * 16 // 9}x{height}"
+        formats.append(fmt)
+    return formats
+
+
+def scan_sort_key(fmt):
+    # What the apps did per comparison before FormatTable
+    height = 0
+    match = re.search(r"(\d+)x(\d+)", fmt.get("resolution", ""))
+    if match:
+        height = int(match.group(2))
+    vcodec, acodec = fmt.get("vcodec", "none"), fmt.get("acodec", "none")
+    if vcodec != "none" and acodec != "none":
+        kind = 3
+    elif vcodec != "none":
+        kind = 2
+    else:
+        kind = 1
+    bitrate = fmt.get("tbr", 0) or fmt.get("vbr", 0) or fmt.get("abr", 0) or 0
+    return (kind, height, bitrate, fmt.get("filesize", 0) or fmt.get("filesize_approx", 0) or 0)
+
+
+def test_table_matches_scans():
+    formats = synthetic_formats(1000)
+    table = FormatTable(formats)
+    assert [formats[i] for i in table.order] == sorted(formats, key=scan_sort_key, reverse=True)
+    assert table.best_audio() == max((f for f in formats if f["vcodec"] == "none"), key=lambda f: f["abr"])
+    assert table.best_under(720) == max((f for f in formats if f["acodec"] == "none"
+                                         and scan_sort_key(f)[1] <= 720), key=lambda f: scan_sort_key(f)[1:3])
+    assert sum(table.counts.values()) == len(formats)
+
+
+def test_table_beats_scans():
+    formats = synthetic_formats(1000)
+
+    start = time.perf_counter()
+    sorted(formats, key=scan_sort_key, reverse=True)
+    for _ in range(50):
+        max((f for f in formats if f.get("vcodec") == "none"), key=lambda f: f.get("abr") or 0)
+        max((f for f in formats if f.get("acodec") == "none" and scan_sort_key(f)[1] <= 720),
+            key=lambda f: scan_sort_key(f)[1:3])
+    scans = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = FormatTable(formats)
+    for _ in range(50):
+        table.best_audio()
+        table.best_under(720)
+    assert time.perf_counter() - start < scans
+
+
+def test_select_formats():
+    formats = [{"format_id": "140", "url": "a", "vcodec": "none", "acodec": "mp4a", "ext": "m4a"},
+               {"format_id": "251", "url": "b", "vcodec": "none", "acodec": "opus", "ext": "webm"},
+               {"format_id": "137", "url": "c", "vcodec": "avc1", "acodec": "none", "height": 1080},
+               {"format_id": "18", "url": "d", "vcodec": "avc1", "acodec": "mp4a", "height": 360}]
+    ids = lambda spec: [f["format_id"] for f in select_formats(formats, spec)]
+    assert ids("bestaudio") == ["251"]
+    assert ids("bestaudio[ext=m4a]") == ["140"]
+    assert ids("bestvideo+bestaudio") == ["137", "251"]
+    assert ids("bestvideo[height<=720]+bestaudio/best") == ["18"]
+    assert ids("137") == ["137"]
+    assert ids("bestvideo[height>2000]") == []
+    assert ids("bestvideo[vcodec^=avc1]") == ["137"]
+    assert ids("ba[acodec$=a]") == ["140"]
+    assert ids("best[height<=?720]") == ["18"]
+    assert ids("best[height<=?720][fps>30]") == []
+
+
+@pytest.mark.parametrize("spec", ["bestvideo[vcodec!^=avc1]", "best[height<=720][fps]", "ba[ext=m4a]x"])
+def test_select_formats_rejects_unsupported(spec):
+    with pytest.raises(ValueError):
+        select_formats([{"format_id": "18", "url": "d", "vcodec": "avc1", "acodec": "mp4a"}], spec)
+
+
+def test_merged_spec():
+    formats = [{"format_id": "140", "url": "a", "vcodec": "none", "acodec": "mp4a", "abr": 128},
+               {"format_id": "251", "url": "b", "vcodec": "none", "acodec": "opus", "abr": 160},
+               {"format_id": "136", "url": "c", "vcodec": "avc1", "acodec": "none", "height": 720, "tbr": 2500},
+               {"format_id": "247", "url": "d", "vcodec": "vp9", "acodec": "none", "height": 720, "tbr": 1800},
+               {"format_id": "137", "url": "e", "vcodec": "avc1", "acodec": "none", "height": 1080},
+               {"format_id": "18", "url": "f", "vcodec": "avc1", "acodec": "mp4a", "height": 360}]
+    table = FormatTable(formats)
+    assert table.merged_spec(720) == "136+251/bestvideo[height<=720]+bestaudio/best[height<=720]"
+    assert [f["format_id"] for f in select_formats(formats, table.merged_spec(720))] == ["136", "251"]
+    # Nothing video-only fits, so the best combined format does
+    assert table.merged_spec(480).startswith("18/")
+    assert FormatTable(formats[:2]).merged_spec(480) == "bestvideo[height<=480]+bestaudio/best[height<=480]"
+
+
+def test_codec_rule_is_shared():
+    formats = [{"format_id": "a", "url": "u", "vcodec": "none", "acodec": "opus"},
+               {"format_id": "direct", "url": "u"},
+               {"format_id": "v", "url": "u", "vcodec": "avc1", "acodec": None},
+               {"format_id": "sb", "url": "u", "vcodec": "none", "acodec": "none"}]
+    table = FormatTable(formats)
+    for i, fmt in enumerate(formats):
+        assert (table.kind[i] in (VIDEO, AV)) == has_video(fmt)
+        assert (table.kind[i] in (AUDIO, AV)) == has_audio(fmt)
+    assert table.kind == [AUDIO, AV, AV, OTHER]
+    assert table.vcodec[1] == table.acodec[1] == "unknown"
+    assert select_formats(formats, "best")[0]["format_id"] == "v"
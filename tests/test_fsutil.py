@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from ytplayer.fsutil import DirLocked, atomic_write_json, lock_dir
+
+
+def test_lock_dir_excludes_other_processes(tmp_path):
+    lock = lock_dir(str(tmp_path))
+    probe = ("import sys; sys.path.insert(0, %r)\n"
+             "from ytplayer.fsutil import DirLocked, lock_dir\n"
+             "try:\n    lock_dir(%r)\nexcept DirLocked as e:\n    print(e)\n    sys.exit(3)\n"
+             % (os.path.dirname(os.path.dirname(os.path.abspath(__file__))), str(tmp_path)))
+    held = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True)
+    assert held.returncode == 3
+    assert str(os.getpid()) in held.stdout
+    lock.close()
+    assert subprocess.run([sys.executable, "-c", probe]).returncode == 0
+
+
+@pytest.mark.skipif(os.name == "nt", reason="flock is per open file only on POSIX")
+def test_lock_dir_twice_in_one_process(tmp_path):
+    lock = lock_dir(str(tmp_path))
+    with pytest.raises(DirLocked):
+        lock_dir(str(tmp_path))
+    lock.close()
+
+
+def test_atomic_write_json(tmp_path):
+    path = os.path.join(tmp_path, "state.json")
+    atomic_write_json(path, {"a": 1})
+    atomic_write_json(path, {"a": 2})
+    with open(path) as f:
+        assert json.load(f) == {"a": 2}
+    assert os.listdir(tmp_path) == ["state.json"]
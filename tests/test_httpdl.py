@@ -0,0 +1,113 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from fakes import serve
+from ytplayer import httpdl
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def payload():
+    return os.urandom(4 * 1024 * 1024)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_resume_after_kill(tmp_path, payload):
+    """Kill a download mid-transfer; the resume only asks for the rest"""
+    server, url, requested = serve(payload)
+    path = os.path.join(tmp_path, "video.mp4")
+    child = subprocess.Popen([sys.executable, "-c",
+                              "import sys; from ytplayer import httpdl; httpdl.download(sys.argv[1], sys.argv[2])",
+                              url, path], cwd=ROOT)
+    time.sleep(0.5)
+    child.kill()
+    child.wait()
+    kept = os.path.getsize(f"{path}.part")
+    assert 0 < kept < len(payload)
+
+    httpdl.download(url, path)
+    server.shutdown()
+    assert requested[-1] == len(payload) - kept
+    assert read(path) == payload
+
+
+def test_stop_keeps_part(tmp_path, payload):
+    server, url, _ = serve(payload)
+    path = os.path.join(tmp_path, "video.mp4")
+    with pytest.raises(httpdl.Interrupted):
+        httpdl.download(url, path, stop=lambda: os.path.exists(f"{path}.part")
+                        and os.path.getsize(f"{path}.part") > 1024 * 1024)
+    httpdl.download(url, path)
+    server.shutdown()
+    assert read(path) == payload
+
+
+def test_chunked_resumes_as_plain_download(tmp_path, payload):
+    """A preallocated part from download_chunked only counts up to its first range"""
+    server, url, _ = serve(payload, rate=1024 * 1024)
+    path = os.path.join(tmp_path, "video.mp4")
+    started = time.monotonic()
+    with pytest.raises(httpdl.Interrupted):
+        httpdl.download_chunked(url, path, len(payload), chunks=4, stop=lambda: time.monotonic() - started > 0.5)
+    assert os.path.getsize(f"{path}.part") == len(payload)
+
+    httpdl.download(url, path)
+    server.shutdown()
+    assert read(path) == payload
+    assert not os.path.exists(f"{path}.part.json")
+
+
+def test_complete_part_finishes_on_416(tmp_path, payload):
+    server, url, requested = serve(payload)
+    path = os.path.join(tmp_path, "video.mp4")
+    with open(f"{path}.part", "wb") as f:
+        f.write(payload)
+    httpdl.download(url, path)
+    server.shutdown()
+    assert requested == []
+    assert read(path) == payload
+
+
+def test_mismatched_part_restarts_on_416(tmp_path, payload):
+    server, url, _ = serve(payload)
+    path = os.path.join(tmp_path, "video.mp4")
+    with open(f"{path}.part", "wb") as f:
+        f.write(payload + b"stale")
+    httpdl.download(url, path)
+    server.shutdown()
+    assert read(path) == payload
+
+
+def test_parallel_ranges_beat_throttling(tmp_path, payload):
+    """Against a server that limits each connection, more ranges go faster"""
+    server, url, _ = serve(payload, rate=2 * 1024 * 1024)
+    elapsed = {}
+    for chunks in (1, 4):
+        path = os.path.join(tmp_path, f"video{chunks}.mp4")
+        start = time.perf_counter()
+        httpdl.download_chunked(url, path, len(payload), chunks=chunks)
+        elapsed[chunks] = time.perf_counter() - start
+        assert read(path) == payload
+    server.shutdown()
+    assert elapsed[4] < elapsed[1] / 2
+
+
+
+@pytest.mark.parametrize("size, chunks", [(0, 4), (3, 4), (3, 0)])
+def test_chunked_tiny_sizes(tmp_path, size, chunks):
+    body = b"abc"
+    server, url, _ = serve(body)
+    path = os.path.join(tmp_path, "tiny.bin")
+    httpdl.download_chunked(url, path, size, chunks=chunks)
+    server.shutdown()
+    assert read(path) == body
+    assert not os.path.exists(f"{path}.part.json")
@@ -0,0 +1,77 @@
+import os
+import random
+import time
+
+import pytest
+
+from ytplayer.library import Library
+
+WORDS = ("love night dance remix live acoustic summer heart fire blue dream city rain "
+         "gold wild river star moon ocean cover official lyrics session").split()
+
+
+@pytest.fixture
+def library(tmp_path):
+    library = Library(os.path.join(tmp_path, "library.db"), [str(tmp_path)])
+    yield library
+    library.close()
+
+
+def touch(path, size=1024):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+
+
+def test_search_by_title_prefix(library, tmp_path):
+    touch(os.path.join(tmp_path, "a.m4a"))
+    library.add(os.path.join(tmp_path, "a.m4a"), "id1", "Dua Lipa - Levitating", "Dua Lipa", 203, "140")
+    rng = random.Random(0)
+    rows = [(os.path.join(os.sep, "elsewhere", f"track{i}.m4a"), f"id{i:07d}",
+             " ".join(rng.choice(WORDS) for _ in range(4)) + f" {i}", f"artist{i % 200}", 200, "140", 4000000, 0, 0)
+            for i in range(10000)]
+    with library.lock:
+        library.db.executemany("INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        library.db.commit()
+    assert len(library) == 10001
+
+    hits = library.search("dua lev")
+    assert [h["id"] for h in hits] == ["id1"]
+    assert hits[0]["path"] == os.path.join(tmp_path, "a.m4a")
+    # Words match as prefixes, so artist170-179 count too
+    hits = library.search("artist17", limit=100)
+    assert len(hits) == 100 and all(h["uploader"].startswith("artist17") for h in hits)
+    assert library.search("nothing-like-this") == []
+
+
+def test_rescan_only_rereads_changes(library, tmp_path):
+    for name in ("a.mp3", "sub/b.opus", "c.mp4.part", "temp/d.mp3", ".hidden/e.mp3"):
+        touch(os.path.join(tmp_path, name))
+    assert library.rescan() == (2, 0)
+    assert library.rescan() == (0, 0)
+
+    os.remove(os.path.join(tmp_path, "a.mp3"))
+    touch(os.path.join(tmp_path, "f.flac"))
+    assert library.rescan() == (1, 1)
+    assert [h["title"] for h in library.search("f")] == ["f"]
+
+
+def test_search_stays_fast_at_100k_tracks(library):
+    rng = random.Random(1)
+    rows = [(os.path.join(os.sep, "music", f"track{i}.m4a"), f"id{i:07d}",
+             " ".join(rng.choice(WORDS) for _ in range(5)), f"artist{i % 5000}", 200, "140", 4000000, 0, 0)
+            for i in range(100000)]
+    with library.lock:
+        library.db.executemany("INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        library.db.commit()
+    assert len(library) == 100000
+
+    # What live search sends while a query is typed out
+    timings = []
+    for query in ("l", "lo", "lov", "love", "love n", "love ni", "love nig", "artist42", "sum rai", "zzz"):
+        start = time.perf_counter()
+        hits = library.search(query)
+        timings.append(time.perf_counter() - start)
+        assert len(hits) <= 50
+    assert len(library.search("artist4217")) == 20
+    assert max(timings) < 0.25, timings
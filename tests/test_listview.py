@@ -0,0 +1,58 @@
+import tkinter as tk
+
+import pytest
+
+from ytplayer.listview import RowModel, VirtualList
+
+ROWS = 10000
+LABELS = [f"{i + 1}. Result number {i} [3:{i % 60:02d}]" for i in range(ROWS)]
+
+
+def test_set_reports_only_the_changed_span():
+    model = RowModel(LABELS)
+    changes = []
+    model.subscribe(lambda *change: changes.append(change))
+    model.set(LABELS[:5000] + ["edited row"] + LABELS[5001:])
+    model.set(LABELS[:5000] + ["edited row"] + LABELS[5001:])
+    model.set(LABELS[:10])
+    assert changes == [(5000, 1, 1), (10, ROWS - 10, 0)]
+    assert model[5] == LABELS[5] and len(model) == 10
+
+
+@pytest.fixture
+def root():
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        pytest.skip(f"no display: {e}")
+    root.geometry("500x400")
+    yield root
+    root.destroy()
+
+
+def test_items_follow_the_view_not_the_rows(root):
+    widget = VirtualList(root)
+    widget.pack(fill=tk.BOTH, expand=True)
+    for label in LABELS:
+        widget.insert(tk.END, label)
+    root.update()
+    visible = len(widget.find_all())
+    assert widget.size() == ROWS and widget.get(123) == LABELS[123]
+    assert 0 < visible < 100
+
+    widget.see(ROWS - 1)
+    root.update()
+    assert len(widget.find_all()) == visible
+    assert widget.nearest(widget.winfo_height() - 1) > ROWS - 50
+
+
+def test_selection_events(root):
+    widget = VirtualList(root)
+    widget.pack(fill=tk.BOTH, expand=True)
+    selected = []
+    widget.bind("<<ListboxSelect>>", lambda e: selected.append(widget.curselection()))
+    widget.insert(tk.END, *LABELS[:20])
+    root.update()
+    widget.event_generate("<Button-1>", x=5, y=widget.row_height * 2 + 1)
+    root.update()
+    assert selected == [(2,)]
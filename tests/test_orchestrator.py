@@ -0,0 +1,98 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+
+from fakes import FAKE_INFO, FakeYoutubeDL
+from ytplayer.cache import InfoCache, MetadataCache
+from ytplayer.extractor import SubprocessExtractor, YoutubeDLExtractor
+from ytplayer.orchestrator import Orchestrator, run_blocking
+
+
+def test_rapid_selection_runs_only_the_last(tmp_path, fake_ytdlp, monkeypatch):
+    """Selecting 100 videos in quick succession, as holding an arrow key down
+    does, kills every superseded format fetch"""
+    monkeypatch.setenv("FAKE_YTDLP_INFO_DELAY", "0.3")
+    info_cache = InfoCache(SubprocessExtractor(fake_ytdlp), MetadataCache(os.path.join(tmp_path, "cache.db")))
+    counts = {"started": 0, "killed": 0, "completed": 0}
+    delivered = []
+    done = threading.Event()
+
+    async def fetch_formats(i):
+        counts["started"] += 1
+        try:
+            # Every id is new, so each fetch misses the cache and runs yt-dlp
+            await info_cache.afetch(FAKE_INFO["webpage_url"], f"v{i}")
+        except asyncio.CancelledError:
+            counts["killed"] += 1
+            raise
+        counts["completed"] += 1
+        return i
+
+    orchestrator = Orchestrator()
+    for i in range(100):
+        orchestrator.latest("formats", functools.partial(fetch_formats, i),
+                            on_result=lambda i: (delivered.append(i), done.set()))
+        time.sleep(0.005)
+    assert done.wait(10)
+    time.sleep(0.3)
+    orchestrator.close()
+
+    assert counts["completed"] == 1, "a superseded fetch ran to completion"
+    assert counts["killed"] == counts["started"] - 1
+    assert delivered == [99], "the UI got a stale or missing result"
+
+
+def test_rapid_selection_in_process(tmp_path):
+    """The in-process backend cannot kill a running extraction, but
+    superseded selections must not queue up extractions behind it"""
+    extractions = []
+
+    class SlowYoutubeDL(FakeYoutubeDL):
+        def extract_info(self, url, download=False, process=True):
+            extractions.append(url)
+            time.sleep(0.1)
+            return super().extract_info(url, download, process)
+
+    info_cache = InfoCache(YoutubeDLExtractor(factory=SlowYoutubeDL),
+                           MetadataCache(os.path.join(tmp_path, "cache.db")))
+    delivered = []
+    done = threading.Event()
+
+    async def fetch_formats(i):
+        await info_cache.afetch(FAKE_INFO["webpage_url"], f"v{i}")
+        return i
+
+    orchestrator = Orchestrator()
+    for i in range(100):
+        orchestrator.latest("formats", functools.partial(fetch_formats, i),
+                            on_result=lambda i: (delivered.append(i), done.set()))
+        time.sleep(0.005)
+    last = time.perf_counter()
+    assert done.wait(10)
+    # At worst the last selection waits out the extraction already running
+    assert time.perf_counter() - last < 0.35
+    orchestrator.close()
+
+    assert delivered == [99]
+    assert len(extractions) <= 100 * 0.005 / 0.1 + 2
+
+
+def test_results_go_through_dispatch():
+    dispatched = []
+    orchestrator = Orchestrator(dispatch=lambda fn: (dispatched.append(fn), fn()))
+    done = threading.Event()
+    errors = []
+
+    async def fail():
+        raise ValueError("boom")
+
+    orchestrator.latest("ok", lambda: run_blocking(sum, [1, 2]), on_result=lambda v: done.set())
+    assert done.wait(5)
+    done.clear()
+    orchestrator.latest("bad", fail, on_error=lambda e: (errors.append(e), done.set()))
+    assert done.wait(5)
+    orchestrator.close()
+    assert len(dispatched) == 2
+    assert isinstance(errors[0], ValueError)
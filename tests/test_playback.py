@@ -0,0 +1,110 @@
+import queue
+import time
+
+from fakes import FakeInstance, FakePlayer
+from ytplayer.playback import PlaybackController, PlayerService, PlayQueue
+
+
+def test_events_are_coalesced_on_the_ui_thread():
+    """A fake UI loop fed by dispatch(), a fake player flooding events"""
+    ui_queue = queue.SimpleQueue()
+    seen = {"time": 0, "last": None, "length": None, "end_at": None}
+
+    def on_time(ms):
+        seen["time"] += 1
+        seen["last"] = ms
+
+    controller = PlaybackController(ui_queue.put, on_time=on_time,
+                                    on_length=lambda ms: seen.update(length=ms),
+                                    on_end=lambda: seen.update(end_at=time.perf_counter()),
+                                    event_type=FakePlayer.EventType)
+    player = FakePlayer(FakeInstance())
+    controller.attach(player)
+    player.play()
+
+    deadline = time.monotonic() + 10
+    while seen["end_at"] is None and time.monotonic() < deadline:
+        try:
+            ui_queue.get(timeout=0.1)()
+        except queue.Empty:
+            pass
+
+    stats = controller.stats
+    assert seen["end_at"] is not None
+    assert stats["events"] == player.length_ms + 3
+    assert stats["dispatches"] < stats["events"]
+    assert seen["time"] <= stats["dispatches"]
+    assert seen["length"] == player.length_ms
+    assert seen["last"] == player.length_ms
+
+
+def test_events_of_a_replaced_player_are_dropped():
+    ui_queue = queue.SimpleQueue()
+    ended = []
+    controller = PlaybackController(ui_queue.put, on_end=lambda: ended.append(True),
+                                    event_type=FakePlayer.EventType)
+    old = FakePlayer(FakeInstance(), length_ms=10, tick_ms=5)
+    controller.attach(old)
+    old.play()
+    old.thread.join()
+    controller.attach(FakePlayer(FakeInstance()))
+    while not ui_queue.empty():
+        ui_queue.get()()
+    assert ended == []
+
+
+def test_track_churn_keeps_one_player():
+    instance = FakeInstance()
+    service = PlayerService(instance=instance)
+    controller = PlaybackController(lambda fn: fn(), event_type=FakePlayer.EventType)
+    for i in range(200):
+        controller.attach(service.play(f"http://example.invalid/{i}.m4a"))
+    assert service.handles == {"instances": 1, "players": 1, "media": 1}
+    assert instance.live == {"players": 1, "media": 1}
+
+    controller.detach()
+    assert service.player.event_manager().handlers == {}
+    service.close()
+    assert service.handles == {"instances": 0, "players": 0, "media": 0}
+    assert instance.live == {"players": 0, "media": 0}
+
+
+def test_prepared_media_is_reused():
+    instance = FakeInstance()
+    service = PlayerService(instance=instance)
+    service.prepare("http://example.invalid/next.m4a", ":no-video")
+    prepared = service.prepared[1]
+    service.play("http://example.invalid/next.m4a", ":no-video")
+    assert service.media is prepared and service.handles["media"] == 1
+
+    service.prepare("http://example.invalid/other.m4a")
+    service.play("http://example.invalid/third.m4a")
+    assert service.prepared is None and instance.live["media"] == 1
+    service.close()
+
+
+def test_play_queue_order():
+    play_queue = PlayQueue()
+    keys = play_queue.extend({"id": str(i)} for i in range(5))
+    play_queue.remove(keys[1])
+    play_queue.play_next({"id": "next"})
+    assert play_queue.peek()[1] == {"id": "next"}
+    assert [play_queue.pop()[1]["id"] for _ in range(len(play_queue))] == ["next", "0", "2", "3", "4"]
+    assert play_queue.pop() is None
+
+
+def test_play_queue_cost_is_flat():
+    def per_op(n):
+        play_queue = PlayQueue()
+        start = time.perf_counter()
+        keys = play_queue.extend({"id": str(i)} for i in range(n))
+        for key in keys[::2]:
+            play_queue.remove(key)
+        for i in range(n // 2):
+            play_queue.play_next({"id": f"next{i}"})
+        while play_queue.pop():
+            pass
+        return (time.perf_counter() - start) / n
+
+    per_op(1000)
+    assert per_op(100000) < per_op(1000) * 5
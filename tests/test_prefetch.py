@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ytplayer.orchestrator import Orchestrator
+from ytplayer.prefetch import FormatPrefetcher
+
+VIDEOS = [{"id": f"v{i:02d}", "title": f"Result {i}", "webpage_url": f"https://www.youtube.com/watch?v=v{i:02d}"}
+          for i in range(20)]
+
+
+class FakeLookup:
+    """Info lookups taking delay seconds, remembered like the InfoCache would"""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.store = {}
+        self.calls = []
+
+    async def __call__(self, url, video_id):
+        self.calls.append(video_id)
+        await asyncio.sleep(self.delay)
+        self.store[video_id] = {"id": video_id}
+        return self.store[video_id]
+
+    def cached(self, video_id):
+        return self.store.get(video_id)
+
+
+@pytest.fixture
+def orchestrator():
+    orchestrator = Orchestrator()
+    yield orchestrator
+    orchestrator.close()
+
+
+def make_prefetcher(orchestrator, lookup, top=5):
+    return FormatPrefetcher(orchestrator, None, top=top, lookup=lookup, cached=lookup.cached)
+
+
+def select(orchestrator, prefetcher, video):
+    """Click-to-formats latency of selecting video"""
+    done = threading.Event()
+    start = time.perf_counter()
+    orchestrator.latest("formats", lambda: prefetcher.fetch(video["webpage_url"], video["id"]),
+                        on_result=lambda info: done.set())
+    assert done.wait(5)
+    return time.perf_counter() - start
+
+
+def test_top_results_are_ready_when_selected(orchestrator):
+    lookup = FakeLookup()
+    prefetcher = make_prefetcher(orchestrator, lookup)
+    prefetcher.results(VIDEOS)
+    time.sleep(lookup.delay * 3 + 0.2)
+    assert sorted(lookup.calls) == [v["id"] for v in VIDEOS[:5]]
+
+    assert select(orchestrator, prefetcher, VIDEOS[2]) < lookup.delay / 2
+    assert select(orchestrator, prefetcher, VIDEOS[9]) >= lookup.delay
+    stats = prefetcher.stats()
+    assert (stats["hits"], stats["misses"], stats["prefetched"], stats["wasted"]) == (1, 1, 5, 4)
+
+
+def test_selection_joins_running_prefetch(orchestrator):
+    lookup = FakeLookup()
+    prefetcher = make_prefetcher(orchestrator, lookup)
+    prefetcher.focus(VIDEOS[7])
+    time.sleep(lookup.delay / 2)
+    assert select(orchestrator, prefetcher, VIDEOS[7]) < lookup.delay
+    assert lookup.calls == ["v07"] and prefetcher.stats()["joined"] == 1
+
+
+def test_prefetch_yields_to_selections(orchestrator):
+    lookup = FakeLookup()
+    prefetcher = make_prefetcher(orchestrator, lookup)
+    release = threading.Event()
+
+    async def selection():
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    orchestrator.latest("formats", selection)
+    time.sleep(0.05)
+    prefetcher.results(VIDEOS)
+    time.sleep(0.2)
+    assert lookup.calls == []
+    release.set()
+    time.sleep(lookup.delay * 3 + 0.2)
+    assert len(lookup.calls) == 5
+
+
+def test_prefetch_cuts_browsing_latency(orchestrator):
+    """Read, arrow down, hover and click, as a user would after a search"""
+    def browse(top, focus):
+        lookup = FakeLookup()
+        prefetcher = make_prefetcher(orchestrator, lookup, top)
+        latencies = []
+        prefetcher.results(VIDEOS)
+        time.sleep(0.4)                 # reading the results
+        for row in (0, 1, 2, 7):        # arrowing down, looking at each one
+            if focus:
+                prefetcher.focus(VIDEOS[row + 1], VIDEOS[row])
+            latencies.append(select(orchestrator, prefetcher, VIDEOS[row]))
+            time.sleep(0.3)
+        if focus:
+            prefetcher.focus(VIDEOS[15])
+        time.sleep(0.1)                 # a quick click, the prefetch is joined
+        latencies.append(select(orchestrator, prefetcher, VIDEOS[15]))
+        return sum(latencies) / len(latencies)
+
+    assert browse(5, True) < browse(0, False) / 2
@@ -0,0 +1,62 @@
+import json
+import random
+import time
+
+from ytplayer.progress import MARKER, Coalescer, ProgressEvent, ProgressParser
+
+
+def recorded_log(lines=5000, size=50 * 1024 * 1024):
+    """A fragmented download as yt-dlp prints it with PROGRESS_ARGS"""
+    out = ["[youtube] Extracting URL: https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+           "[info] dQw4w9WgXcQ: Downloading 1 format(s): 137+140",
+           "[download] Destination: video.f137.mp4"]
+    fragments = 200
+    for i in range(1, lines + 1):
+        done = size * i // lines
+        speed = random.uniform(4, 6) * 1024 * 1024
+        out.append(MARKER + json.dumps({
+            "status": "downloading", "downloaded_bytes": done, "total_bytes_estimate": size,
+            "speed": speed, "eta": int((size - done) / speed), "elapsed": i * 0.0005,
+            "fragment_index": fragments * i // lines, "fragment_count": fragments,
+            "filename": "video.f137.mp4", "tmpfilename": "video.f137.mp4.part", "ctx_id": None}))
+    out.append("[download] 100% of   50.00MiB in 00:00:10 at 5.00MiB/s")
+    return ("\n".join(out) + "\n").encode()
+
+
+def test_parser_handles_any_chunking():
+    log = recorded_log(lines=500)
+    parser = ProgressParser()
+    items, pos = [], 0
+    while pos < len(log):
+        step = random.randint(1, 4096)
+        items.extend(parser.feed(log[pos:pos + step]))
+        pos += step
+    items.extend(parser.close())
+    events = [i for i in items if isinstance(i, ProgressEvent)]
+    assert len(events) == 500
+    assert len(items) - len(events) == 4
+    assert events[-1].downloaded == events[-1].total and events[-1].fragment == 200
+
+
+def test_coalescer_caps_the_update_rate(duration=1.0, rate=10):
+    """Replay a high-rate log at its original pace, compressed into duration"""
+    log = recorded_log()
+    delivered = []
+    coalescer = Coalescer(lambda key, event: delivered.append(event), rate)
+    parser = ProgressParser()
+
+    pos = 0
+    start = time.monotonic()
+    while pos < len(log):
+        step = random.randint(1, 4096)
+        for item in parser.feed(log[pos:pos + step]):
+            if isinstance(item, ProgressEvent):
+                coalescer.update("job", item)
+        pos += step
+        time.sleep(max(0.0, start + duration * pos / len(log) - time.monotonic()))
+    parser.close()
+    time.sleep(2.0 / rate)
+
+    elapsed = time.monotonic() - start
+    assert 1 < len(delivered) <= elapsed * rate + 2, "coalescer let too many updates through"
+    assert delivered[-1].downloaded == delivered[-1].total, "final progress state was lost"
@@ -0,0 +1,115 @@
+import json
+import subprocess
+import sys
+
+import pytest
+import requests
+
+from ytplayer import streaming
+from ytplayer.streaming import StreamMuxer, audio_codec_args, choose_container, codec_fits
+
+# Stands in for ffmpeg: records its arguments, then writes a stream to
+# stdout in flushed pieces and keeps the pipe open until it is killed
+FAKE_FFMPEG = """
+import json, os, sys, time
+with open(sys.argv[1], "w") as f:
+    json.dump(sys.argv[2:], f)
+for i in range(8):
+    sys.stdout.buffer.write(bytes([i]) * 4096)
+    sys.stdout.buffer.flush()
+    time.sleep(0.01)
+os.close(1)
+time.sleep(60)
+"""
+
+
+@pytest.mark.parametrize("codec, container, kind, fits", [
+    ("avc1.640028", "mpegts", "video", True),
+    ("vp9", "mpegts", "video", False),
+    ("vp09.00.40.08", "matroska", "video", True),
+    ("av01.0.08M.08", "matroska", "video", True),
+    ("mp4a.40.2", "mpegts", "audio", True),
+    ("opus", "mpegts", "audio", False),
+    ("opus", "matroska", "audio", True),
+    ("none", "matroska", "audio", False),
+    (None, "matroska", "video", False),
+])
+def test_codec_fits(codec, container, kind, fits):
+    assert codec_fits(codec, container, kind) == fits
+
+
+@pytest.mark.parametrize("vcodec, acodec, container", [
+    ("avc1.640028", "mp4a.40.2", "mpegts"),
+    ("avc1.640028", "opus", "matroska"),
+    ("vp9", "opus", "matroska"),
+    ("av01.0.08M.08", "mp4a.40.2", "matroska"),
+    (None, None, "matroska"),
+])
+def test_choose_container(vcodec, acodec, container):
+    assert choose_container(vcodec, acodec) == container
+
+
+@pytest.mark.parametrize("acodec, container, mode", [
+    ("mp4a.40.2", "mpegts", "copy"),
+    ("ac-3", "mpegts", "copy"),
+    ("opus", "matroska", "copy"),
+    ("vorbis", "matroska", "copy"),
+    ("opus", "mpegts", "transcode"),
+    ("vorbis", "mpegts", "transcode"),
+    ("alac", "matroska", "transcode"),
+    (None, "matroska", "transcode"),
+])
+def test_audio_codec_args(acodec, container, mode):
+    args, chosen = audio_codec_args(acodec, container)
+    assert chosen == mode
+    assert args[:2] == ["-c:a", "copy" if mode == "copy" else "aac"]
+
+
+@pytest.mark.parametrize("vcodec, acodec, container, mode", [
+    # WebM downloads: VP9 with Opus goes into Matroska untouched
+    ("vp9", "opus", "matroska", "copy"),
+    # MP4 downloads: H.264 with AAC fits MPEG-TS untouched
+    ("avc1.4d401f", "mp4a.40.2", "mpegts", "copy"),
+    # Audio neither container carries is transcoded to AAC
+    ("avc1.4d401f", "alac", "matroska", "transcode"),
+])
+def test_muxer_copies_audio_when_it_fits(vcodec, acodec, container, mode):
+    muxer = StreamMuxer("http://v", "http://a", vcodec=vcodec, acodec=acodec)
+    assert (muxer.container, muxer.audio_mode) == (container, mode)
+    command = muxer.command()
+    assert command[command.index("-f") + 1] == container
+    assert command[command.index("-c:a") + 1] == ("copy" if mode == "copy" else "aac")
+
+
+def test_muxer_serves_ffmpeg_output(tmp_path, monkeypatch):
+    script, argv = tmp_path / "ffmpeg.py", tmp_path / "argv.json"
+    script.write_text(FAKE_FFMPEG)
+    real_popen = subprocess.Popen
+    monkeypatch.setattr(streaming.subprocess, "Popen",
+                        lambda cmd, **kwargs: real_popen([sys.executable, str(script), str(argv)] + cmd[1:],
+                                                         **kwargs))
+
+    class Meter:
+        served = []
+
+        def update(self, done):
+            self.served.append(done)
+
+    muxer = StreamMuxer("http://v", "http://a", vcodec="avc1.4d401f", acodec="mp4a.40.2", meter=Meter())
+    url = muxer.start()
+    assert url.endswith("/stream.ts")
+    response = requests.get(url, timeout=5)
+    assert response.headers["Content-Type"] == "video/mp2t"
+    assert response.content == b"".join(bytes([i]) * 4096 for i in range(8))
+    assert Meter.served[-1] == 8 * 4096
+    with open(argv) as f:
+        assert json.load(f) == muxer.command()[1:]
+    command = muxer.command()
+    assert command[command.index("-i") + 1] == "http://v"
+    assert command[-1] == "pipe:1"
+
+    assert muxer.process.poll() is None
+    muxer.close()
+    assert muxer.process.wait(5) is not None
+    with pytest.raises(requests.ConnectionError):
+        requests.get(url, timeout=1)
@@ -0,0 +1,101 @@
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image  # noqa: E402
+
+from ytplayer.thumbnails import ThumbnailCache, ThumbnailLoader  # noqa: E402
+
+
+def jpeg(size, color="red"):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, "JPEG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def server():
+    """Serves fake thumbnails and records every TCP connection opened"""
+    connections = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            connections.append(self.client_address)
+
+        def do_GET(self):
+            body = b"\xff\xd8" + self.path.encode() * 200
+            time.sleep(0.02)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.connections = connections
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def test_loader_reuses_connections(server):
+    base = f"http://127.0.0.1:{server.server_port}"
+    loader = ThumbnailLoader(workers=4)
+    for search in range(5):
+        urls = [f"{base}/vi/{search}-{i}/hqdefault.jpg" for i in range(20)]
+        loader.load_batch(urls + urls[:5])
+        assert loader.fetch(urls[0]).result(5).startswith(b"\xff\xd8")
+    deadline = time.monotonic() + 10
+    while loader.pending and time.monotonic() < deadline:
+        time.sleep(0.05)
+    loader.close()
+
+    # Each batch cancels what the previous one still had queued
+    assert 5 <= len(loader.cache) <= 100
+    assert len(server.connections) <= 4
+
+
+def test_cache_spills_past_byte_budget(tmp_path):
+    cache = ThumbnailCache(max_bytes=10_000, spill_dir=str(tmp_path))
+    blobs = {f"u{i}": bytes([i]) * 3000 for i in range(10)}
+    for url, data in blobs.items():
+        cache.put(url, data)
+        assert cache.used <= cache.max_bytes
+    assert len(cache) == 3
+    assert len(list(tmp_path.iterdir())) == 7
+
+    # Spilled entries come back byte for byte and go back under the budget
+    for url, data in blobs.items():
+        assert cache.get(url) == data
+        assert cache.used <= cache.max_bytes
+
+
+def test_cache_counts_scaled_copies():
+    cache = ThumbnailCache(max_bytes=1_000_000)
+    cache.put("u", b"x" * 100)
+    cache.put_scaled("u", (32, 32), Image.new("RGB", (32, 18)))
+    assert cache.used == 100 + 32 * 18 * 3
+    assert cache.scaled("u", (32, 32)).size == (32, 18)
+    assert cache.scaled("u", (64, 64)) is None
+
+
+def test_fetch_scaled_fits_and_is_cached():
+    loader = ThumbnailLoader(workers=2)
+    url = "http://example.invalid/vi/x/hqdefault.jpg"
+    loader.cache.put(url, jpeg((480, 360)))
+    image = loader.fetch_scaled(url, (120, 120)).result(5)
+    assert image.size == (120, 90)
+    assert loader.fetch_scaled(url, (120, 120)).result(0) is image
+    loader.close()
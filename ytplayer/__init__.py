@@ -0,0 +1,5 @@
+"""Search, streaming, download and library services behind the Tk apps.
+
+Everything here runs without a UI; engine.Engine wires it together and
+`python -m ytplayer` is its command line.
+"""
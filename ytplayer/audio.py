@@ -0,0 +1,90 @@
+import asyncio
+from urllib.parse import urlparse
+
+from .formats import AUDIO_FIELDS, AUDIO_INFO_FIELDS, FormatTable, select_formats
+
+
+class AudioResolver:
+    """Audio-only format lookups for the music player.
+
+    Uses the extractor's audio_info(), which skips the requests that only
+    add video formats or robustness, and keeps just the formats carrying
+    audio: best first, trimmed to AUDIO_FIELDS and stored with their URLs as
+    one small cache entry that expires with them. Playback takes its URL
+    straight from that list, with no format selection over a full table.
+    A lookup that fails or finds no audio falls back to a full extraction.
+
+    select() and invalidate() stand in for the InfoCache ones, so direct
+    downloads of an audio format reuse the entry playback already fetched.
+    """
+
+    def __init__(self, info_cache):
+        self.info_cache = info_cache
+        self.extractor = info_cache.extractor
+        self.store = info_cache.store
+
+    def get(self, video_id):
+        """Cached audio info for video_id, or None if missing or its URLs expired"""
+        return self.store.get("audio", video_id)
+
+    def put(self, info):
+        table = FormatTable(info.get("formats") or [])
+        formats = []
+        for i in table.audio_order:
+            fmt = table.formats[i]
+            if fmt.get("url"):
+                kept = {k: fmt[k] for k in AUDIO_FIELDS if fmt.get(k) is not None}
+                # Unprocessed lookups leave the protocol out; direct downloads need it
+                kept.setdefault("protocol", _protocol(fmt["url"]))
+                formats.append(kept)
+        compact = {k: info.get(k) for k in AUDIO_INFO_FIELDS}
+        compact["formats"] = formats
+        if compact["id"] and formats:
+            self.store.put("audio", compact["id"], compact,
+                           expires=self.info_cache.url_deadline(f["url"] for f in formats))
+        return compact
+
+    async def afetch(self, url, video_id=None):
+        """Audio formats of url, best first, from the cache or an audio-only lookup"""
+        info = self.get(video_id) if video_id else None
+        if info:
+            return info
+        try:
+            info = self.put(await self.extractor.aaudio_info(url))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Audio lookup failed, extracting everything: {e}")
+            info = None
+        if not info or not info["formats"]:
+            info = self.put(await self.extractor.ainfo(url))
+        return info
+
+    def select(self, url, format_spec, video_id=None):
+        """Formats chosen by format_spec from the cached audio formats, else from
+        the full format table"""
+        info = self.get(video_id) if video_id else None
+        # select_formats expects yt-dlp's worst-to-best order
+        chosen = select_formats(info["formats"][::-1], format_spec) if info else []
+        return chosen or self.info_cache.select(url, format_spec, video_id)
+
+    def invalidate(self, video_id):
+        """Forget the cached audio and stream URLs of video_id, e.g. after a 403"""
+        if video_id:
+            self.store.delete("audio", video_id)
+        self.info_cache.invalidate(video_id)
+
+    async def aresolve(self, url, video_id=None, format_id=None):
+        """Stream URL of format_id, or of the best audio format"""
+        formats = (await self.afetch(url, video_id)).get("formats") or []
+        if format_id:
+            formats = [f for f in formats if f.get("format_id") == format_id]
+        if not formats:
+            raise RuntimeError(f"Requested format is not available: {format_id or 'audio'}")
+        return formats[0]["url"]
+
+
+def _protocol(url):
+    """The protocol yt-dlp reports for a format URL once it processes the info"""
+    parsed = urlparse(url)
+    return "m3u8_native" if parsed.path.endswith(".m3u8") else parsed.scheme
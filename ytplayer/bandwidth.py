@@ -0,0 +1,94 @@
+import threading
+import time
+
+from .formats import VIDEO
+
+# Quality used while nothing has been measured yet
+DEFAULT_HEIGHT = 720
+
+
+class ThroughputEstimator:
+    """Exponentially weighted transfer rate of the link, in bytes per second.
+
+    Every sample is weighted by how long it covers, so a rate keeps half of
+    its influence after half_life seconds of newer transfers whatever the
+    sampling interval. There is one rate for all hosts: a video's media comes
+    from whichever CDN node its URLs name, which says nothing about the next
+    video's, and the page host tells even less.
+    """
+
+    def __init__(self, half_life=10.0):
+        self.half_life = half_life
+        self.rate = None
+        self.lock = threading.Lock()
+
+    def add_rate(self, rate, seconds=1.0, lower_bound=False):
+        """Record rate bytes/s sustained for seconds.
+
+        Lower-bound samples come from transfers paced by their consumer (a
+        player reading a live stream), so they can only raise the estimate.
+        """
+        if rate <= 0 or seconds <= 0:
+            return
+        weight = 1 - 0.5 ** (seconds / self.half_life)
+        with self.lock:
+            if self.rate is None:
+                self.rate = rate
+            elif not lower_bound or rate > self.rate:
+                self.rate += weight * (rate - self.rate)
+
+    def add_sample(self, nbytes, seconds, lower_bound=False):
+        if seconds > 0:
+            self.add_rate(nbytes / seconds, seconds, lower_bound)
+
+    def estimate(self):
+        """Bytes/s, or None before any sample"""
+        with self.lock:
+            return self.rate
+
+    def meter(self, interval=0.5, lower_bound=False):
+        return RateMeter(self, interval, lower_bound)
+
+
+class RateMeter:
+    """Turns a running byte count into estimator samples every interval seconds"""
+
+    def __init__(self, estimator, interval=0.5, lower_bound=False):
+        self.estimator = estimator
+        self.interval = interval
+        self.lower_bound = lower_bound
+        self.mark = None
+
+    def update(self, done):
+        now = time.monotonic()
+        if self.mark is None or done < self.mark[1]:
+            # First call, or the transfer restarted: only measure from here
+            self.mark = (now, done)
+            return
+        elapsed = now - self.mark[0]
+        if elapsed >= self.interval:
+            self.estimator.add_sample(done - self.mark[1], elapsed, self.lower_bound)
+            self.mark = (now, done)
+
+
+def auto_height(table, rate, headroom=1.5, kind=VIDEO):
+    """Tallest video height whose bitrate plus the best audio fits rate bytes/s.
+
+    headroom is how much faster than the stream's bitrate the link has to be.
+    Falls back to the smallest height when nothing fits, and to None when
+    there is no estimate or no video with a known bitrate.
+    """
+    if not rate or not table.counts.get(kind):
+        return None
+    audio = 0
+    if kind == VIDEO:
+        best = table.best_audio()
+        audio = (best.get("abr") or best.get("tbr") or 0) if best else 0
+    budget = rate * 8 / 1000 / headroom - audio
+    # Only rows with a known height and bitrate can be judged against the budget
+    rows = [i for i in table.by_height[kind][1] if table.height[i] and table.tbr[i] > 0]
+    # rows ascend by height and bitrate, so walking back the first fitting row wins
+    for i in reversed(rows):
+        if table.tbr[i] <= budget:
+            return table.height[i]
+    return table.height[rows[0]] if rows else None
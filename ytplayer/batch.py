@@ -0,0 +1,299 @@
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from .extractor import LIST_PATHS, CancelToken
+from .fsutil import atomic_write_json
+
+# Marks a file of URLs in the search box, e.g. file:~/playlists.txt; a bare
+# path could just as well be a search query
+FILE_PREFIX = "file:"
+
+
+def is_batch_source(text):
+    """Whether text names a playlist or channel URL, or (with FILE_PREFIX) a file of URLs"""
+    text = text.strip()
+    if text.startswith(FILE_PREFIX):
+        return True
+    parsed = urlparse(text)
+    if parsed.scheme not in ("http", "https"):
+        return False
+    return "list" in parse_qs(parsed.query) or parsed.path.startswith(LIST_PATHS)
+
+
+def read_sources(text):
+    """[text], or the URLs in the file FILE_PREFIX + path names (one per line, # marks a comment line)"""
+    text = text.strip()
+    if not text.startswith(FILE_PREFIX):
+        return [text]
+    with open(os.path.expanduser(text[len(FILE_PREFIX):]), encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def archive_key(entry):
+    """The line yt-dlp's --download-archive writes for entry"""
+    return f"{(entry.get('ie_key') or 'youtube').lower()} {entry.get('id')}"
+
+
+class BatchItem:
+    """One video of a batch: pending, queued, finished, failed, skipped or cancelled"""
+
+    FIELDS = ("id", "url", "title", "source", "archive_key", "status", "error", "job_id")
+
+    def __init__(self, id, url, title="", source="", archive_key=None):
+        self.id = id
+        self.url = url
+        self.title = title
+        self.source = source
+        self.archive_key = archive_key
+        self.status = "pending"
+        self.error = None
+        self.job_id = None
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        item = cls(data["id"], data["url"])
+        for k in cls.FIELDS:
+            if k in data:
+                setattr(item, k, data[k])
+        return item
+
+
+class Batch:
+    """Downloads every video of playlists, channels and URL lists.
+
+    Sources are expanded with a flat listing on a background thread, and
+    each entry is queued as soon as it is listed rather than after the whole
+    playlist. At most window items sit in the download manager at once, at
+    a lower priority than single downloads. Entries already in the download
+    archive are skipped without starting yt-dlp, and yt-dlp records each
+    finished one there itself.
+
+    Sources and items are persisted to state_path, so a restarted app picks
+    up where it stopped: listed items are not listed again, queued jobs the
+    download manager restored are kept, and unfinished sources are listed
+    once more with known entries skipped. Subscribers are called as
+    callback(event, item) for "added", "queued", "finished", "failed",
+    "skipped", "cancelled" and, with item None, "done".
+    """
+
+    def __init__(self, state_path, manager, extractor, output, format_spec=None, args=(),
+                 archive=None, window=8, priority=-1, checkpoint=1):
+        self.state_path = state_path
+        self.manager = manager
+        self.extractor = extractor
+        self.output = output
+        self.format_spec = format_spec
+        self.archive = archive
+        self.args = list(args) + (["--download-archive", archive] if archive else [])
+        self.window = window
+        self.priority = priority
+        self.checkpoint = checkpoint
+        self.sources = []
+        self.items = {}
+        self.by_job = {}
+        self.job_ids = set()
+        self.subscribers = []
+        self.lock = threading.RLock()
+        self.token = None
+        self.expander = None
+        self.saved_at = 0
+        self.archived = self._read_archive()
+        self._load()
+        manager.subscribe(self._on_job)
+
+    def _read_archive(self):
+        try:
+            with open(self.archive, encoding="utf-8") as f:
+                return {line.strip() for line in f if line.strip()}
+        except (OSError, TypeError):
+            return set()
+
+    def _load(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        self.sources = saved.get("sources", [])
+        for data in saved.get("items", []):
+            item = BatchItem.from_dict(data)
+            self.job_ids.add(item.job_id)
+            if item.status == "queued":
+                job = self.manager.jobs.get(item.job_id)
+                if job and job.status in ("queued", "running"):
+                    self.by_job[item.job_id] = item
+                else:
+                    # The manager lost the job, queue it again
+                    item.status, item.job_id = "pending", None
+            self.items[item.id] = item
+
+    def _save(self, force=False):
+        if force or time.time() - self.saved_at >= self.checkpoint:
+            self.saved_at = time.time()
+            atomic_write_json(self.state_path, {"sources": self.sources,
+                                                "items": [i.to_dict() for i in self.items.values()]})
+
+    def _emit(self, event, item):
+        for callback in list(self.subscribers):
+            try:
+                callback(event, item)
+            except Exception as e:
+                print(f"Batch event error: {e}")
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def counts(self):
+        """Number of items per status"""
+        with self.lock:
+            counts = {}
+            for item in self.items.values():
+                counts[item.status] = counts.get(item.status, 0) + 1
+            return counts
+
+    def owns(self, job_id):
+        """Whether the download manager job was queued by this batch"""
+        return job_id in self.job_ids
+
+    @property
+    def expanding(self):
+        return self.expander is not None and self.expander.is_alive()
+
+    def add(self, sources):
+        """Queue every video of sources (URLs or files of URLs)"""
+        with self.lock:
+            if not self.expanding and all(i.status not in ("pending", "queued") for i in self.items.values()):
+                # The previous batch is over, start a fresh one
+                self.sources, self.items = [], {}
+            known = {s["url"] for s in self.sources}
+            for source in sources:
+                for url in read_sources(source):
+                    if url not in known:
+                        known.add(url)
+                        self.sources.append({"url": url, "expanded": False})
+            self._save(force=True)
+        self.resume()
+
+    def resume(self):
+        """Continue listing unfinished sources and refill the download window"""
+        with self.lock:
+            if not self.expanding and any(not s["expanded"] for s in self.sources):
+                self.token = CancelToken()
+                self.expander = threading.Thread(target=self._expand, args=(self.token,),
+                                                 daemon=True, name="batch-expand")
+                self.expander.start()
+            self._fill()
+
+    def _expand(self, token):
+        while True:
+            with self.lock:
+                source = next((s for s in self.sources if not s["expanded"]), None)
+                if source is None:
+                    # Sources added from now on need a new expander
+                    self.expander = None
+                    self._check_done()
+                    return
+            try:
+                for entry in self.extractor.iter_playlist(source["url"], cancel=token):
+                    self._add_entry(entry, source["url"])
+            except Exception as e:
+                print(f"Batch listing failed for {source['url']}: {e}")
+                source["error"] = str(e)[:200]
+            if token.cancelled:
+                return
+            with self.lock:
+                source["expanded"] = True
+                self._save(force=True)
+
+    def _add_entry(self, entry, source):
+        video_id = entry.get("id")
+        url = entry.get("webpage_url") or entry.get("url")
+        if not video_id or not url:
+            return
+        with self.lock:
+            if video_id in self.items:
+                return
+            item = BatchItem(video_id, url, entry.get("title") or video_id, source, archive_key(entry))
+            if item.archive_key in self.archived:
+                item.status = "skipped"
+            self.items[video_id] = item
+            self._save()
+        self._emit("added", item)
+        if item.status == "skipped":
+            self._emit("skipped", item)
+        else:
+            with self.lock:
+                self._fill()
+
+    def _fill(self):
+        # Caller holds self.lock
+        for item in self.items.values():
+            if len(self.by_job) >= self.window:
+                break
+            if item.status != "pending":
+                continue
+            job = self.manager.add(item.url, self.output, self.format_spec, self.args, item.title,
+                                   self.priority, video_id=item.id)
+            item.status, item.job_id = "queued", job.id
+            self.by_job[job.id] = item
+            self.job_ids.add(job.id)
+            self._save()
+            self._emit("queued", item)
+
+    def _on_job(self, event, job):
+        if event not in ("finished", "failed", "cancelled"):
+            return
+        with self.lock:
+            item = self.by_job.pop(job.id, None)
+            if item is None:
+                return
+            item.status, item.error = event, job.error
+            if event == "finished" and item.archive_key:
+                self.archived.add(item.archive_key)
+            self._save(force=True)
+        self._emit(event, item)
+        with self.lock:
+            self._fill()
+            self._check_done()
+
+    def _check_done(self):
+        # Caller holds self.lock
+        if self.expanding and threading.current_thread() is not self.expander:
+            return
+        if any(not s["expanded"] for s in self.sources):
+            return
+        if any(i.status in ("pending", "queued") for i in self.items.values()):
+            return
+        if self.items:
+            self._emit("done", None)
+
+    def cancel(self):
+        """Stop listing and drop everything not downloaded yet"""
+        with self.lock:
+            if self.token:
+                self.token.cancel()
+            for item in self.items.values():
+                if item.status == "pending":
+                    item.status = "cancelled"
+            for s in self.sources:
+                s["expanded"] = True
+            job_ids = list(self.by_job)
+            self._save(force=True)
+        # The manager reports each one back through _on_job
+        for job_id in job_ids:
+            self.manager.cancel(job_id)
+
+    def stop(self):
+        """Stop listing for now; resume() carries on from the saved state"""
+        if self.token:
+            self.token.cancel()
+        with self.lock:
+            self._save(force=True)
@@ -0,0 +1,227 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from .formats import select_formats, url_expiry
+
+# Default lifetimes per namespace, in seconds
+DEFAULT_TTLS = {
+    "search": 6 * 3600,
+    "info": 7 * 24 * 3600,
+    "stream": 5 * 3600,
+}
+
+
+def normalize_query(query):
+    """Case- and whitespace-folded query, used as the search cache key"""
+    return " ".join(query.casefold().split())
+
+
+def filter_results(entries, query):
+    """Entries whose title or channel has a word starting with each word of query"""
+    words = re.findall(r"\w+", query.casefold())
+    matches = []
+    for entry in entries:
+        text = f"{entry.get('title') or ''} {entry.get('uploader') or entry.get('channel') or ''}"
+        tokens = re.findall(r"\w+", text.casefold())
+        if all(any(t.startswith(w) for t in tokens) for w in words):
+            matches.append(entry)
+    return matches
+
+
+class MetadataCache:
+    """SQLite-backed JSON cache with per-namespace TTLs and LRU eviction"""
+
+    def __init__(self, path=":memory:", max_bytes=64 * 1024 * 1024, ttls=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.stats = {}
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS entries (
+            ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+            size INTEGER NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL,
+            PRIMARY KEY (ns, key))""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+        # Drop whatever expired while the app was closed
+        self.db.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+        self.db.commit()
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _count(self, ns, hit):
+        counts = self.stats.setdefault(ns, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+
+    def get(self, ns, key):
+        """Cached value, or None if missing or expired"""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT value, size, expires FROM entries WHERE ns = ? AND key = ?",
+                                  (ns, key)).fetchone()
+            if row and row[2] > now:
+                self.db.execute("UPDATE entries SET accessed = ? WHERE ns = ? AND key = ?", (now, ns, key))
+                self.db.commit()
+                self._count(ns, True)
+                return json.loads(row[0])
+
+            if row:
+                self._delete(ns, key, row[1])
+                self.db.commit()
+            self._count(ns, False)
+            return None
+
+    def get_prefix(self, ns, key, min_length=2):
+        """(cached key, value) for the longest unexpired key that is a prefix of key"""
+        prefixes = [key[:i] for i in range(len(key), min_length - 1, -1)]
+        if not prefixes:
+            return None
+        with self.lock:
+            row = self.db.execute(
+                f"""SELECT key, value FROM entries WHERE ns = ? AND expires > ?
+                    AND key IN ({",".join("?" * len(prefixes))}) ORDER BY length(key) DESC LIMIT 1""",
+                (ns, time.time(), *prefixes)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put(self, ns, key, value, expires=None):
+        """Store value; expires defaults to now plus the namespace TTL"""
+        now = time.time()
+        if expires is None:
+            expires = now + self.ttls.get(ns, 3600)
+        data = json.dumps(value, separators=(",", ":"))
+        size = len(data)
+
+        with self.lock:
+            row = self.db.execute("SELECT size FROM entries WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+            self.total_bytes += size - (row[0] if row else 0)
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                            (ns, key, data, size, expires, now))
+            self._evict()
+            self.db.commit()
+        return value
+
+    def delete(self, ns, key):
+        with self.lock:
+            row = self.db.execute("SELECT size FROM entries WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+            if row:
+                self._delete(ns, key, row[0])
+                self.db.commit()
+
+    def _delete(self, ns, key, size):
+        self.db.execute("DELETE FROM entries WHERE ns = ? AND key = ?", (ns, key))
+        self.total_bytes -= size
+
+    def _evict(self):
+        """Drop least recently used entries until under the size cap"""
+        while self.total_bytes > self.max_bytes:
+            rows = self.db.execute("SELECT ns, key, size FROM entries ORDER BY accessed LIMIT 32").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            for ns, key, size in rows:
+                self._delete(ns, key, size)
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class InfoCache:
+    """Per-video cache of yt-dlp info dicts with stream URL expiry tracking.
+
+    Video metadata and the signed format URLs are stored separately so the
+    format table outlives the URLs, which expire within hours.
+    """
+
+    def __init__(self, extractor, store=None, leeway=300):
+        self.extractor = extractor
+        self.store = store or MetadataCache()
+        # Treat URLs as expired this many seconds early so playback can start
+        self.leeway = leeway
+
+    def get(self, video_id, need_urls=True):
+        """Cached info for video_id, or None if missing or its URLs expired"""
+        info = self.store.get("info", video_id)
+        if info is None or not need_urls:
+            return info
+
+        urls = self.store.get("stream", video_id)
+        if urls is None:
+            return None
+        for fmt in info.get("formats") or []:
+            if fmt.get("format_id") in urls:
+                fmt["url"] = urls[fmt["format_id"]]
+        return info
+
+    def put(self, info):
+        video_id = info.get("id")
+        if not video_id:
+            return info
+
+        urls = {}
+        compact = dict(info, formats=[])
+        for fmt in info.get("formats") or []:
+            fmt = dict(fmt)
+            url = fmt.pop("url", None)
+            if url and fmt.get("format_id"):
+                urls[fmt["format_id"]] = url
+            # Fragment lists and headers are only needed by the downloader
+            fmt.pop("fragments", None)
+            fmt.pop("http_headers", None)
+            compact["formats"].append(fmt)
+
+        self.store.put("info", video_id, compact)
+        if urls:
+            self.store.put("stream", video_id, urls, expires=self.url_deadline(urls.values()))
+        return info
+
+    def url_deadline(self, urls):
+        """When stream URLs are due for a refetch: their first expiry, less leeway"""
+        deadline = time.time() + self.store.ttls["stream"]
+        expiries = [e for e in map(url_expiry, urls) if e]
+        return min(deadline, min(expiries) - self.leeway) if expiries else deadline
+
+    def invalidate(self, video_id):
+        """Forget the cached stream URLs of video_id, e.g. after a 403"""
+        if video_id:
+            self.store.delete("stream", video_id)
+
+    def fetch(self, url, video_id=None, need_urls=False):
+        """Return cached info, running the extractor only on a miss"""
+        info = self.get(video_id, need_urls) if video_id else None
+        return info or self.put(self.extractor.info(url))
+
+    async def afetch(self, url, video_id=None, need_urls=False):
+        """fetch() for an asyncio loop; a miss awaits the extractor's ainfo()"""
+        info = self.get(video_id, need_urls) if video_id else None
+        return info or self.put(await self.extractor.ainfo(url))
+
+    def select(self, url, format_spec, video_id=None):
+        """Formats chosen by format_spec from the cached table, with fresh URLs"""
+        return self._choose(self.fetch(url, video_id, need_urls=True), format_spec)
+
+    async def aselect(self, url, format_spec, video_id=None):
+        return self._choose(await self.afetch(url, video_id, need_urls=True), format_spec)
+
+    @staticmethod
+    def _choose(info, format_spec):
+        chosen = select_formats(info.get("formats") or [info], format_spec)
+        if not chosen:
+            raise RuntimeError(f"Requested format is not available: {format_spec}")
+        return chosen
+
+    def resolve(self, url, format_spec, video_id=None):
+        """Stream URLs for format_spec, picked from the cached format table"""
+        return [f["url"] for f in self.select(url, format_spec, video_id)]
+
+    async def aresolve(self, url, format_spec, video_id=None):
+        return [f["url"] for f in await self.aselect(url, format_spec, video_id)]
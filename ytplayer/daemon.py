@@ -0,0 +1,276 @@
+import hmac
+import json
+import os
+import secrets
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from .downloads import DownloadJob
+from .extractor import SEARCH_PAGE
+
+
+# Written to the data dir by serve(); clients send it as a bearer token
+TOKEN_FILE = "daemon.token"
+
+
+class BadRequest(Exception):
+    """The request is malformed; answered with 400"""
+
+
+class NotFound(Exception):
+    """The request names something that does not exist; answered with 404"""
+
+
+def _job_dict(job):
+    data = job.to_dict()
+    data.update(speed=job.speed, eta=job.eta)
+    return data
+
+
+def _check_url(url):
+    """url, if it is an http(s) URL; anything else could be a path or a yt-dlp option"""
+    if not isinstance(url, str) or urlparse(url).scheme not in ("http", "https"):
+        raise BadRequest(f"Not an http(s) URL: {url}")
+    return url
+
+
+def _require(data, key):
+    """data[key] of a query or body that has to carry it"""
+    if key not in data:
+        raise BadRequest(f"Missing {key!r}")
+    return data[key]
+
+
+def _int(query, key, default):
+    try:
+        return int(query.get(key, default))
+    except ValueError:
+        raise BadRequest(f"{key!r} must be an integer") from None
+
+
+def read_token(data_dir):
+    try:
+        with open(os.path.join(data_dir, TOKEN_FILE), encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class EngineServer(ThreadingHTTPServer):
+    """Local JSON-over-HTTP API in front of an Engine.
+
+    GET  /search?q=...&start=0&count=20   search results
+    GET  /info?url=...                    yt-dlp info dict
+    GET  /resolve?url=...&format=...      stream URLs
+    GET  /jobs                            download jobs
+    POST /jobs {"url", "output", "format", "title"}
+    DELETE /jobs/<id>                     cancel a job
+    GET  /batch                           batch items and counts
+    POST /batch {"sources": [...]}
+
+    Errors come back as {"error": message}: 400 for malformed requests, 404
+    for unknown routes and jobs, 500 for anything that failed on our side.
+
+    Every request needs an "Authorization: Bearer <token>" header and POSTs
+    an application/json body, so that a web page cannot drive the daemon
+    with a plain form or fetch() request. Only http(s) URLs are accepted and
+    download outputs stay inside the engine's data dir.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, engine, host="127.0.0.1", port=8765, token=None):
+        self.engine = engine
+        self.token = token or secrets.token_urlsafe(32)
+        super().__init__((host, port), _Handler)
+
+    def write_token(self):
+        """Store the token in the data dir, readable by the current user only"""
+        path = os.path.join(self.engine.data_dir, TOKEN_FILE)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.token)
+        return path
+
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Keep-alive replies would otherwise wait out the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def _reply(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            raise BadRequest(f"Invalid JSON body: {e}") from None
+        if not isinstance(body, dict):
+            raise BadRequest("Expected a JSON object")
+        return body
+
+    def _refuse(self, method):
+        """(status, message) for a request that may not come from our clients"""
+        if not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {self.server.token}"):
+            return 401, "Missing or wrong token"
+        if method == "post" and self.headers.get_content_type() != "application/json":
+            return 415, "Expected an application/json body"
+        return None
+
+    def _dispatch(self, method):
+        refused = self._refuse(method)
+        if refused:
+            # Unread bodies would otherwise be taken for the next request
+            self.close_connection = True
+            return self._reply({"error": refused[1]}, refused[0])
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        route = getattr(self, f"{method}_{parsed.path.strip('/').split('/')[0]}", None)
+        if route is None:
+            return self._reply({"error": f"No route for {method.upper()} {parsed.path}"}, 404)
+        try:
+            self._reply(route(parsed.path, query))
+        except BadRequest as e:
+            self._reply({"error": f"Bad request: {e}"}, 400)
+        except NotFound as e:
+            self._reply({"error": f"Not found: {e}"}, 404)
+        except Exception as e:
+            self._reply({"error": str(e) or e.__class__.__name__}, 500)
+
+    def do_GET(self):
+        self._dispatch("get")
+
+    def do_POST(self):
+        self._dispatch("post")
+
+    def do_DELETE(self):
+        self._dispatch("delete")
+
+    @property
+    def engine(self):
+        return self.server.engine
+
+    def get_search(self, path, query):
+        return self.engine.search(_require(query, "q"), _int(query, "start", 0), _int(query, "count", SEARCH_PAGE))
+
+    def get_info(self, path, query):
+        return self.engine.info(_check_url(_require(query, "url")), query.get("id"))
+
+    def get_resolve(self, path, query):
+        return self.engine.resolve(_check_url(_require(query, "url")), query.get("format", "best"), query.get("id"))
+
+    def get_jobs(self, path, query):
+        manager = self.engine.downloads
+        # Workers add jobs and update their state under the manager's lock
+        with manager.cond:
+            return [_job_dict(j) for j in manager.jobs.values()]
+
+    def post_jobs(self, path, query):
+        body = self._body()
+        job = self.engine.download(_check_url(_require(body, "url")), self._output(body.get("output")),
+                                   body.get("format"), title=body.get("title", ""), video_id=body.get("id"))
+        return _job_dict(job)
+
+    def _output(self, output):
+        """output resolved against the data dir, which it may not leave"""
+        if not output:
+            return None
+        root = os.path.realpath(self.engine.data_dir)
+        path = os.path.realpath(os.path.join(root, output))
+        if os.path.commonpath([root, path]) != root:
+            raise BadRequest(f"Output outside the data dir: {output}")
+        return path
+
+    def delete_jobs(self, path, query):
+        job_id = path.rstrip("/").split("/")[-1]
+        manager = self.engine.downloads
+        if job_id not in manager.jobs:
+            raise NotFound(f"No job {job_id}")
+        manager.cancel(job_id)
+        with manager.cond:
+            return _job_dict(manager.jobs[job_id])
+
+    def get_batch(self, path, query):
+        batch = self.engine.batch
+        with batch.lock:
+            items = [i.to_dict() for i in batch.items.values()]
+        return {"counts": batch.counts(), "expanding": batch.expanding, "items": items}
+
+    def post_batch(self, path, query):
+        # Only URLs: a file name would have the daemon read local files
+        sources = _require(self._body(), "sources")
+        if not isinstance(sources, list):
+            raise BadRequest("'sources' must be a list")
+        return self.engine.add_batch([_check_url(s) for s in sources])
+
+    def log_message(self, *args):
+        pass
+
+
+class EngineClient:
+    """Calls a running EngineServer; mirrors the Engine methods the CLI uses"""
+
+    def __init__(self, url, token, session=None, timeout=120):
+        self.url = url.rstrip("/")
+        self.session = session or requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        self.timeout = timeout
+
+    def _call(self, method, path, params=None, body=None):
+        response = self.session.request(method, f"{self.url}{path}", params=params, json=body,
+                                        timeout=self.timeout)
+        data = response.json()
+        if response.status_code >= 400:
+            raise RuntimeError(data.get("error") or f"HTTP {response.status_code}")
+        return data
+
+    def search(self, query, start=0, count=SEARCH_PAGE):
+        return self._call("GET", "/search", {"q": query, "start": start, "count": count})
+
+    def info(self, url, video_id=None):
+        return self._call("GET", "/info", {"url": url, "id": video_id})
+
+    def resolve(self, url, format_spec, video_id=None):
+        return self._call("GET", "/resolve", {"url": url, "format": format_spec, "id": video_id})
+
+    def download(self, url, output=None, format_spec=None, title="", video_id=None):
+        return self._call("POST", "/jobs", body={"url": url, "output": output, "format": format_spec,
+                                                 "title": title, "id": video_id})
+
+    def jobs(self):
+        return [DownloadJob.from_dict(data) for data in self._call("GET", "/jobs")]
+
+    def cancel(self, job_id):
+        return self._call("DELETE", f"/jobs/{job_id}")
+
+    def add_batch(self, sources):
+        return self._call("POST", "/batch", body={"sources": list(sources)})
+
+    def batch(self):
+        return self._call("GET", "/batch")
+
+
+def serve(engine, host="127.0.0.1", port=8765):
+    """Serve engine until interrupted, then stop it"""
+    server = EngineServer(engine, host, port)
+    print(f"Serving on {server.url()}, token in {server.write_token()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        engine.close()
@@ -0,0 +1,378 @@
+import glob
+import itertools
+import json
+import os
+import subprocess
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from . import httpdl
+from .extractor import startupinfo, ytdlp_path
+from .fsutil import atomic_write_json
+from .progress import PROGRESS_ARGS, Coalescer, ProgressEvent, ProgressParser
+
+_job_ids = itertools.count(1)
+
+
+class DownloadJob:
+    """One queued download.
+
+    Direct jobs fetch a single format's media URL with our own resumable
+    HTTP client; all others are handed to yt-dlp. The persisted fields double
+    as the crash journal: part files and bytes done are checkpointed while the
+    job runs so a restart resumes instead of starting over.
+    """
+
+    FIELDS = ("id", "url", "format_spec", "output", "args", "title", "priority", "order",
+              "status", "percent", "error", "result_path", "created",
+              "video_id", "direct", "part_files", "bytes_done", "total_bytes")
+
+    def __init__(self, url, output, format_spec=None, args=(), title="", priority=0, order=0,
+                 video_id=None, direct=False):
+        self.id = f"{int(time.time() * 1000):x}-{next(_job_ids)}"
+        self.url = url
+        self.output = output
+        self.format_spec = format_spec
+        self.args = list(args)
+        self.title = title
+        self.priority = priority
+        self.order = order
+        self.status = "queued"
+        self.percent = 0.0
+        self.error = None
+        self.result_path = None
+        self.created = time.time()
+        self.video_id = video_id
+        self.direct = direct
+        self.part_files = []
+        self.bytes_done = 0
+        self.total_bytes = None
+        # Live transfer state, not persisted: bytes/s, seconds, fragment i of n
+        self.speed = None
+        self.eta = None
+        self.fragment = None
+        self.fragments = None
+        self.process = None
+        self.saved_at = 0
+
+    @property
+    def host(self):
+        return urlparse(self.url).hostname or ""
+
+    def find_part_files(self):
+        """Part files yt-dlp or httpdl left next to the output path"""
+        prefix = self.output.split("%(")[0] if "%(" in self.output else os.path.splitext(self.output)[0]
+        return sorted(glob.glob(glob.escape(prefix) + "*.part"))
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data["url"], data["output"])
+        for k in cls.FIELDS:
+            if k in data:
+                setattr(job, k, data[k])
+        return job
+
+
+class DownloadManager:
+    """Persistent download queue served by a pool of yt-dlp workers.
+
+    Jobs run highest priority first, then in queue order. per_host, when
+    given, caps how many jobs share a page host at once; every YouTube job has
+    the same page host whatever CDN node serves its media, so it is off by
+    default and workers alone bound concurrency. Subscribers are called
+    as callback(event, job) from worker threads for "added", "started",
+    "progress", "finished", "failed", "cancelled" and "reordered" events.
+
+    "progress" events are coalesced to at most progress_rate per second and
+    job, always ending on the latest state.
+
+    The queue file is rewritten atomically on every state change and at most
+    every checkpoint seconds while jobs make progress. Transfer rates are
+    reported to estimator, a bandwidth.ThroughputEstimator, when given.
+    """
+
+    def __init__(self, queue_path, workers=3, per_host=None, cmd=None, info_cache=None, checkpoint=2,
+                 chunks=4, estimator=None, progress_rate=10):
+        self.queue_path = queue_path
+        self.per_host = per_host
+        self.cmd = list(cmd or [ytdlp_path()])
+        # Needed for direct jobs, which resolve their media URL when they start:
+        # an InfoCache, or anything with its select() and invalidate()
+        self.info_cache = info_cache
+        self.checkpoint = checkpoint
+        # Byte ranges fetched in parallel for large direct downloads
+        self.chunks = chunks
+        self.estimator = estimator
+        self.progress_updates = Coalescer(lambda job_id, job: self._emit("progress", job), progress_rate)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers * chunks)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.jobs = {}
+        self.subscribers = []
+        self.cond = threading.Condition()
+        self.running = True
+        self._load()
+        self.workers = [threading.Thread(target=self._worker, daemon=True, name=f"download-{i}")
+                        for i in range(workers)]
+
+    def start(self):
+        """Start the workers; subscribe first to see events for restored jobs"""
+        for worker in self.workers:
+            worker.start()
+
+    def _load(self):
+        try:
+            with open(self.queue_path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        for data in saved:
+            job = DownloadJob.from_dict(data)
+            # Anything that was running when the app closed resumes from its part files
+            if job.status in ("queued", "running"):
+                job.status = "queued"
+                self.jobs[job.id] = job
+
+    def _save(self):
+        for job in self.jobs.values():
+            if job.status == "running" and not job.direct:
+                job.part_files = job.find_part_files()
+                job.bytes_done = sum(os.path.getsize(p) for p in job.part_files if os.path.exists(p))
+        atomic_write_json(self.queue_path, [j.to_dict() for j in self.jobs.values()
+                                            if j.status in ("queued", "running")])
+
+    def _emit(self, event, job):
+        for callback in list(self.subscribers):
+            try:
+                callback(event, job)
+            except Exception as e:
+                print(f"Download event error: {e}")
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def add(self, url, output, format_spec=None, args=(), title="", priority=0,
+            video_id=None, direct=False):
+        with self.cond:
+            order = max((j.order for j in self.jobs.values()), default=0) + 1
+            job = DownloadJob(url, output, format_spec, args, title, priority, order,
+                              video_id, direct and self.info_cache is not None)
+            self.jobs[job.id] = job
+            self._save()
+            self.cond.notify()
+        self._emit("added", job)
+        return job
+
+    def queued(self):
+        """Queued jobs in the order they will run"""
+        with self.cond:
+            return sorted((j for j in self.jobs.values() if j.status == "queued"),
+                          key=lambda j: (-j.priority, j.order))
+
+    def active(self):
+        with self.cond:
+            return [j for j in self.jobs.values() if j.status == "running"]
+
+    def set_priority(self, job_id, priority):
+        with self.cond:
+            job = self.jobs[job_id]
+            job.priority = priority
+            self._save()
+        self._emit("reordered", job)
+
+    def move_to_front(self, job_id):
+        with self.cond:
+            job = self.jobs[job_id]
+            job.order = min((j.order for j in self.jobs.values()), default=0) - 1
+            self._save()
+        self._emit("reordered", job)
+
+    def cancel(self, job_id):
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if not job or job.status not in ("queued", "running"):
+                return
+            job.status = "cancelled"
+            if job.process and job.process.poll() is None:
+                job.process.terminate()
+            self._save()
+        self._emit("cancelled", job)
+
+    def _next_job(self):
+        busy = {}
+        for job in self.jobs.values():
+            if job.status == "running":
+                busy[job.host] = busy.get(job.host, 0) + 1
+        for job in sorted((j for j in self.jobs.values() if j.status == "queued"),
+                          key=lambda j: (-j.priority, j.order)):
+            if self.per_host is None or busy.get(job.host, 0) < self.per_host:
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                job = self._next_job()
+                while self.running and job is None:
+                    self.cond.wait()
+                    job = self._next_job()
+                if not self.running:
+                    return
+                job.status = "running"
+                self._save()
+            self._emit("started", job)
+            self._run(job)
+            with self.cond:
+                # A finished job may free up its host for a waiting one
+                self.cond.notify_all()
+
+    def command(self, job):
+        cmd = self.cmd + ["-o", job.output, "--progress", *PROGRESS_ARGS, "--continue", "--part",
+                          "--print", "after_move:filepath"]
+        if job.format_spec:
+            cmd.extend(["-f", job.format_spec])
+        # "--" keeps a URL starting with a dash from being read as an option
+        return cmd + job.args + ["--", job.url]
+
+    def _progress(self, job):
+        self.progress_updates.update(job.id, job)
+        if time.time() - job.saved_at >= self.checkpoint:
+            job.saved_at = time.time()
+            with self.cond:
+                self._save()
+
+    def _run_ytdlp(self, job):
+        """Run yt-dlp for job; returns an error message or None on success"""
+        process = subprocess.Popen(self.command(job), stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, startupinfo=startupinfo())
+        with self.cond:
+            job.process = process
+            # cancel() or shutdown() may have run before there was a process to stop
+            if job.status == "cancelled" or not self.running:
+                process.terminate()
+        parser = ProgressParser()
+        tail = []
+        measured = time.monotonic()
+        # read1 returns whatever yt-dlp has written so far, whole lines or not
+        for chunk in iter(lambda: job.process.stdout.read1(64 * 1024), b""):
+            for item in parser.feed(chunk):
+                if isinstance(item, ProgressEvent):
+                    measured = self._apply_progress(job, item, measured)
+                elif item and not item.startswith("["):
+                    # --print after_move:filepath reports the final file
+                    if os.path.isabs(item) and os.path.exists(item):
+                        job.result_path = item
+                    tail = (tail + [item])[-5:]
+        tail = (tail + [line for line in parser.close() if isinstance(line, str)])[-5:]
+        job.process.wait()
+
+        if job.process.returncode == 0:
+            return None
+        return "\n".join(tail) or f"yt-dlp exited with {job.process.returncode}"
+
+    def _apply_progress(self, job, event, measured):
+        """Copy a progress event onto job; returns when the speed was last measured"""
+        job.bytes_done, job.total_bytes = event.downloaded, event.total
+        job.speed, job.eta = event.speed, event.eta
+        job.fragment, job.fragments = event.fragment, event.fragments
+        if event.percent is not None:
+            job.percent = event.percent
+        now = time.monotonic()
+        if event.speed and self.estimator:
+            # Each reported speed stands for the time since the previous one
+            self.estimator.add_rate(event.speed, now - measured)
+            measured = now
+        self._progress(job)
+        return measured
+
+    def _run_direct(self, job):
+        """Fetch a single format over HTTP, resuming from its part file(s)"""
+        meter = None
+
+        sampled = [time.monotonic(), None]
+
+        def progress(done, total):
+            now = time.monotonic()
+            if sampled[1] is None or done < sampled[1]:
+                sampled[:] = [now, done]
+            elif now - sampled[0] >= 1:
+                job.speed = (done - sampled[1]) / (now - sampled[0])
+                sampled[:] = [now, done]
+            job.bytes_done, job.total_bytes = done, total
+            if total:
+                job.percent = done * 100.0 / total
+                job.eta = (total - done) / job.speed if job.speed else None
+            if meter:
+                meter.update(done)
+            self._progress(job)
+
+        def stop():
+            return job.status == "cancelled" or not self.running
+
+        job.part_files = [f"{job.output}.part", f"{job.output}.part.json"]
+        for attempt in range(2):
+            if attempt:
+                self.info_cache.invalidate(job.video_id)
+            fmt = self.info_cache.select(job.url, job.format_spec, job.video_id)[0]
+            size = fmt.get("filesize")
+            if self.estimator:
+                meter = self.estimator.meter()
+            try:
+                # Large files with a known size come down as parallel ranges,
+                # which sidesteps per-connection throttling
+                if self.chunks > 1 and size and size >= 8 * 1024 * 1024:
+                    try:
+                        job.result_path = httpdl.download_chunked(
+                            fmt["url"], job.output, size, self.chunks, self.session, progress, stop)
+                        return None
+                    except httpdl.NoRangeSupport:
+                        pass
+                job.result_path = httpdl.download(fmt["url"], job.output, self.session, progress, stop)
+                return None
+            except requests.HTTPError as e:
+                # Signed URLs can die before their expiry, refresh once
+                status = e.response.status_code if e.response is not None else None
+                if attempt or status not in (403, 404, 410):
+                    raise
+
+    def _run(self, job):
+        try:
+            error = self._run_direct(job) if job.direct else self._run_ytdlp(job)
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+        finally:
+            job.process = None
+            # No progress may arrive after the job's final event
+            self.progress_updates.discard(job.id)
+
+        with self.cond:
+            if job.status == "cancelled":
+                return
+            if not self.running:
+                # Interrupted by shutdown, resume it next time
+                job.status = "queued"
+                self._save()
+                return
+            if error is None:
+                job.status, job.percent, job.part_files = "finished", 100.0, []
+            else:
+                job.status, job.error = "failed", error
+            self._save()
+        self._emit(job.status, job)
+
+    def shutdown(self):
+        """Stop the workers; running jobs are killed and resumed on next start"""
+        with self.cond:
+            self.running = False
+            for job in self.jobs.values():
+                if job.process and job.process.poll() is None:
+                    job.process.terminate()
+            self.cond.notify_all()
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from .audio import AudioResolver
+from .bandwidth import ThroughputEstimator
+from .batch import FILE_PREFIX, Batch, read_sources
+from .cache import InfoCache, MetadataCache, filter_results
+from .downloads import DownloadManager
+from .extractor import SEARCH_PAGE, get_extractor
+from .formats import FormatTable
+from .fsutil import DirLocked, lock_dir
+from .library import Library
+
+# Where the apps and the CLI keep downloads, caches and queues by default
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), "Downloads", "MediaDownloader")
+
+# Output template for downloads that were not given a path
+OUTPUT_TEMPLATE = "%(title).80B [%(id)s].%(ext)s"
+
+
+class Engine:
+    """Search, format, stream and download services with no UI attached.
+
+    Owns everything the Tk apps used to wire up themselves: the extractor,
+    the metadata and info caches, the library, the bandwidth estimator, the
+    download queue and the batch downloader, all kept under data_dir. Call
+    start() once subscribers are in place and close() on the way out.
+
+    Only one Engine may use a data_dir at a time, since each would run and
+    rewrite the other's download queue; a second one raises DirLocked.
+    """
+
+    def __init__(self, data_dir=DEFAULT_DIR, workers=3, extractor=None, batch_format=None,
+                 batch_args=("--no-playlist",)):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.lock = lock_dir(data_dir)
+        self.extractor = extractor or get_extractor()
+        self.cache = MetadataCache(os.path.join(data_dir, "cache.db"))
+        self.info_cache = InfoCache(self.extractor, self.cache)
+        # Audio-only lookups for players that never show video
+        self.audio = AudioResolver(self.info_cache)
+        self.library = Library(os.path.join(data_dir, "library.db"), [data_dir])
+        # Learns link speed from downloads and streams, for adaptive quality
+        self.bandwidth = ThroughputEstimator()
+        # Direct downloads of audio formats resolve through the audio entries
+        self.downloads = DownloadManager(os.path.join(data_dir, "downloads.json"), workers=workers,
+                                         info_cache=self.audio, estimator=self.bandwidth)
+        self.downloads.subscribe(self._index_download)
+        self.batch = Batch(os.path.join(data_dir, "batch.json"), self.downloads, self.extractor,
+                           os.path.join(data_dir, OUTPUT_TEMPLATE), batch_format, batch_args,
+                           archive=os.path.join(data_dir, "archive.txt"))
+
+    def start(self):
+        """Index the download dir, start the workers and resume any batch"""
+        threading.Thread(target=self.library.rescan, daemon=True).start()
+        self.downloads.start()
+        self.batch.resume()
+
+    def close(self):
+        """Stop downloading and release the extractor and databases.
+
+        Unfinished jobs and batches resume on the next start.
+        """
+        self.batch.stop()
+        self.downloads.shutdown()
+        self.extractor.close()
+        self.cache.close()
+        self.library.close()
+        self.lock.close()
+
+    def _index_download(self, event, job):
+        # Runs on a download worker
+        if event == "finished":
+            info = None
+            if job.video_id:
+                # Music player downloads may only have the audio lookup cached
+                info = self.info_cache.get(job.video_id, need_urls=False) or self.audio.get(job.video_id)
+            self.library.add_download(job, info)
+
+    def search(self, query, start=0, count=SEARCH_PAGE, cancel=None, show=None):
+        """Library, cached and online results for query.
+
+        show(results, replace) is called as results become available: local
+        hits first, then a guess filtered from a cached shorter query, then
+        each online result as yt-dlp prints it (the first one replacing the
+        guess). Returns local hits followed by the online page.
+        """
+        show = show or (lambda results, replace=False: None)
+        local = self.library.search(query, count) if start == 0 else []
+        if local:
+            show(local)
+        have = {v["id"] for v in local if v.get("id")}
+
+        key = query if start == 0 else f"{query}#{start}"
+        videos = self.cache.get("search", key)
+        if videos is not None:
+            show([v for v in videos if v.get("id") not in have])
+            return local + [v for v in videos if v.get("id") not in have]
+
+        # Until yt-dlp answers, narrow down what a shorter query found
+        hit = self.cache.get_prefix("search", key) if start == 0 else None
+        guesses = [v for v in filter_results(hit[1], query) if v.get("id") not in have] if hit else []
+        if guesses:
+            show(guesses)
+
+        videos = []
+        for video in self.extractor.iter_search(query, start, count, cancel):
+            videos.append(video)
+            if video.get("id") in have:
+                continue
+            if guesses:
+                show(local + [video], replace=True)
+                guesses = None
+            else:
+                show([video])
+        cancelled = cancel is not None and cancel.cancelled
+        if guesses and not cancelled:
+            # Nothing new came back, drop the guesses
+            show(local, replace=True)
+        if not cancelled:
+            self.cache.put("search", key, videos)
+        return local + [v for v in videos if v.get("id") not in have]
+
+    def info(self, url, video_id=None):
+        """yt-dlp info for url, from the cache when possible"""
+        return self.info_cache.fetch(url, video_id)
+
+    def formats(self, url, video_id=None):
+        return FormatTable(self.info(url, video_id).get("formats") or [])
+
+    def resolve(self, url, format_spec, video_id=None):
+        """Stream URLs for format_spec, with fresh signatures"""
+        return self.info_cache.resolve(url, format_spec, video_id)
+
+    def download(self, url, output=None, format_spec=None, args=("--no-playlist",), title="",
+                 video_id=None, direct=False):
+        """Queue a download; output defaults to the title and id in data_dir"""
+        output = output or os.path.join(self.data_dir, OUTPUT_TEMPLATE)
+        return self.downloads.add(url, output, format_spec, args, title, video_id=video_id, direct=direct)
+
+    def add_batch(self, sources):
+        self.batch.add(sources)
+        return self.batch.counts()
+
+
+def _print_json(data):
+    json.dump(data, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+
+
+def _wait_for(engine, jobs):
+    """Block until jobs (and any batch) are done, printing a line per change"""
+    events = {}
+
+    def report(event, job):
+        if event in ("started", "finished", "failed", "cancelled") or (
+                event == "progress" and time.monotonic() - events.get(job.id, 0) >= 1):
+            events[job.id] = time.monotonic()
+            pct = f" {job.percent:5.1f}%" if event == "progress" else ""
+            print(f"[{event}]{pct} {job.title or job.url}", file=sys.stderr, flush=True)
+
+    engine.downloads.subscribe(report)
+    while True:
+        busy = [j for j in jobs if j.status in ("queued", "running")]
+        counts = engine.batch.counts()
+        if not busy and not engine.batch.expanding and not counts.get("pending") and not counts.get("queued"):
+            return all(j.status == "finished" for j in jobs) and not counts.get("failed")
+        time.sleep(0.2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ytplayer",
+                                     description="Search, inspect and download without the GUI")
+    parser.add_argument("--dir", default=DEFAULT_DIR, help="data and download directory")
+    parser.add_argument("--remote", metavar="URL", help="talk to a running daemon instead")
+    parser.add_argument("--token", help="daemon token (default: the one the daemon wrote to --dir)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser("search", help="search and print results as JSON")
+    search.add_argument("query")
+    search.add_argument("--start", type=int, default=0)
+    search.add_argument("--count", type=int, default=SEARCH_PAGE)
+
+    info = commands.add_parser("info", help="print the format table of a video")
+    info.add_argument("url")
+    info.add_argument("--json", action="store_true", help="print the whole info dict")
+
+    download = commands.add_parser("download", help="download videos and wait for them")
+    download.add_argument("urls", nargs="+")
+    download.add_argument("-f", "--format", dest="format_spec")
+    download.add_argument("-o", "--output")
+
+    batch = commands.add_parser("batch", help="download playlists, channels or files of URLs")
+    batch.add_argument("sources", nargs="+", help="playlist or channel URLs, or files with one URL per line")
+    batch.add_argument("-f", "--format", dest="format_spec")
+
+    serve = commands.add_parser("serve", help="run the JSON-over-HTTP daemon")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+
+    args = parser.parse_args(argv)
+    if args.command == "batch":
+        # Read files here so the daemon only ever sees URLs
+        args.sources = [url for source in args.sources
+                        for url in read_sources(FILE_PREFIX + source if os.path.isfile(source) else source)]
+
+    if args.remote:
+        from .daemon import EngineClient, read_token
+        token = args.token or read_token(args.dir)
+        if not token:
+            parser.error(f"no daemon token in {args.dir}, pass --token")
+        client = EngineClient(args.remote, token)
+        if args.command == "search":
+            _print_json(client.search(args.query, args.start, args.count))
+        elif args.command == "info":
+            _print_json(client.info(args.url))
+        elif args.command == "download":
+            _print_json([client.download(url, args.output, args.format_spec) for url in args.urls])
+        elif args.command == "batch":
+            _print_json(client.add_batch(args.sources))
+        else:
+            parser.error("serve cannot be combined with --remote")
+        return 0
+
+    try:
+        engine = Engine(args.dir, batch_format=getattr(args, "format_spec", None))
+    except DirLocked as e:
+        parser.exit(1, f"{e}; close it, pick another --dir, or use --remote with a running daemon\n")
+    if args.command == "search":
+        _print_json(engine.search(args.query, args.start, args.count))
+        return 0
+    if args.command == "info":
+        if args.json:
+            _print_json(engine.info(args.url))
+            return 0
+        table = engine.formats(args.url)
+        for i in table.order:
+            fmt = table.formats[i]
+            size = f"{table.filesize[i] / 1e6:8.1f} MB" if table.filesize[i] else " " * 11
+            print(f"{fmt.get('format_id', ''):>8} {table.ext[i]:<5} {table.height[i] or '':>5} "
+                  f"{table.tbr[i]:8.0f} kbps {size}  {table.vcodec[i]} / {table.acodec[i]}")
+        return 0
+    if args.command == "serve":
+        from .daemon import serve
+        engine.start()
+        serve(engine, args.host, args.port)
+        return 0
+
+    engine.start()
+    try:
+        if args.command == "download":
+            jobs = [engine.download(url, args.output, args.format_spec) for url in args.urls]
+        else:
+            engine.add_batch(args.sources)
+            jobs = []
+        ok = _wait_for(engine, jobs)
+    except KeyboardInterrupt:
+        print("Interrupted, unfinished downloads resume next time", file=sys.stderr)
+        ok = False
+    finally:
+        engine.close()
+    if args.command == "batch":
+        print(json.dumps(engine.batch.counts()))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,404 @@
+import asyncio
+import json
+import os
+import subprocess
+import threading
+from urllib.parse import urlparse
+
+try:
+    import yt_dlp
+except ImportError:
+    yt_dlp = None
+
+from .formats import AUDIO_FIELDS, AUDIO_INFO_FIELDS
+
+# Search results fetched per request; "load more" asks for the next page
+SEARCH_PAGE = 20
+
+# yt-dlp searches allowed at once across the app, so that fast typing in
+# live search cannot fork a process (or build a YoutubeDL) per keystroke
+MAX_SEARCHES = 2
+_search_slots = threading.BoundedSemaphore(MAX_SEARCHES)
+
+# Audio lookups skip the webpage, client configs and DASH/HLS manifests (requests
+# that only add robustness or video formats) and print the fields the player
+# needs rather than the whole -J dump with its captions and storyboards
+AUDIO_EXTRACTOR_ARGS = {"youtube": {"skip": ["dash", "hls"], "player_skip": ["webpage", "configs"]}}
+AUDIO_ARGS = ["--no-playlist", "--extractor-args", "youtube:skip=dash,hls;player_skip=webpage,configs",
+              "-O", "%(.{" + ",".join(AUDIO_INFO_FIELDS) + "})j",
+              "-O", "%(formats.:.{" + ",".join(AUDIO_FIELDS) + "})j"]
+
+
+def ytdlp_path():
+    """yt-dlp executable, honouring the bundled copy in frozen builds"""
+    return os.environ.get("YTDLP_FILENAME") or "yt-dlp"
+
+
+def startupinfo():
+    """Hide the console window of child processes on Windows"""
+    if os.name != 'nt':
+        return None
+    si = subprocess.STARTUPINFO()
+    si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return si
+
+
+# Path prefixes of YouTube URLs that list many videos
+LIST_PATHS = ("/playlist", "/channel/", "/c/", "/user/", "/@")
+
+
+def is_listing(entry):
+    """Whether a flat entry is a channel tab or playlist rather than a video"""
+    if entry.get("_type") not in ("url", "url_transparent", "playlist"):
+        return False
+    ie_key = entry.get("ie_key") or ""
+    if ie_key:
+        return ie_key.endswith(("Tab", "Playlist"))
+    return urlparse(entry.get("url") or "").path.startswith(LIST_PATHS)
+
+
+def normalize_entry(entry):
+    """Fill the fields the apps rely on for flat search entries"""
+    if not entry.get("webpage_url"):
+        url = entry.get("url", "")
+        if url.startswith("http"):
+            entry["webpage_url"] = url
+        elif entry.get("id"):
+            entry["webpage_url"] = f"https://www.youtube.com/watch?v={entry['id']}"
+    if not entry.get("thumbnail") and entry.get("thumbnails"):
+        entry["thumbnail"] = entry["thumbnails"][-1].get("url", "")
+    return entry
+
+
+class CancelToken:
+    """Handed to a long-running call so a newer request can abort it"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self):
+        with self.lock:
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        """Run callback when cancelled, right away if that already happened"""
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback()
+
+
+class SubprocessExtractor:
+    """Extraction backend that forks a fresh yt-dlp process per call"""
+
+    name = "subprocess"
+
+    def __init__(self, cmd=None):
+        self.cmd = list(cmd or [ytdlp_path()])
+
+    def _run(self, args):
+        result = subprocess.run(self.cmd + args, capture_output=True, text=True,
+                                check=True, startupinfo=startupinfo())
+        return result.stdout
+
+    def search(self, query, count=SEARCH_PAGE):
+        return list(self.iter_search(query, 0, count))
+
+    def iter_search(self, query, start=0, count=SEARCH_PAGE, cancel=None):
+        """Yield results start..start+count-1 as yt-dlp prints them.
+
+        Waits for one of MAX_SEARCHES slots first. Cancelling the token kills
+        the process (or gives up waiting); the generator then just ends.
+        """
+        while not _search_slots.acquire(timeout=0.05):
+            if cancel and cancel.cancelled:
+                return
+        try:
+            yield from self._iter_search(query, start, count, cancel)
+        finally:
+            _search_slots.release()
+
+    def _iter_search(self, query, start, count, cancel):
+        if cancel and cancel.cancelled:
+            return
+        cmd = self.cmd + ["--flat-playlist", "--quiet", "--dump-json",
+                          "--playlist-items", f"{start + 1}:{start + count}",
+                          f"ytsearch{start + count}:{query}"]
+        yield from self._iter_json(cmd, cancel)
+
+    def iter_playlist(self, url, cancel=None):
+        """Yield the flat video entries of a playlist or channel as yt-dlp lists them.
+
+        Channel tabs and playlists found in the listing are listed in turn.
+        """
+        pending, seen = [url], {url}
+        while pending:
+            cmd = self.cmd + ["--flat-playlist", "--quiet", "--dump-json", "--", pending.pop(0)]
+            for entry in self._iter_json(cmd, cancel):
+                if not is_listing(entry):
+                    yield entry
+                elif entry.get("url") and entry["url"] not in seen:
+                    seen.add(entry["url"])
+                    pending.append(entry["url"])
+
+    def _iter_json(self, cmd, cancel):
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                   bufsize=1, startupinfo=startupinfo())
+        if cancel:
+            cancel.on_cancel(process.kill)
+        try:
+            for line in process.stdout:
+                if cancel and cancel.cancelled:
+                    return
+                if line.strip():
+                    yield normalize_entry(json.loads(line))
+            error = process.stderr.read()
+            process.wait()
+            if process.returncode and not (cancel and cancel.cancelled):
+                raise subprocess.CalledProcessError(process.returncode, cmd, stderr=error)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+    def info(self, url):
+        return json.loads(self._run(["-J", "--", url]))
+
+    async def ainfo(self, url):
+        """info() for an asyncio loop; cancelling the awaiting task kills yt-dlp"""
+        return json.loads(await self._arun(["-J", "--", url]))
+
+    def audio_info(self, url):
+        """info() cut down to what audio playback needs, see AUDIO_ARGS"""
+        return self._audio_result(self._run(AUDIO_ARGS + ["--", url]))
+
+    async def aaudio_info(self, url):
+        return self._audio_result(await self._arun(AUDIO_ARGS + ["--", url]))
+
+    @staticmethod
+    def _audio_result(out):
+        lines = [line for line in out.splitlines() if line.strip()]
+        info = json.loads(lines[0])
+        info["formats"] = (json.loads(lines[1]) if len(lines) > 1 else None) or []
+        return info
+
+    async def _arun(self, args):
+        cmd = self.cmd + args
+        process = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE,
+                                                       startupinfo=startupinfo())
+        try:
+            out, error = await process.communicate()
+        except asyncio.CancelledError:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, cmd,
+                                                stderr=error.decode(errors="replace"))
+        return out.decode(errors="replace")
+
+    def resolve(self, url, format_spec):
+        out = self._run(["-f", format_spec, "-g", "--", url])
+        return [line for line in out.splitlines() if line.strip()]
+
+    def close(self):
+        pass
+
+
+class YoutubeDLExtractor:
+    """Extraction backend that keeps one long-lived yt_dlp.YoutubeDL instance"""
+
+    name = "inprocess"
+
+    def __init__(self, factory=None, params=None):
+        if factory is None:
+            if yt_dlp is None:
+                raise RuntimeError("yt_dlp module is not installed")
+            factory = yt_dlp.YoutubeDL
+
+        self.params = {
+            "quiet": True,
+            "no_warnings": True,
+            "skip_download": True,
+            "extract_flat": "in_playlist",
+        }
+        self.params.update(params or {})
+        self.factory = factory
+        self.ydl = factory(self.params)
+        # YoutubeDL keeps per-call state, so calls are serialized
+        self.lock = threading.Lock()
+        # Searches and listings page through results for as long as their
+        # consumer keeps reading, so they get instances of their own
+        self.listers = []
+        self.listers_lock = threading.Lock()
+
+    def search(self, query, count=SEARCH_PAGE):
+        return list(self.iter_search(query, 0, count))
+
+    def _take_lister(self):
+        with self.listers_lock:
+            if self.listers:
+                return self.listers.pop()
+        return self.factory(self.params)
+
+    def _return_lister(self, ydl):
+        with self.listers_lock:
+            self.listers.append(ydl)
+
+    def iter_search(self, query, start=0, count=SEARCH_PAGE, cancel=None):
+        """Yield results start..start+count-1 as yt-dlp pages through them.
+
+        Waits for one of MAX_SEARCHES slots first, and gives up waiting if
+        the token is cancelled.
+        """
+        while not _search_slots.acquire(timeout=0.05):
+            if cancel and cancel.cancelled:
+                return
+        ydl = self._take_lister()
+        try:
+            # Unprocessed, the entries are a lazy generator over result pages
+            result = ydl.extract_info(f"ytsearch{start + count}:{query}", download=False, process=False)
+            for i, entry in enumerate((result or {}).get("entries") or []):
+                if cancel and cancel.cancelled:
+                    return
+                if i >= start and entry:
+                    yield normalize_entry(dict(entry))
+        finally:
+            self._return_lister(ydl)
+            _search_slots.release()
+
+    def iter_playlist(self, url, cancel=None):
+        """Yield the flat entries of a playlist or channel, page by page"""
+        ydl = self._take_lister()
+        try:
+            yield from self._iter_playlist(ydl, url, cancel)
+        finally:
+            self._return_lister(ydl)
+
+    def _iter_playlist(self, ydl, url, cancel):
+        result = ydl.extract_info(url, download=False, process=False) or {}
+        if "entries" not in result:
+            # A single video stands for itself
+            yield normalize_entry(dict(ydl.sanitize_info(result)))
+            return
+        # Channels nest one playlist per tab, or list their tabs as URLs
+        pending, end, seen = [iter(result["entries"] or [])], object(), {url}
+        while pending:
+            entry = next(pending[-1], end)
+            if entry is end:
+                pending.pop()
+            elif cancel and cancel.cancelled:
+                return
+            elif not entry:
+                continue
+            elif entry.get("_type") == "playlist":
+                pending.append(iter(entry.get("entries") or []))
+            elif is_listing(entry):
+                if entry.get("url") and entry["url"] not in seen:
+                    seen.add(entry["url"])
+                    listing = ydl.extract_info(entry["url"], download=False, process=False) or {}
+                    pending.append(iter(listing.get("entries") or []))
+            else:
+                yield normalize_entry(dict(entry))
+
+    def info(self, url):
+        with self.lock:
+            return self._info(url)
+
+    def _info(self, url):
+        return self.ydl.sanitize_info(self.ydl.extract_info(url, download=False))
+
+    async def ainfo(self, url):
+        """info() for an asyncio loop, run on its executor, see _arun()"""
+        return await self._arun(self._info, url)
+
+    def audio_info(self, url):
+        """Unprocessed info extracted with AUDIO_EXTRACTOR_ARGS"""
+        with self.lock:
+            return self._audio_info(url)
+
+    def _audio_info(self, url):
+        params = self.ydl.params
+        saved = params.get("extractor_args")
+        merged = dict(saved or {})
+        for key, args in AUDIO_EXTRACTOR_ARGS.items():
+            merged[key] = dict(merged.get(key) or {}, **args)
+        params["extractor_args"] = merged
+        try:
+            return self.ydl.sanitize_info(self.ydl.extract_info(url, download=False, process=False))
+        finally:
+            if saved is None:
+                params.pop("extractor_args", None)
+            else:
+                params["extractor_args"] = saved
+
+    async def aaudio_info(self, url):
+        return await self._arun(self._audio_info, url)
+
+    async def _arun(self, fn, url):
+        """Await fn(url) under the lock on the loop's executor.
+
+        A running extraction cannot be interrupted; cancelling only stops
+        the caller from waiting for it. A call cancelled before it gets the
+        lock never starts one, so superseded requests do not queue up
+        extractions behind the running one.
+        """
+        token = CancelToken()
+
+        def call():
+            if token.cancelled:
+                return None
+            with self.lock:
+                if token.cancelled:
+                    return None
+                return fn(url)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, call)
+        except asyncio.CancelledError:
+            token.cancel()
+            raise
+
+    def resolve(self, url, format_spec):
+        with self.lock:
+            data = self.ydl.extract_info(url, download=False)
+            selector = self.ydl.build_format_selector(format_spec)
+            selected = self.ydl._select_formats(data.get("formats") or [data], selector)
+
+        if not selected:
+            raise RuntimeError(f"Requested format is not available: {format_spec}")
+        fmt = selected[0]
+        return [f["url"] for f in fmt.get("requested_formats") or [fmt]]
+
+    def close(self):
+        with self.listers_lock:
+            listers, self.listers = self.listers, []
+        for ydl in listers:
+            ydl.close()
+        with self.lock:
+            self.ydl.close()
+
+
+def get_extractor(backend=None):
+    """Create the preferred extraction backend, falling back to the yt-dlp CLI"""
+    backend = backend or os.environ.get("YTPLAYER_EXTRACTOR", "auto")
+    if backend in ("auto", "inprocess") and yt_dlp is not None:
+        try:
+            return YoutubeDLExtractor()
+        except Exception as e:
+            print(f"In-process yt-dlp unavailable, using subprocess: {e}")
+    return SubprocessExtractor()
@@ -0,0 +1,206 @@
+import bisect
+import re
+from urllib.parse import urlparse, parse_qs
+
+# Filter syntax used inside format selectors, e.g. [height<=720] or [ext=m4a]
+_FILTER_RE = re.compile(r"\[\s*(\w+)\s*(<=|>=|!=|\^=|\$=|\*=|<|>|=)(\?)?\s*([^\]]+?)\s*\]")
+_SELECTOR_RE = re.compile(r"^([\w*.-]+)((?:\[[^\]]*\])*)$")
+
+_OPS = {
+    "<=": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "^=": lambda a, b: str(a).startswith(b),
+    "$=": lambda a, b: str(a).endswith(b),
+    "*=": lambda a, b: b in str(a),
+}
+_STRING_OPS = ("^=", "$=", "*=")
+
+
+def has_video(fmt):
+    # Like yt-dlp, only an explicit "none" rules a stream out; a missing codec is unknown
+    return fmt.get("vcodec") != "none"
+
+
+def has_audio(fmt):
+    return fmt.get("acodec") != "none"
+
+
+def url_expiry(url):
+    """Expiry timestamp embedded in a signed stream URL, if any"""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    expire = parse_qs(parsed.query).get("expire")
+    if expire and expire[0].isdigit():
+        return int(expire[0])
+    # Manifest URLs carry it as a path segment instead: .../expire/1700000000/...
+    match = re.search(r"/expire/(\d+)", parsed.path)
+    return int(match.group(1)) if match else None
+
+
+def _matches_base(fmt, base):
+    if base in ("best", "b", "worst", "w"):
+        return has_video(fmt) and has_audio(fmt)
+    if base in ("bestvideo", "bv", "worstvideo", "wv"):
+        return has_video(fmt) and not has_audio(fmt)
+    if base in ("bestaudio", "ba", "worstaudio", "wa"):
+        return has_audio(fmt) and not has_video(fmt)
+    if base in ("bv*", "bestvideo*", "wv*", "worstvideo*"):
+        return has_video(fmt)
+    if base in ("ba*", "bestaudio*", "wa*", "worstaudio*"):
+        return has_audio(fmt)
+    if base in ("b*", "best*", "w*", "worst*"):
+        return has_video(fmt) or has_audio(fmt)
+    return fmt.get("format_id") == base or fmt.get("ext") == base
+
+
+def _matches_filter(fmt, key, op, optional, value):
+    actual = fmt.get(key)
+    if actual is None:
+        return bool(optional)
+    if isinstance(actual, (int, float)) and op not in _STRING_OPS:
+        try:
+            value = float(value)
+        except ValueError:
+            return False
+    return _OPS[op](actual, value)
+
+
+def _select_single(formats, selector):
+    match = _SELECTOR_RE.match(selector.strip())
+    if not match:
+        raise ValueError(f"Unsupported format selector: {selector}")
+
+    base, brackets = match.groups()
+    filters = []
+    for bracket in re.findall(r"\[[^\]]*\]", brackets):
+        # Anything the filter syntax does not cover must not silently match
+        parsed = _FILTER_RE.fullmatch(bracket)
+        if not parsed:
+            raise ValueError(f"Unsupported format filter: {bracket}")
+        filters.append(parsed.groups())
+    candidates = [
+        f for f in formats
+        if f.get("url") and _matches_base(f, base)
+        and all(_matches_filter(f, *flt) for flt in filters)
+    ]
+    if not candidates:
+        return None
+    # yt-dlp lists formats from worst to best
+    return candidates[0] if base.startswith("w") else candidates[-1]
+
+
+def select_formats(formats, spec):
+    """Evaluate a yt-dlp format spec locally against a format table.
+
+    Supports '/' fallbacks, '+' merges, best/worst/bestvideo/bestaudio (and
+    their short and '*' forms), format ids, extensions and [key op value]
+    filters with comparisons or ^=, $= and *=. Returns the chosen formats, or
+    an empty list if nothing matches; raises ValueError on syntax it does not
+    support.
+    """
+    for alternative in spec.split("/"):
+        chosen = [_select_single(formats, part) for part in alternative.split("+")]
+        if chosen and all(chosen):
+            return chosen
+    return []
+
+
+# Media kinds in FormatTable.kind, ordered the way the apps rank them
+OTHER, AUDIO, VIDEO, AV = 0, 1, 2, 3
+KIND_NAMES = {AV: "Video+Audio", VIDEO: "Video only", AUDIO: "Audio only", OTHER: "Other"}
+
+# Video fields audio lookups keep, enough for the player and the library
+AUDIO_INFO_FIELDS = ("id", "title", "uploader", "duration", "webpage_url")
+
+# Format fields the audio player uses; audio lookups keep only these
+AUDIO_FIELDS = ("format_id", "url", "ext", "protocol", "acodec", "vcodec", "abr", "tbr", "asr",
+                "audio_channels", "height", "filesize", "filesize_approx", "format_note", "language")
+
+_RESOLUTION_RE = re.compile(r"(\d+)x(\d+)")
+
+
+class FormatTable:
+    """A yt-dlp formats list parsed once into columns plus ready-made orderings.
+
+    Every column is a list indexed by row, in the order of the original
+    formats. order holds all rows best first (combined before video-only
+    before audio-only, then by height, bitrate and size); audio_order ranks
+    the rows that carry audio by audio bitrate. by_height maps VIDEO and AV
+    to their rows ascending by (height, bitrate) alongside those heights, so
+    best_under() is a bisect rather than a scan.
+    """
+
+    def __init__(self, formats):
+        self.formats = list(formats)
+        self.height, self.tbr, self.abr, self.filesize, self.kind = [], [], [], [], []
+        self.vcodec, self.acodec, self.ext = [], [], []
+
+        for fmt in self.formats:
+            # Shown the way yt-dlp -F shows a codec it was not told
+            vcodec = fmt.get("vcodec") or "unknown"
+            acodec = fmt.get("acodec") or "unknown"
+            height = fmt.get("height")
+            if not height:
+                match = _RESOLUTION_RE.search(fmt.get("resolution") or "")
+                height = int(match.group(2)) if match else 0
+            if has_video(fmt):
+                kind = AV if has_audio(fmt) else VIDEO
+            else:
+                kind = AUDIO if has_audio(fmt) else OTHER
+
+            self.height.append(height)
+            self.tbr.append(fmt.get("tbr") or fmt.get("vbr") or fmt.get("abr") or 0)
+            self.abr.append(fmt.get("abr") or (fmt.get("tbr") if kind == AUDIO else 0) or 0)
+            self.filesize.append(fmt.get("filesize") or fmt.get("filesize_approx") or 0)
+            self.kind.append(kind)
+            self.vcodec.append(vcodec)
+            self.acodec.append(acodec)
+            self.ext.append(fmt.get("ext") or "")
+
+        rows = range(len(self.formats))
+        self.order = sorted(rows, reverse=True,
+                            key=lambda i: (self.kind[i], self.height[i], self.tbr[i], self.filesize[i]))
+        self.audio_order = sorted((i for i in rows if self.kind[i] in (AUDIO, AV)), reverse=True,
+                                  key=lambda i: (self.kind[i] == AUDIO, self.abr[i], self.filesize[i]))
+        self.counts = {kind: self.kind.count(kind) for kind in KIND_NAMES}
+
+        # Per kind: rows ascending by (height, bitrate) and their heights, for bisect
+        self.by_height = {}
+        for kind in (VIDEO, AV):
+            ranked = sorted((i for i in rows if self.kind[i] == kind),
+                            key=lambda i: (self.height[i], self.tbr[i]))
+            self.by_height[kind] = ([self.height[i] for i in ranked], ranked)
+
+    def __len__(self):
+        return len(self.formats)
+
+    def best_audio(self, audio_only=True):
+        """Highest-bitrate audio format, preferring audio-only ones"""
+        for i in self.audio_order:
+            if not audio_only or self.kind[i] == AUDIO:
+                return self.formats[i]
+        return None
+
+    def best_under(self, height, kind=VIDEO):
+        """Best format of kind (VIDEO or AV) no taller than height"""
+        heights, ranked = self.by_height[kind]
+        pos = bisect.bisect_right(heights, height)
+        return self.formats[ranked[pos - 1]] if pos else None
+
+    def merged_spec(self, height):
+        """Format spec for the best video no taller than height plus the best audio.
+
+        The choice is made here and spelled as format ids, with the generic
+        selector behind it for a refreshed format list that lacks those ids.
+        """
+        spec = f"bestvideo[height<={height}]+bestaudio/best[height<={height}]"
+        video, audio = self.best_under(height), self.best_audio()
+        if video and audio:
+            return f"{video['format_id']}+{audio['format_id']}/{spec}"
+        combined = self.best_under(height, AV)
+        return f"{combined['format_id']}/{spec}" if combined else spec
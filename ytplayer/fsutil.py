@@ -0,0 +1,58 @@
+import json
+import os
+
+# Lock file taken in a data dir by the process that owns it
+LOCK_FILE = ".lock"
+
+
+class DirLocked(RuntimeError):
+    """Another process is using the directory"""
+
+
+def lock_dir(path):
+    """Take an exclusive lock on the directory path for as long as the process runs.
+
+    Returns the open lock file; closing it releases the lock. Raises
+    DirLocked if another process holds it.
+    """
+    f = open(os.path.join(path, LOCK_FILE), "a+", encoding="utf-8")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.seek(0)
+        owner = f.read().strip() or "another process"
+        f.close()
+        raise DirLocked(f"{path} is in use by process {owner}") from None
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    return f
+
+
+def atomic_write_json(path, data):
+    """Write JSON so readers see either the old or the new file, never half of one"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def write_at(fd, data, offset):
+    """Write all of data at offset; fds without pwrite (Windows) must not be shared"""
+    view = memoryview(data)
+    while view:
+        if hasattr(os, "pwrite"):
+            written = os.pwrite(fd, view, offset)
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            written = os.write(fd, view)
+        view, offset = view[written:], offset + written
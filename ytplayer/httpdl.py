@@ -0,0 +1,197 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .fsutil import atomic_write_json, write_at
+
+
+class Interrupted(Exception):
+    """Raised when a transfer is stopped before it completes"""
+
+
+class NoRangeSupport(Exception):
+    """Raised when the server answers a range request with the whole file"""
+
+
+def _content_range_size(value):
+    """Full size from a Content-Range header such as 'bytes */1234'"""
+    try:
+        return int((value or "").rsplit("/", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def _written_prefix(part, journal):
+    """Bytes at the start of part known to hold data, dropping the rest"""
+    if not os.path.exists(part):
+        return 0
+    if not os.path.exists(journal):
+        return os.path.getsize(part)
+    # download_chunked preallocated part; only its first range is contiguous from 0
+    try:
+        with open(journal, encoding="utf-8") as f:
+            first = json.load(f)["ranges"][0]
+        done = first[2] if first[0] == 0 else 0
+    except (OSError, ValueError, KeyError, IndexError):
+        done = 0
+    os.truncate(part, done)
+    os.remove(journal)
+    return done
+
+
+def download(url, path, session=None, progress=None, stop=None, headers=None,
+             chunk_size=256 * 1024, timeout=30):
+    """Download url to path, resuming from path + '.part' with a Range request.
+
+    progress(done, total) is called as bytes arrive and stop() is polled
+    between chunks. The part file stays behind when interrupted so the next
+    call only fetches the remaining bytes. A part left by download_chunked
+    is resumed from the end of its first range.
+    """
+    session = session or requests.Session()
+    part = f"{path}.part"
+    done = _written_prefix(part, f"{part}.json")
+
+    request_headers = dict(headers or {})
+    if done:
+        request_headers["Range"] = f"bytes={done}-"
+
+    with session.get(url, headers=request_headers, stream=True, timeout=timeout) as response:
+        if done and response.status_code == 416:
+            if _content_range_size(response.headers.get("Content-Range")) == done:
+                # Part file already holds the whole file
+                os.replace(part, path)
+                return path
+            # The part does not match the file on the server, start over
+            os.remove(part)
+            return download(url, path, session, progress, stop, headers, chunk_size, timeout)
+        response.raise_for_status()
+        if response.status_code != 206:
+            # Server ignored the Range header, start over
+            done = 0
+
+        length = int(response.headers.get("Content-Length") or 0)
+        total = done + length if length else None
+
+        with open(part, "ab" if done else "wb") as f:
+            for chunk in response.iter_content(chunk_size):
+                if stop and stop():
+                    raise Interrupted(f"Stopped after {done} bytes")
+                f.write(chunk)
+                done += len(chunk)
+                if progress:
+                    progress(done, total)
+
+    if total and done < total:
+        raise Interrupted(f"Connection closed after {done} of {total} bytes")
+    os.replace(part, path)
+    return path
+
+
+def download_chunked(url, path, size, chunks=4, session=None, progress=None, stop=None,
+                     headers=None, retries=3, chunk_size=256 * 1024, timeout=30):
+    """Download a file of known size as concurrent byte ranges.
+
+    Ranges are written in place into a preallocated path + '.part'. Their
+    progress is journaled to path + '.part.json' so an interrupted download
+    resumes every range where it stopped. A failed range is retried on its
+    own. Raises NoRangeSupport if the server ignores Range requests. Files
+    smaller than chunks bytes come down as one range, and a size of 0 (so
+    nothing known to split) as a plain download().
+    """
+    if size <= 0:
+        return download(url, path, session, progress, stop, headers, chunk_size, timeout)
+    session = session or requests.Session()
+    part, journal = f"{path}.part", f"{path}.part.json"
+
+    ranges = None
+    if os.path.exists(part):
+        try:
+            with open(journal, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("size") == size:
+                ranges = saved["ranges"]
+        except (OSError, ValueError, KeyError):
+            pass
+    if ranges is None:
+        step = -(-size // (chunks if 1 < chunks <= size else 1))
+        ranges = [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)]
+
+    fd = os.open(part, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0))
+    try:
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+    lock = threading.Lock()
+    failed = threading.Event()
+    state = {"done": sum(r[2] for r in ranges), "saved": 0}
+
+    def stopped():
+        return failed.is_set() or (stop is not None and stop())
+
+    def save(force=False):
+        if force or time.time() - state["saved"] >= 1:
+            state["saved"] = time.time()
+            atomic_write_json(journal, {"size": size, "ranges": ranges})
+
+    def fetch(rng):
+        start, end = rng[0], rng[1]
+        # Every range gets its own descriptor so seek-based writes stay safe
+        fd = os.open(part, os.O_RDWR | getattr(os, "O_BINARY", 0))
+        try:
+            for attempt in range(retries + 1):
+                if rng[2] > end - start:
+                    return
+                try:
+                    range_headers = dict(headers or {}, Range=f"bytes={start + rng[2]}-{end}")
+                    with session.get(url, headers=range_headers, stream=True, timeout=timeout) as response:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            raise NoRangeSupport(f"Server returned {response.status_code} for a range request")
+                        for chunk in response.iter_content(chunk_size):
+                            if stopped():
+                                raise Interrupted("Stopped")
+                            write_at(fd, chunk, start + rng[2])
+                            with lock:
+                                rng[2] += len(chunk)
+                                state["done"] += len(chunk)
+                                save()
+                            if progress:
+                                progress(state["done"], size)
+                    if rng[2] <= end - start:
+                        raise Interrupted(f"Range {start}-{end} closed early")
+                except (requests.RequestException, Interrupted):
+                    if stopped() or attempt == retries:
+                        raise
+                    # Back off a little before retrying just this range
+                    time.sleep(0.5 * (attempt + 1))
+        except Exception:
+            # One range giving up fails the whole download
+            failed.set()
+            raise
+        finally:
+            os.close(fd)
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="range") as pool:
+            for future in [pool.submit(fetch, rng) for rng in ranges]:
+                future.result()
+    except NoRangeSupport:
+        # Nothing in the part file can be trusted for a plain download
+        os.remove(part)
+        if os.path.exists(journal):
+            os.remove(journal)
+        raise
+    except BaseException:
+        with lock:
+            save(force=True)
+        raise
+
+    os.replace(part, path)
+    os.remove(journal)
+    return path
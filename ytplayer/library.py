@@ -0,0 +1,174 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# File types worth indexing; partial downloads and sidecar files are skipped
+MEDIA_EXTS = {".mp3", ".m4a", ".aac", ".opus", ".ogg", ".oga", ".flac", ".wav", ".webm",
+              ".mp4", ".mkv", ".mov", ".avi", ".flv", ".ts"}
+
+# Directories the apps keep their own scratch files in
+SKIP_DIRS = {"temp", "thumbnails"}
+
+
+def _fts_query(text):
+    """Prefix-match every word of text, e.g. 'dua lip' -> '"dua"* "lip"*'"""
+    words = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{w}"*' for w in words)
+
+
+class Library:
+    """SQLite index of downloaded media with full-text search over titles.
+
+    Downloads are recorded with their metadata as they finish; rescan()
+    picks up anything else in the download directories, re-reading only
+    files whose mtime changed. search() runs against FTS5 when SQLite has
+    it and falls back to LIKE otherwise.
+    """
+
+    def __init__(self, path, dirs=()):
+        self.path = path
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS tracks (
+            path TEXT PRIMARY KEY, video_id TEXT, title TEXT NOT NULL, uploader TEXT,
+            duration REAL, format TEXT, size INTEGER, mtime REAL, added REAL)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS tracks_video_id ON tracks (video_id)")
+
+        try:
+            self.db.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+                title, uploader, content='tracks', content_rowid='rowid')""")
+            # Keep the external-content index in step with the table
+            self.db.executescript("""
+                CREATE TRIGGER IF NOT EXISTS tracks_ai AFTER INSERT ON tracks BEGIN
+                    INSERT INTO tracks_fts (rowid, title, uploader) VALUES (new.rowid, new.title, new.uploader);
+                END;
+                CREATE TRIGGER IF NOT EXISTS tracks_ad AFTER DELETE ON tracks BEGIN
+                    INSERT INTO tracks_fts (tracks_fts, rowid, title, uploader)
+                    VALUES ('delete', old.rowid, old.title, old.uploader);
+                END;
+                CREATE TRIGGER IF NOT EXISTS tracks_au AFTER UPDATE ON tracks BEGIN
+                    INSERT INTO tracks_fts (tracks_fts, rowid, title, uploader)
+                    VALUES ('delete', old.rowid, old.title, old.uploader);
+                    INSERT INTO tracks_fts (rowid, title, uploader) VALUES (new.rowid, new.title, new.uploader);
+                END;""")
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5
+            self.fts = False
+        self.db.commit()
+
+    def add(self, path, video_id=None, title=None, uploader=None, duration=None, fmt=None):
+        """Record a finished download, replacing whatever was known about path"""
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        title = title or os.path.splitext(os.path.basename(path))[0]
+        with self.lock:
+            self.db.execute("""INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET video_id = excluded.video_id, title = excluded.title,
+                    uploader = excluded.uploader, duration = excluded.duration, format = excluded.format,
+                    size = excluded.size, mtime = excluded.mtime""",
+                            (path, video_id, title, uploader, duration, fmt, st.st_size, st.st_mtime,
+                             time.time()))
+            self.db.commit()
+
+    def add_download(self, job, info=None):
+        """Record a finished DownloadJob, with metadata from its cached info if any"""
+        path = job.result_path or job.output
+        if "%(" in path:
+            # yt-dlp never reported the final name; rescan() will find it
+            return
+        info = info or {}
+        self.add(path, job.video_id or info.get("id"), info.get("title") or job.title,
+                 info.get("uploader"), info.get("duration"), job.format_spec)
+
+    def rescan(self):
+        """Index new or modified media files in the library dirs and drop deleted ones.
+
+        Returns (added_or_updated, removed).
+        """
+        with self.lock:
+            known = dict(self.db.execute("SELECT path, mtime FROM tracks"))
+
+        seen, changed = set(), []
+        for root in self.dirs:
+            stack = [root]
+            while stack:
+                try:
+                    entries = list(os.scandir(stack.pop()))
+                except OSError:
+                    continue
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS and not entry.name.startswith("."):
+                            stack.append(entry.path)
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() not in MEDIA_EXTS:
+                        continue
+                    path = os.path.abspath(entry.path)
+                    seen.add(path)
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    if known.get(path) != st.st_mtime:
+                        changed.append((path, os.path.splitext(entry.name)[0], st.st_size, st.st_mtime))
+
+        roots = tuple(os.path.join(d, "") for d in self.dirs)
+        removed = [p for p in known if p not in seen and p.startswith(roots)]
+
+        with self.lock:
+            # Files we already know keep their metadata, only size and mtime move
+            self.db.executemany("""INSERT INTO tracks (path, title, size, mtime, added) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime""",
+                                [(p, title, size, mtime, time.time()) for p, title, size, mtime in changed])
+            self.db.executemany("DELETE FROM tracks WHERE path = ?", [(p,) for p in removed])
+            self.db.commit()
+        return len(changed), len(removed)
+
+    def search(self, query, limit=50):
+        """Best matching local tracks as search-result style dicts"""
+        columns = "t.path, t.video_id, t.title, t.uploader, t.duration, t.format"
+        with self.lock:
+            if self.fts:
+                match = _fts_query(query)
+                if not match:
+                    return []
+                rows = self.db.execute(f"""SELECT {columns} FROM tracks_fts
+                    JOIN tracks t ON t.rowid = tracks_fts.rowid
+                    WHERE tracks_fts MATCH ? ORDER BY rank LIMIT ?""", (match, limit)).fetchall()
+            else:
+                like = f"%{query.strip()}%"
+                rows = self.db.execute(f"""SELECT {columns} FROM tracks t
+                    WHERE t.title LIKE ? OR t.uploader LIKE ? LIMIT ?""", (like, like, limit)).fetchall()
+
+        tracks = []
+        for path, video_id, title, uploader, duration, fmt in rows:
+            tracks.append({
+                "id": video_id,
+                "title": title,
+                "uploader": uploader,
+                "duration": duration,
+                "format": fmt,
+                "path": path,
+                "webpage_url": f"https://www.youtube.com/watch?v={video_id}" if video_id else "",
+                "local": True,
+            })
+        return tracks
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,262 @@
+import math
+import tkinter as tk
+from tkinter import font as tkfont
+
+
+class RowModel:
+    """Row texts shown by a VirtualList, kept apart from the widget.
+
+    Every change is reported to observers as (start, removed, added) so a
+    view knows exactly which rows moved. set() diffs the new rows against
+    the current ones and only reports the part in between the common head
+    and tail.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.observers = []
+
+    def subscribe(self, callback):
+        self.observers.append(callback)
+
+    def _changed(self, start, removed, added):
+        if removed or added:
+            for callback in self.observers:
+                callback(start, removed, added)
+
+    def insert(self, index, rows):
+        rows = list(rows)
+        self.rows[index:index] = rows
+        self._changed(index, 0, len(rows))
+
+    def append(self, row):
+        self.insert(len(self.rows), [row])
+
+    def delete(self, start, end):
+        end = min(end, len(self.rows))
+        if start < end:
+            del self.rows[start:end]
+            self._changed(start, end - start, 0)
+
+    def replace(self, index, row):
+        if self.rows[index] != row:
+            self.rows[index] = row
+            self._changed(index, 1, 1)
+
+    def set(self, rows):
+        """Replace all rows, reporting only the span that differs"""
+        rows = list(rows)
+        old = self.rows
+        head = 0
+        limit = min(len(old), len(rows))
+        while head < limit and old[head] == rows[head]:
+            head += 1
+        tail = 0
+        while tail < limit - head and old[-1 - tail] == rows[-1 - tail]:
+            tail += 1
+        removed, added = len(old) - head - tail, len(rows) - head - tail
+        self.rows = rows
+        self._changed(head, removed, added)
+
+    def clear(self):
+        self.delete(0, len(self.rows))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+
+class VirtualList(tk.Canvas):
+    """Listbox stand-in that only has canvas items for the rows in view.
+
+    Speaks the part of the Listbox API the apps use (insert, delete, get,
+    size, curselection, selection_set/clear, see, nearest, yview,
+    yscrollcommand and <<ListboxSelect>>) on top of a RowModel. Changes to
+    the model schedule a single redraw at idle time, whose cost depends on
+    the window height, not on how many rows there are.
+
+    <<ListboxHover>> fires once the pointer has rested on a row for
+    hover_delay ms; the row is in hovered.
+    """
+
+    def __init__(self, parent, model=None, height=10, font=None, selectbackground="#0078d7",
+                 selectforeground="white", yscrollcommand=None, hover_delay=150, **kw):
+        self.font = tkfont.Font(root=parent, font=font) if font else tkfont.nametofont("TkDefaultFont")
+        self.row_height = self.font.metrics("linespace") + 4
+        kw.setdefault("background", "white")
+        kw.setdefault("highlightthickness", 0)
+        super().__init__(parent, height=height * self.row_height, **kw)
+
+        self.model = model or RowModel()
+        self.model.subscribe(self._on_model_change)
+        self.selectbackground = selectbackground
+        self.selectforeground = selectforeground
+        self.scrollcommand = yscrollcommand
+        self.top = 0
+        self.selected = None
+        self.items = []
+        self.redraw_pending = False
+        self.hover_delay = hover_delay
+        self.hovered = None
+        self.hover_timer = None
+
+        self.bind("<Configure>", lambda e: self._schedule_redraw())
+        self.bind("<Button-1>", self._on_click)
+        self.bind("<MouseWheel>", lambda e: self.yview("scroll", -3 if e.delta > 0 else 3, "units"))
+        self.bind("<Button-4>", lambda e: self.yview("scroll", -3, "units"))
+        self.bind("<Button-5>", lambda e: self.yview("scroll", 3, "units"))
+        self.bind("<Up>", lambda e: self._move_selection(-1))
+        self.bind("<Down>", lambda e: self._move_selection(1))
+        self.bind("<Motion>", self._on_motion)
+        self.bind("<Leave>", lambda e: self._hover(None))
+
+    def configure(self, cnf=None, **kw):
+        if "yscrollcommand" in kw:
+            self.scrollcommand = kw.pop("yscrollcommand")
+            self._schedule_redraw()
+        return super().configure(cnf, **kw)
+
+    config = configure
+
+    # Drawing
+
+    def _visible_rows(self):
+        return max(1, math.ceil((self.winfo_height() or 1) / self.row_height))
+
+    def _schedule_redraw(self):
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            self.after_idle(self._redraw)
+
+    def _redraw(self):
+        self.redraw_pending = False
+        visible = self._visible_rows()
+        self.top = max(0, min(self.top, len(self.model) - visible))
+        count = min(visible, len(self.model) - self.top)
+        width = self.winfo_width()
+
+        # Row items are pooled and re-pointed at whichever rows are in view
+        while len(self.items) < count:
+            self.items.append((self.create_rectangle(0, 0, 0, 0, width=0),
+                               self.create_text(0, 0, anchor="w", font=self.font)))
+        for i, (rect, text) in enumerate(self.items):
+            if i >= count:
+                self.itemconfigure(rect, state="hidden")
+                self.itemconfigure(text, state="hidden")
+                continue
+            row = self.top + i
+            y = i * self.row_height
+            selected = row == self.selected
+            self.coords(rect, 0, y, width, y + self.row_height)
+            self.itemconfigure(rect, state="normal", fill=self.selectbackground if selected else "")
+            self.coords(text, 4, y + self.row_height // 2)
+            self.itemconfigure(text, state="normal", text=self.model[row],
+                               fill=self.selectforeground if selected else "black")
+
+        if self.scrollcommand:
+            self.scrollcommand(*self.yview())
+
+    def _on_model_change(self, start, removed, added):
+        # Keep the selection on the same row as rows shift around it
+        if self.selected is not None:
+            if self.selected >= start + removed:
+                self.selected += added - removed
+            elif self.selected >= start:
+                self.selected = None
+        self._schedule_redraw()
+
+    # Interaction
+
+    def _on_click(self, event):
+        self.focus_set()
+        row = self.top + event.y // self.row_height
+        if row < len(self.model):
+            self.selection_set(row)
+            self.event_generate("<<ListboxSelect>>")
+
+    def _on_motion(self, event):
+        row = self.nearest(event.y)
+        self._hover(row if 0 <= row < len(self.model) else None)
+
+    def _hover(self, row):
+        if row == self.hovered:
+            return
+        self.hovered = row
+        if self.hover_timer:
+            self.after_cancel(self.hover_timer)
+            self.hover_timer = None
+        if row is not None:
+            self.hover_timer = self.after(self.hover_delay, self._hover_rested)
+
+    def _hover_rested(self):
+        self.hover_timer = None
+        if self.hovered is not None and self.hovered < len(self.model):
+            self.event_generate("<<ListboxHover>>")
+
+    def _move_selection(self, step):
+        if not len(self.model):
+            return
+        row = 0 if self.selected is None else max(0, min(len(self.model) - 1, self.selected + step))
+        self.selection_set(row)
+        self.see(row)
+        self.event_generate("<<ListboxSelect>>")
+
+    # Listbox API
+
+    def _index(self, index):
+        return len(self.model) if index in (tk.END, "end") else int(index)
+
+    def insert(self, index, *elements):
+        self.model.insert(self._index(index), elements)
+
+    def delete(self, first, last=None):
+        first = self._index(first)
+        last = first if last is None else min(self._index(last), len(self.model) - 1)
+        self.model.delete(first, last + 1)
+
+    def get(self, index):
+        return self.model[self._index(index)]
+
+    def size(self):
+        return len(self.model)
+
+    def nearest(self, y):
+        return min(self.top + int(y) // self.row_height, len(self.model) - 1)
+
+    def curselection(self):
+        return () if self.selected is None else (self.selected,)
+
+    def selection_set(self, first, last=None):
+        self.selected = self._index(first)
+        self._schedule_redraw()
+
+    def selection_clear(self, first=None, last=None):
+        self.selected = None
+        self._schedule_redraw()
+
+    def see(self, index):
+        index = self._index(index)
+        visible = self._visible_rows()
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + visible:
+            self.top = index - visible + 1
+        self._schedule_redraw()
+
+    def yview(self, *args):
+        total = len(self.model)
+        visible = self._visible_rows()
+        if not args:
+            if not total:
+                return 0.0, 1.0
+            return self.top / total, min(1.0, (self.top + visible) / total)
+
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = int(args[1]) * (visible if args[2] == "pages" else 1)
+            self.top += step
+        self.top = max(0, min(self.top, total - visible))
+        self._schedule_redraw()
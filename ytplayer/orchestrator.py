@@ -0,0 +1,117 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+async def run_blocking(fn, *args, cancel=None):
+    """Await fn(*args) on the loop's worker pool.
+
+    A thread cannot be interrupted, so cancelling the awaiting task cancels
+    the CancelToken passed as cancel instead, for calls that watch one.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, functools.partial(fn, *args))
+    except asyncio.CancelledError:
+        if cancel:
+            cancel.cancel()
+        raise
+
+
+class Orchestrator:
+    """An asyncio event loop on a background thread for the apps' I/O.
+
+    Requests started with latest(key, ...) supersede whatever still runs
+    under the same key: the older task is cancelled, which kills its yt-dlp
+    process, and a result it manages to produce anyway is dropped. Results
+    and errors go through dispatch(fn), e.g. lambda fn: root.after(0, fn),
+    and are checked once more when fn runs so that nothing stale reaches
+    the UI even if it was already queued there.
+    """
+
+    def __init__(self, dispatch=None, workers=8):
+        self.dispatch = dispatch or (lambda fn: fn())
+        self.loop = asyncio.new_event_loop()
+        # Blocking calls (in-process yt-dlp, sqlite, engine searches) share a bounded pool
+        self.loop.set_default_executor(ThreadPoolExecutor(workers, thread_name_prefix="orchestrator"))
+        self.generations = {}
+        self.tasks = {}
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True, name="orchestrator")
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            # Let cancelled tasks kill their processes before the loop goes away
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    def submit(self, coro):
+        """Run coro on the loop; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def current(self, key, generation):
+        return self.generations.get(key) == generation
+
+    def busy(self, keys):
+        """Whether a request is running under any of keys; call on the loop"""
+        return any(key in self.tasks for key in keys)
+
+    def latest(self, key, factory, on_result=None, on_error=None):
+        """Run factory() as the newest request for key, cancelling older ones.
+
+        factory is called on the loop, and not at all when an even newer
+        request for key arrived before it got the chance to start.
+        """
+        with self.lock:
+            generation = self.generations.get(key, 0) + 1
+            self.generations[key] = generation
+        self.loop.call_soon_threadsafe(self._start, key, generation, factory, on_result, on_error)
+        return generation
+
+    def cancel(self, key):
+        """Cancel the request running for key and drop its result"""
+        with self.lock:
+            self.generations[key] = self.generations.get(key, 0) + 1
+        self.loop.call_soon_threadsafe(self._cancel, key)
+
+    def _cancel(self, key):
+        task = self.tasks.pop(key, None)
+        if task:
+            task.cancel()
+
+    def _start(self, key, generation, factory, on_result, on_error):
+        self._cancel(key)
+        if not self.current(key, generation):
+            return
+        task = self.loop.create_task(factory())
+        self.tasks[key] = task
+        task.add_done_callback(functools.partial(self._done, key, generation, on_result, on_error))
+
+    def _done(self, key, generation, on_result, on_error, task):
+        if self.tasks.get(key) is task:
+            del self.tasks[key]
+        if task.cancelled() or not self.current(key, generation):
+            return
+        error = task.exception()
+        if error is not None and on_error is None:
+            print(f"{key} failed: {error}")
+            return
+        callback, value = (on_result, task.result()) if error is None else (on_error, error)
+        if callback is not None:
+            self.dispatch(lambda: self.current(key, generation) and callback(value))
+
+    def close(self, timeout=2):
+        """Cancel everything still running and stop the loop"""
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
@@ -0,0 +1,250 @@
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import vlc
+except ImportError:
+    # The tests run without libvlc, handing in their own instance and event types
+    vlc = None
+
+
+class PlaybackController:
+    """Forwards libvlc player events to the UI thread.
+
+    Subscribes to the player's event manager instead of polling it. Events
+    arrive on libvlc's thread and go onto a queue; at most one drain is
+    scheduled on the UI thread at a time, and it coalesces everything queued
+    since into one time/length update plus end or error handling. Nothing
+    runs while the player is paused.
+
+    dispatch(fn) must run fn on the UI thread, e.g. lambda fn: root.after(0, fn).
+    """
+
+    EVENTS = {
+        "MediaPlayerTimeChanged": "time",
+        "MediaPlayerLengthChanged": "length",
+        "MediaPlayerEndReached": "end",
+        "MediaPlayerEncounteredError": "error",
+        "MediaPlayerVout": "vout",
+    }
+
+    def __init__(self, dispatch, on_time=None, on_length=None, on_end=None, on_error=None,
+                 on_vout=None, event_type=None):
+        self.dispatch = dispatch
+        self.callbacks = {"time": on_time, "length": on_length, "end": on_end, "error": on_error,
+                          "vout": on_vout}
+        self.event_type = event_type or vlc.EventType
+        self.events = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.scheduled = False
+        self.player = None
+        self.manager = None
+        self.generation = 0
+        self.length = 0
+        self.stats = {"events": 0, "dispatches": 0}
+
+    def attach(self, player):
+        """Start forwarding events of player, replacing any previous one"""
+        self.detach()
+        self.player = player
+        self.length = 0
+        # python-vlc hands out a new wrapper per call and only that one can detach
+        self.manager = player.event_manager()
+        for name, kind in self.EVENTS.items():
+            self.manager.event_attach(getattr(self.event_type, name), self._on_event, kind, self.generation)
+
+    def detach(self):
+        """Stop forwarding; events still queued for the old player are dropped"""
+        if self.manager:
+            for name in self.EVENTS:
+                try:
+                    self.manager.event_detach(getattr(self.event_type, name))
+                except Exception:
+                    pass
+            self.manager = None
+        self.player = None
+        self.generation += 1
+
+    def _on_event(self, event, kind, generation):
+        # libvlc thread: keep this short, never touch the UI here
+        if kind == "time":
+            value = event.u.new_time
+        elif kind == "length":
+            value = event.u.new_length
+        elif kind == "vout":
+            value = event.u.new_count
+        else:
+            value = None
+        self.events.put((generation, kind, value))
+
+        with self.lock:
+            self.stats["events"] += 1
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.dispatch(self._drain)
+
+    def _drain(self):
+        with self.lock:
+            self.scheduled = False
+            self.stats["dispatches"] += 1
+
+        latest = {}
+        while True:
+            try:
+                generation, kind, value = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self.generation:
+                latest[kind] = value
+
+        # Length first so time updates can compute the position
+        for kind in ("length", "time", "vout", "error", "end"):
+            if kind not in latest:
+                continue
+            if kind == "length":
+                self.length = latest[kind]
+            callback = self.callbacks[kind]
+            if callback and kind in ("time", "length", "vout"):
+                callback(latest[kind])
+            elif callback:
+                callback()
+            if kind in ("error", "end"):
+                break
+
+
+class PlayerService:
+    """Owns the app's one libvlc instance and the player it keeps reusing.
+
+    Creating an instance reloads libvlc's plugin cache, so that happens once
+    at startup. Each play() stops the shared player and swaps in new media;
+    the previous media is released right away instead of whenever the
+    garbage collector gets to it. handles counts the native objects still
+    alive and stats records how long each play() took to set up.
+    """
+
+    def __init__(self, *args, instance=None):
+        self.instance = instance or vlc.Instance(*args)
+        self.player = None
+        self.media = None
+        self.prepared = None
+        self.handles = {"instances": 1, "players": 0, "media": 0}
+        self.stats = {"plays": 0, "setup_ms": 0.0, "max_setup_ms": 0.0}
+
+    def acquire(self):
+        """The shared player, created on first use"""
+        if self.player is None:
+            self.player = self.instance.media_player_new()
+            self.handles["players"] += 1
+        return self.player
+
+    def prepare(self, mrl, *options):
+        """Create media for the track expected next and let libvlc preparse it.
+
+        A later play() with the same arguments starts from this media, so the
+        stream is already opened and probed when the current track ends.
+        """
+        self._release_prepared()
+        media = self.instance.media_new(mrl, *options)
+        self.handles["media"] += 1
+        if vlc is not None:
+            media.parse_with_options(vlc.MediaParseFlag.network, 5000)
+        self.prepared = ((mrl, options), media)
+
+    def play(self, mrl, *options):
+        """Start mrl (with media options like ':input-slave=...'); returns the player"""
+        start = time.perf_counter()
+        player = self.acquire()
+        player.stop()
+        if self.prepared and self.prepared[0] == (mrl, options):
+            media, self.prepared = self.prepared[1], None
+        else:
+            self._release_prepared()
+            media = self.instance.media_new(mrl, *options)
+            self.handles["media"] += 1
+        # The player keeps its own reference, ours can go as soon as it is replaced
+        player.set_media(media)
+        self._release_media()
+        self.media = media
+        player.play()
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stats["plays"] += 1
+        self.stats["setup_ms"] = elapsed
+        self.stats["max_setup_ms"] = max(self.stats["max_setup_ms"], elapsed)
+        return player
+
+    def stop(self):
+        if self.player:
+            self.player.stop()
+        self._release_media()
+
+    def _release_media(self):
+        if self.media is not None:
+            self.media.release()
+            self.media = None
+            self.handles["media"] -= 1
+
+    def _release_prepared(self):
+        if self.prepared is not None:
+            self.prepared[1].release()
+            self.prepared = None
+            self.handles["media"] -= 1
+
+    def close(self):
+        self.stop()
+        self._release_prepared()
+        if self.player:
+            self.player.release()
+            self.player = None
+            self.handles["players"] -= 1
+        self.instance.release()
+        self.handles["instances"] -= 1
+
+
+class PlayQueue:
+    """Tracks waiting to be played, in order.
+
+    Kept in an OrderedDict under ever-increasing keys so appending, queueing
+    a track to play next, removing any track and taking the head are all
+    O(1) however long the queue gets.
+    """
+
+    def __init__(self):
+        self.items = OrderedDict()
+        self.keys = itertools.count()
+
+    def append(self, track):
+        key = next(self.keys)
+        self.items[key] = track
+        return key
+
+    def extend(self, tracks):
+        return [self.append(track) for track in tracks]
+
+    def play_next(self, track):
+        key = self.append(track)
+        self.items.move_to_end(key, last=False)
+        return key
+
+    def remove(self, key):
+        self.items.pop(key, None)
+
+    def peek(self):
+        """(key, track) of the next track without removing it, or None"""
+        for item in self.items.items():
+            return item
+        return None
+
+    def pop(self):
+        """Remove and return (key, track) of the next track, or None"""
+        return self.items.popitem(last=False) if self.items else None
+
+    def clear(self):
+        self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,121 @@
+import asyncio
+import collections
+
+
+class FormatPrefetcher:
+    """Fetches yt-dlp info for results the user is likely to pick next.
+
+    Runs on an Orchestrator's loop. results() queues the top results of a
+    search and focus() puts the rows under the pointer or next to the
+    selection ahead of them; the queue holds at most depth entries, the
+    least recent interest dropping out first. At most slots fetches run at
+    once, and none is started while a request under one of the yield_to
+    keys is running, so a click is never queued behind speculation.
+
+    Fetched info lands in the InfoCache, or wherever lookup(url, video_id)
+    puts it when given along with cached(video_id). Selections should go
+    through fetch(), which reuses a prefetch that is still running and
+    keeps the counters stats() reports.
+    """
+
+    def __init__(self, orchestrator, info_cache, top=5, depth=16, slots=2,
+                 yield_to=("formats", "play"), poll=0.05, lookup=None, cached=None):
+        self.orchestrator = orchestrator
+        self.loop = orchestrator.loop
+        self.lookup = lookup or info_cache.afetch
+        self.cached = cached or (lambda video_id: info_cache.get(video_id, need_urls=False))
+        self.top = top
+        self.depth = depth
+        self.slots = slots
+        self.yield_to = yield_to
+        self.poll = poll
+        self.queue = collections.deque()
+        self.inflight = {}
+        self.running = 0
+        # Ids fetched ahead of time, and those of them that were selected later
+        self.prefetched = set()
+        self.used = set()
+        self.hits = self.joined = self.misses = self.failed = 0
+
+    @staticmethod
+    def _entry(video):
+        # Library files have nothing to fetch
+        if not video or video.get("path") or not video.get("id") or not video.get("webpage_url"):
+            return None
+        return video["webpage_url"], video["id"]
+
+    def results(self, videos):
+        """Queue the top results of a new result list, replacing older ones"""
+        entries = [e for e in map(self._entry, videos[:self.top]) if e]
+        self.loop.call_soon_threadsafe(self._push, entries, True)
+
+    def focus(self, *videos):
+        """Queue videos the user is looking at, ahead of everything else"""
+        entries = [e for e in map(self._entry, videos) if e]
+        if entries:
+            self.loop.call_soon_threadsafe(self._push, entries, False)
+
+    def _push(self, entries, replace):
+        if replace:
+            self.queue.clear()
+            self.queue.extend(entries)
+        else:
+            for entry in reversed(entries):
+                if entry in self.queue:
+                    self.queue.remove(entry)
+                self.queue.appendleft(entry)
+        while len(self.queue) > self.depth:
+            self.queue.pop()
+        while self.running < self.slots and self.queue:
+            self.running += 1
+            self.loop.create_task(self._work())
+
+    async def _work(self):
+        try:
+            while self.queue:
+                # Whatever the user asked for goes first
+                while self.orchestrator.busy(self.yield_to):
+                    await asyncio.sleep(self.poll)
+                if not self.queue:
+                    break
+                url, video_id = self.queue.popleft()
+                if video_id in self.inflight or self.cached(video_id) is not None:
+                    continue
+                task = self.inflight[video_id] = self.loop.create_task(self.lookup(url, video_id))
+                try:
+                    await task
+                    self.prefetched.add(video_id)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    print(f"Prefetch failed for {video_id}: {e}")
+                finally:
+                    self.inflight.pop(video_id, None)
+        finally:
+            self.running -= 1
+
+    async def fetch(self, url, video_id=None):
+        """The lookup for a selection; joins a prefetch still under way"""
+        task = self.inflight.get(video_id)
+        if task is not None:
+            self.joined += 1
+            self.used.add(video_id)
+            # The selection being superseded should not kill the prefetch
+            return await asyncio.shield(task)
+        info = self.cached(video_id) if video_id else None
+        if info is not None:
+            if video_id in self.prefetched and video_id not in self.used:
+                self.hits += 1
+                self.used.add(video_id)
+            return info
+        self.misses += 1
+        return await self.lookup(url, video_id)
+
+    def stats(self):
+        """Counters so far; wasted counts prefetches not (yet) selected"""
+        helped = self.hits + self.joined
+        asked = helped + self.misses
+        return {"hits": self.hits, "joined": self.joined, "misses": self.misses,
+                "prefetched": len(self.prefetched), "wasted": len(self.prefetched) - len(self.used),
+                "failed": self.failed, "hit_rate": helped / asked if asked else None}
@@ -0,0 +1,130 @@
+import codecs
+import json
+import threading
+import time
+
+# yt-dlp prints each progress update as one JSON line behind this marker
+MARKER = "[progress] "
+PROGRESS_ARGS = ["--newline", "--progress-template", f"download:{MARKER}%(progress)j"]
+
+
+class ProgressEvent:
+    """One yt-dlp progress update; sizes in bytes, speed in bytes/s, eta in seconds"""
+
+    def __init__(self, status="downloading", downloaded=0, total=None, speed=None, eta=None,
+                 fragment=None, fragments=None, filename=None):
+        self.status = status
+        self.downloaded = downloaded
+        self.total = total
+        self.speed = speed
+        self.eta = eta
+        self.fragment = fragment
+        self.fragments = fragments
+        self.filename = filename
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("status") or "downloading",
+                   data.get("downloaded_bytes") or 0,
+                   data.get("total_bytes") or data.get("total_bytes_estimate"),
+                   data.get("speed"), data.get("eta"),
+                   data.get("fragment_index"), data.get("fragment_count"),
+                   data.get("filename"))
+
+    @property
+    def percent(self):
+        if self.total:
+            return min(100.0, self.downloaded * 100.0 / self.total)
+        if self.fragments:
+            return min(100.0, (self.fragment or 0) * 100.0 / self.fragments)
+        return None
+
+    def __repr__(self):
+        return (f"ProgressEvent({self.status}, {self.downloaded}/{self.total}, speed={self.speed}, "
+                f"eta={self.eta}, fragment={self.fragment}/{self.fragments})")
+
+
+class ProgressParser:
+    """Splits raw yt-dlp output into ProgressEvents and ordinary lines.
+
+    feed() takes bytes as they are read, in chunks of any size; a line or a
+    UTF-8 character cut across two chunks is held back until it completes.
+    """
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.buffer = ""
+
+    def feed(self, data):
+        """ProgressEvents and stripped output lines completed by data"""
+        self.buffer += self.decoder.decode(data)
+        *lines, self.buffer = self.buffer.replace("\r", "\n").split("\n")
+        return [item for item in map(self.parse_line, lines) if item]
+
+    def close(self):
+        """Whatever was left without a trailing newline"""
+        self.buffer += self.decoder.decode(b"", final=True)
+        rest, self.buffer = self.buffer, ""
+        item = self.parse_line(rest)
+        return [item] if item else []
+
+    @staticmethod
+    def parse_line(line):
+        line = line.strip()
+        if line.startswith(MARKER):
+            try:
+                return ProgressEvent.from_dict(json.loads(line[len(MARKER):]))
+            except (ValueError, AttributeError):
+                pass
+        return line
+
+
+class Coalescer:
+    """Rate-limits updates per key, always delivering the latest one.
+
+    An update arriving less than 1/rate seconds after the previous delivery
+    for its key is held; a timer delivers the newest held value when the
+    interval is up, so a stalled stream still ends on its last state.
+    dispatch(key, value) runs on the caller's or the timer's thread.
+    """
+
+    def __init__(self, dispatch, rate=10):
+        self.dispatch = dispatch
+        self.interval = 1.0 / rate
+        self.last = {}
+        self.pending = {}
+        self.timers = {}
+        self.lock = threading.Lock()
+
+    def update(self, key, value):
+        with self.lock:
+            wait = self.last.get(key, 0) + self.interval - time.monotonic()
+            # A due timer delivers this value instead, keeping updates in order
+            if wait > 0 or key in self.timers:
+                self.pending[key] = value
+                if key not in self.timers:
+                    timer = threading.Timer(wait, self._fire, (key,))
+                    timer.daemon = True
+                    self.timers[key] = timer
+                    timer.start()
+                return
+            self.last[key] = time.monotonic()
+        self.dispatch(key, value)
+
+    def _fire(self, key):
+        with self.lock:
+            self.timers.pop(key, None)
+            if key not in self.pending:
+                return
+            value = self.pending.pop(key)
+            self.last[key] = time.monotonic()
+        self.dispatch(key, value)
+
+    def discard(self, key):
+        """Drop anything held for key, e.g. once its job has finished"""
+        with self.lock:
+            self.pending.pop(key, None)
+            self.last.pop(key, None)
+            timer = self.timers.pop(key, None)
+        if timer:
+            timer.cancel()
@@ -0,0 +1,118 @@
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .extractor import startupinfo
+
+# Codec prefixes (as reported by yt-dlp) each container can carry as-is
+CONTAINER_CODECS = {
+    "mpegts": {
+        "video": ("avc1", "h264", "hev1", "hvc1", "h265", "mp4v"),
+        "audio": ("mp4a", "aac", "mp3", "mp2", "ac-3", "ac3", "ec-3", "eac3"),
+    },
+    "matroska": {
+        "video": ("avc1", "h264", "hev1", "hvc1", "h265", "vp8", "vp9", "vp09", "av01", "mp4v"),
+        "audio": ("mp4a", "aac", "mp3", "mp2", "ac-3", "ac3", "ec-3", "eac3", "opus", "vorbis", "flac"),
+    },
+}
+
+CONTAINER_TYPES = {"mpegts": ("video/mp2t", "ts"), "matroska": ("video/x-matroska", "mkv")}
+
+
+def codec_fits(codec, container, kind):
+    """Whether a yt-dlp codec string can be stream-copied into container"""
+    codec = (codec or "").lower()
+    return codec not in ("", "none") and codec.startswith(CONTAINER_CODECS[container][kind])
+
+
+def choose_container(vcodec, acodec):
+    """MPEG-TS when both streams fit, otherwise Matroska which also holds VP9/AV1/Opus"""
+    if codec_fits(vcodec, "mpegts", "video") and codec_fits(acodec, "mpegts", "audio"):
+        return "mpegts"
+    return "matroska"
+
+
+def audio_codec_args(acodec, container):
+    """ffmpeg audio arguments, and whether the audio is copied or transcoded"""
+    if codec_fits(acodec, container, "audio"):
+        return ["-c:a", "copy"], "copy"
+    return ["-c:a", "aac", "-b:a", "192k"], "transcode"
+
+
+class StreamMuxer:
+    """Live-muxes separate video and audio URLs for VLC.
+
+    ffmpeg copies both inputs into a stream on its stdout, which is served
+    from a local HTTP endpoint. VLC starts reading the first packets right
+    away instead of waiting for a complete merged file. Audio is only
+    transcoded when its codec does not fit the container. The stream is not
+    seekable.
+
+    meter, a bandwidth.RateMeter, is given the running count of bytes served.
+    """
+
+    def __init__(self, video_url, audio_url, ffmpeg="ffmpeg", vcodec=None, acodec=None, meter=None):
+        self.video_url = video_url
+        self.audio_url = audio_url
+        self.ffmpeg = ffmpeg
+        self.container = choose_container(vcodec, acodec)
+        self.audio_args, self.audio_mode = audio_codec_args(acodec, self.container)
+        self.meter = meter
+        self.process = None
+        self.server = None
+        # Only one reader at a time may consume ffmpeg's output
+        self.read_lock = threading.Lock()
+
+    def command(self):
+        return [
+            self.ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin",
+            "-reconnect", "1", "-reconnect_streamed", "1", "-i", self.video_url,
+            "-reconnect", "1", "-reconnect_streamed", "1", "-i", self.audio_url,
+            "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy", *self.audio_args,
+            "-f", self.container, "-muxdelay", "0", "-flush_packets", "1", "pipe:1",
+        ]
+
+    def start(self):
+        """Start ffmpeg and the local server; returns the URL to hand to VLC"""
+        self.process = subprocess.Popen(self.command(), stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL,
+                                        startupinfo=startupinfo())
+        muxer = self
+        mime, ext = CONTAINER_TYPES[self.container]
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", mime)
+                self.send_header("Connection", "close")
+                self.end_headers()
+                with muxer.read_lock:
+                    served = 0
+                    try:
+                        # read1 hands over whatever ffmpeg has flushed so far
+                        while True:
+                            chunk = muxer.process.stdout.read1(64 * 1024)
+                            if not chunk:
+                                break
+                            self.wfile.write(chunk)
+                            served += len(chunk)
+                            if muxer.meter:
+                                muxer.meter.update(served)
+                    except (OSError, ValueError):
+                        pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_port}/stream.{ext}"
+
+    def close(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
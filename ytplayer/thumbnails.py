@@ -0,0 +1,221 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+
+def scale_image(data, size):
+    """Decode image bytes straight to a copy that fits inside size"""
+    image = Image.open(io.BytesIO(data))
+    if image.format == "JPEG":
+        # Let the JPEG decoder skip detail we would throw away anyway
+        image.draft("RGB", size)
+    image = image.convert("RGB")
+    image.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return image
+
+
+def _forward_error(source, target):
+    """Copy a failure or cancellation of source onto target"""
+    if source.cancelled():
+        target.set_exception(RuntimeError("Thumbnail fetch cancelled"))
+        return True
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+        return True
+    return False
+
+
+class ThumbnailCache:
+    """Byte-bounded LRU of encoded thumbnails and their display-sized copies.
+
+    Entries evicted from memory are spilled to spill_dir (if given) and read
+    back from there on the next lookup.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.entries = OrderedDict()
+        self.used = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _cost(data, scaled):
+        cost = len(data)
+        if scaled:
+            image = scaled[1]
+            cost += image.width * image.height * len(image.getbands())
+        return cost
+
+    def _spill_path(self, url):
+        return os.path.join(self.spill_dir, hashlib.sha1(url.encode()).hexdigest())
+
+    def _store(self, url, data, scaled):
+        old = self.entries.pop(url, None)
+        if old:
+            self.used -= self._cost(*old)
+        self.entries[url] = (data, scaled)
+        self.used += self._cost(data, scaled)
+
+        while self.used > self.max_bytes and len(self.entries) > 1:
+            old_url, (old_data, old_scaled) = self.entries.popitem(last=False)
+            self.used -= self._cost(old_data, old_scaled)
+            if self.spill_dir:
+                try:
+                    with open(self._spill_path(old_url), "wb") as f:
+                        f.write(old_data)
+                except OSError:
+                    pass
+
+    def get(self, url):
+        """Encoded image bytes, or None if neither in memory nor spilled"""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry:
+                self.entries.move_to_end(url)
+                return entry[0]
+            if not self.spill_dir:
+                return None
+            try:
+                with open(self._spill_path(url), "rb") as f:
+                    data = f.read()
+            except OSError:
+                return None
+            self._store(url, data, None)
+            return data
+
+    def put(self, url, data):
+        with self.lock:
+            entry = self.entries.get(url)
+            self._store(url, data, entry[1] if entry else None)
+
+    def scaled(self, url, size):
+        """Display-sized copy made for size, if still in memory"""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry and entry[1] and entry[1][0] == size:
+                self.entries.move_to_end(url)
+                return entry[1][1]
+            return None
+
+    def put_scaled(self, url, size, image):
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry:
+                self._store(url, entry[0], (size, image))
+
+    def __contains__(self, url):
+        with self.lock:
+            return url in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ThumbnailLoader:
+    """Fetches thumbnails on a fixed worker pool over one keep-alive session.
+
+    fetch() returns a Future for the image bytes. Concurrent requests for the
+    same URL share one Future, and load_batch() cancels whatever is still
+    queued from the previous batch (e.g. an older search).
+    """
+
+    def __init__(self, workers=4, timeout=5, cache=None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+
+        # Re-entrant: done callbacks can fire inside fetch() for finished futures
+        self.lock = threading.RLock()
+        self.cache = cache or ThumbnailCache()
+        self.pending = {}
+        self.batch = {}
+
+    def _download(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    def _done(self, url, future):
+        with self.lock:
+            if self.pending.get(url) is future:
+                del self.pending[url]
+            self.batch.pop(url, None)
+            if not future.cancelled() and future.exception() is None:
+                self.cache.put(url, future.result())
+
+    def _submit(self, url):
+        with self.lock:
+            data = self.cache.get(url)
+            if data is not None:
+                future = Future()
+                future.set_result(data)
+                return future
+
+            future = self.pending.get(url)
+            if future is None:
+                future = self.pool.submit(self._download, url)
+                self.pending[url] = future
+                future.add_done_callback(lambda f: self._done(url, f))
+            return future
+
+    def fetch(self, url):
+        """Future for one thumbnail the UI is waiting on"""
+        with self.lock:
+            # Explicitly requested, so a new batch must not cancel it
+            self.batch.pop(url, None)
+            return self._submit(url)
+
+    def fetch_scaled(self, url, size):
+        """Future for a copy of the thumbnail that fits inside size.
+
+        Decoding and resizing run on the worker pool, never on the Tk thread.
+        """
+        image = self.cache.scaled(url, size)
+        result = Future()
+        if image is not None:
+            result.set_result(image)
+            return result
+
+        def scale(data):
+            image = scale_image(data, size)
+            self.cache.put_scaled(url, size, image)
+            return image
+
+        def on_data(raw):
+            if _forward_error(raw, result):
+                return
+            self.pool.submit(scale, raw.result()).add_done_callback(
+                lambda scaled: _forward_error(scaled, result) or result.set_result(scaled.result()))
+
+        self.fetch(url).add_done_callback(on_data)
+        return result
+
+    def load_batch(self, urls):
+        """Queue a new batch of thumbnails, cancelling the previous batch"""
+        with self.lock:
+            wanted = set(urls)
+            for url, future in list(self.batch.items()):
+                if url not in wanted:
+                    future.cancel()
+            self.batch = {}
+            for url in urls:
+                future = self._submit(url)
+                if not future.done():
+                    self.batch[url] = future
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()